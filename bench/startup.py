@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Time `dagctl plan` end to end, in fresh interpreters, and check what it imports.
+
+    python bench/startup.py [-f graph.yaml] [--runs 20] [--budget-ms 0]
+
+Each run starts a new `python dagctl.py plan` process, so the numbers include
+interpreter startup and every import on the plan path. A second run inside a
+probe reports which heavy modules got loaded; plan should load none of them
+(no AWS SDK, no HTTP client, no plugin module). Exits 1 if any did, or if the
+median exceeds --budget-ms (0 = no budget), so CI can track regressions.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# top-level packages that plan must not import
+HEAVY = ("boto3", "botocore", "requests", "aws_requests_auth", "urllib3")
+
+_PROBE = """
+import json, runpy, sys
+sys.argv = ["dagctl.py", "plan", "-f", sys.argv[1]]
+sys.path.insert(0, ".")
+try:
+    runpy.run_path("dagctl.py", run_name="__main__")
+finally:
+    from managed_svcs.manifest import PLUGINS
+    plugins = {p["module"] for p in PLUGINS.values()}
+    heavy = sorted(m for m in sys.modules if m.split(".")[0] in %r or m in plugins)
+    sys.stderr.write("\\n" + json.dumps({"modules": len(sys.modules), "heavy": heavy}) + "\\n")
+""" % (HEAVY,)
+
+
+def _run_plan(graph: str) -> float:
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, "dagctl.py", "plan", "-f", graph], cwd=ROOT, check=True,
+                   stdout=subprocess.DEVNULL)
+    return (time.perf_counter() - t0) * 1000.0
+
+
+def _baseline() -> float:
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+    return (time.perf_counter() - t0) * 1000.0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("-f", "--file", default="graph.yaml", help="graph to plan (relative to the repo root)")
+    ap.add_argument("--runs", type=int, default=20)
+    ap.add_argument("--budget-ms", type=float, default=0.0, help="fail if the median plan time exceeds this")
+    args = ap.parse_args()
+
+    _run_plan(args.file)  # warm the page cache and __pycache__
+    bare: List[float] = sorted(_baseline() for _ in range(args.runs))
+    plan: List[float] = sorted(_run_plan(args.file) for _ in range(args.runs))
+    probe = subprocess.run([sys.executable, "-c", _PROBE, args.file], cwd=ROOT, check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    loaded = json.loads(probe.stderr.strip().splitlines()[-1])
+
+    p95 = plan[min(len(plan) - 1, int(0.95 * len(plan)))]
+    med = statistics.median(plan)
+    print(f"{'':>16} {'min ms':>8} {'median ms':>10} {'p95 ms':>8}")
+    print(f"{'python -c pass':>16} {bare[0]:>8.1f} {statistics.median(bare):>10.1f} "
+          f"{bare[min(len(bare) - 1, int(0.95 * len(bare)))]:>8.1f}")
+    print(f"{'dagctl plan':>16} {plan[0]:>8.1f} {med:>10.1f} {p95:>8.1f}")
+    print(f"modules loaded: {loaded['modules']}; heavy: {', '.join(loaded['heavy']) or 'none'}")
+
+    failed = bool(loaded["heavy"])
+    if args.budget_ms and med > args.budget_ms:
+        print(f"median {med:.1f} ms over budget {args.budget_ms:.1f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,108 +6,328 @@ import importlib
 import json
 import os
 import sys
-from typing import Any, Dict, List, Tuple
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
 
-import boto3
 import yaml
 
-from utils.graph import validate_graph, topo_sort, port_map_from_plugins
-from utils.aws import build_session, pretty_refs
-from managed_svcs import REGISTRY, load_plugins
+from utils.graph import validate_graph
+from utils.sched import run_dag, say
+from utils.state import default_state_path, load_state, node_digest, save_state, wire_digest
+from utils.wiring import plan_wiring, wiring_deps
+from managed_svcs import REGISTRY, port_map
+
+# boto3, botocore and the plugin modules are imported by the commands that talk to
+# AWS; only plan (without --refresh) runs without them. simulate loads the real
+# lambda_src handlers, which import boto3/botocore and (the retriever) requests
+# and aws-requests-auth at module level, so it needs those packages too.
+if TYPE_CHECKING:
+    import boto3
 
 
 def _load_yaml(path: str) -> Dict[str, Any]:
     with open(path, "r") as fh:
-        return yaml.safe_load(fh)
+        return yaml.load(fh, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))  # libyaml when available
 
 
 def _init_session(doc: Dict[str, Any]) -> boto3.session.Session:
+    from utils.aws import build_session
+
     region = doc.get("region") or os.environ.get("AWS_DEFAULT_REGION")
     profile = doc.get("profile") or os.environ.get("AWS_PROFILE")
     return build_session(region=region, profile=profile)
 
 
-def cmd_plan(doc: Dict[str, Any]) -> None:
-    port_map = port_map_from_plugins(REGISTRY)
-    validate_graph(doc, port_map)
-    order = topo_sort(doc["nodes"], doc["edges"])
+def cmd_plan(doc: Dict[str, Any], refresh: bool = False, state_path: str | None = None,
+             max_parallel: int = 4, as_json: bool = False) -> None:
+    g = validate_graph(doc, port_map())
+    if refresh:
+        from utils.aws import ClientPool
+        from utils.inventory import Inventory
+        from utils.refresh import format_diff, refresh_graph
+
+        sess = _init_session(doc)
+        saved = load_state(state_path or default_state_path(doc))["nodes"]
+        pool = ClientPool(sess, max_pool_connections=32)
+        ctx = {
+            "session": sess,
+            "aws": pool,
+            "inventory": Inventory(pool),
+            "region": sess.region_name,
+            "doc": doc,
+            "refs": {nid: s["refs"] for nid, s in saved.items()},  # resolves env refs without deploying
+        }
+        report = refresh_graph(g, REGISTRY, ctx, max_parallel=max_parallel)
+        print(json.dumps(report, indent=2, default=str) if as_json else format_diff(report))
+        return
+    levels = g.levels()
     print("Plan OK. Deployment order:")
-    for i, nid in enumerate(order, 1):
-        nt = next(n["type"] for n in doc["nodes"] if n["id"] == nid)
-        print(f"  {i}. {nid} ({nt})")
+    for i, nid in enumerate(g.topo_order(), 1):
+        print(f"  {i}. {nid} ({g.types[nid]}, level {levels[nid]})")
+
 
+def cmd_deploy(doc: Dict[str, Any], max_parallel: int = 4, state_path: str | None = None, force: bool = False) -> None:
+    from utils.aws import ClientPool, pretty_refs
+    from utils.inventory import Inventory
+    from utils.poller import Poller
 
-def cmd_deploy(doc: Dict[str, Any]) -> None:
     sess = _init_session(doc)
-    port_map = port_map_from_plugins(REGISTRY)
-    validate_graph(doc, port_map)
-    order = topo_sort(doc["nodes"], doc["edges"])
+    g = validate_graph(doc, port_map())
+    order = g.topo_order()
 
-    id2node = {n["id"]: n for n in doc["nodes"]}
+    id2node = g.by_id
     refs: Dict[str, Dict[str, Any]] = {}
+    pool = ClientPool(sess, max_pool_connections=max(10, 2 * max_parallel))
     ctx = {
         "session": sess,
+        "aws": pool,
+        "inventory": Inventory(pool),  # one listing per resource type, shared by all nodes
+        "poller": Poller(),
         "region": sess.region_name,
         "tags": doc.get("tags", {}),
         "doc": doc,
         "refs": refs,
     }
 
-    # Deploy nodes in topological order
-    for nid in order:
+    state_path = state_path or default_state_path(doc)
+    state = load_state(state_path)
+    saved = {} if force else state["nodes"]
+    hashes: Dict[str, str] = {}
+    preds = g.pred
+
+    refs_lock = threading.Lock()
+
+    def _deploy_one(nid: str) -> Dict[str, Any]:
         node = id2node[nid]
         ntype = node["type"]
-        service = REGISTRY[ntype]
-        print(f"Deploying {nid} ({ntype}) ...")
-        refs[nid] = service.deploy(node, ctx)
-
-    # Wire edges after nodes exist
-    for e in doc["edges"]:
-        f, t, via = e["from"], e["to"], e["via"]
-        ftype, ttype = id2node[f]["type"], id2node[t]["type"]
-        # Allow each service to optionally handle wiring if it owns the edge
-        for svc in (REGISTRY[ftype], REGISTRY[ttype]):
-            if hasattr(svc, "wire"):
-                svc.wire(e, refs, ctx)
+        with refs_lock:
+            snapshot = dict(refs)  # every upstream node is already in here
+            upstream = {p: {"hash": hashes[p], "refs": refs[p]} for p in preds[nid]}
+        digest = node_digest(node, upstream, ctx)
+        prev = saved.get(nid)
+        if prev and prev.get("hash") == digest and prev.get("type") == ntype:
+            say(f"Unchanged {nid} ({ntype}), reusing saved refs")
+            out = prev["refs"]
+        else:
+            say(f"Deploying {nid} ({ntype}) ...")
+            out = REGISTRY[ntype].deploy(node, {**ctx, "refs": snapshot})
+        with refs_lock:
+            refs[nid] = out
+            hashes[nid] = digest
+        return out
+
+    def _save() -> None:
+        state["nodes"] = {nid: {"type": id2node[nid]["type"], "hash": hashes[nid], "refs": refs[nid]}
+                          for nid in order if nid in hashes}
+        save_state(state_path, state)
+
+    # Deploy nodes as soon as their upstream nodes are ready
+    edges = [(e["from"], e["to"]) for e in doc["edges"]]
+    _, errors, skipped = run_dag(order, edges, _deploy_one, max_parallel)
+    _save()  # keep what succeeded so a rerun resumes from here
+    if errors or skipped:
+        print("\n=== Deployment Summary ===")
+        for nid in order:
+            if nid in errors:
+                print(f"  FAILED  {nid}: {errors[nid]}")
+            elif nid in skipped:
+                print(f"  skipped {nid} (upstream failed)")
+            else:
+                print(f"  ok      {nid}")
+        raise RuntimeError(f"Deploy failed: {', '.join(n for n in order if n in errors)}")
+
+    # Wire edges after nodes exist: each distinct action once, independent ones concurrently.
+    # Actions whose nodes are all unchanged since the last successful wiring are skipped.
+    actions = {a["id"]: a for a in plan_wiring(doc, REGISTRY)}
+    wired = {} if force else state["wires"]
+    wire_hashes = {aid: wire_digest(aid, a["edge"], hashes, a["nodes"]) for aid, a in actions.items()}
+
+    def _wire_one(aid: str) -> None:
+        act = actions[aid]
+        if wire_hashes[aid] and wired.get(aid) == wire_hashes[aid]:
+            return
+        say(f"Wiring {aid} ...")
+        act["svc"].wire(act["edge"], refs, ctx)
+
+    _, errors, skipped = run_dag(list(actions), wiring_deps(list(actions.values())), _wire_one, max_parallel)
+    state["wires"] = {aid: wire_hashes[aid] for aid in actions if aid not in errors and aid not in skipped}
+    _save()  # wiring may add refs (e.g. Firehose endpoint)
+    if errors or skipped:
+        for aid in actions:
+            if aid in errors:
+                print(f"  FAILED  {aid}: {errors[aid]}")
+            elif aid in skipped:
+                print(f"  skipped {aid} (earlier wiring on the same node failed)")
+        raise RuntimeError(f"Wiring failed: {', '.join(a for a in actions if a in errors)}")
 
     print("\n=== Deployment Outputs ===")
     print(pretty_refs(refs))
 
 
-def cmd_destroy(doc: Dict[str, Any]) -> None:
+def cmd_backfill(
+    doc: Dict[str, Any],
+    prefix: str = "",
+    workers: int = 8,
+    state_path: str | None = None,
+    checkpoint_path: str | None = None,
+    restart: bool = False,
+) -> None:
+    from botocore.config import Config
+    from utils.aws import ClientPool
+    from utils.backfill import (BulkWriter, Checkpoint, aoss_poster, bump_generation, default_checkpoint_path,
+                                embed_fn, load_chunker, resolve_targets, run_backfill)
+
     sess = _init_session(doc)
-    id2node = {n["id"]: n for n in doc["nodes"]}
-    # Best-effort reverse order deletion (no edge checks for brevity)
-    print("Type 'destroy' to confirm teardown:", end=" ")
-    if (input().strip().lower() != "destroy"):
-        print("Aborted.")
-        return
+    validate_graph(doc, port_map())
+    tgt = resolve_targets(doc, load_state(state_path or default_state_path(doc)))
+    pool = ClientPool(sess, max_pool_connections=max(10, 2 * workers))
+    endpoint = tgt["endpoint"]
+    if not endpoint:  # not in the state file: look the collection up
+        oss = pool.client("opensearchserverless")
+        items = oss.list_collections(collectionFilters={"name": tgt["collection"]}).get("collectionSummaries", [])
+        if not items:
+            raise RuntimeError(f"AOSS collection {tgt['collection']} not found; deploy first")
+        endpoint = oss.batch_get_collection(ids=[items[0]["id"]])["collectionDetails"][0]["collectionEndpoint"]
+
+    os.environ.setdefault("AWS_DEFAULT_REGION", sess.region_name)  # the ingester module builds clients on import
+    chunker = load_chunker(tgt["source_dir"])
+    bedrock = sess.client("bedrock-runtime", config=Config(
+        max_pool_connections=max(10, 2 * workers), retries={"max_attempts": 10, "mode": "adaptive"}))
+    writer = BulkWriter(aoss_poster(sess, endpoint, pool_size=max(10, workers)), tgt["index"])
+    checkpoint_path = checkpoint_path or default_checkpoint_path(doc)
+    ckpt = Checkpoint(checkpoint_path, tgt["bucket"], prefix, tgt["index"])
+    if not restart:
+        ckpt.load()
+    if ckpt.after or ckpt.retry:
+        print(f"Resuming after {ckpt.after!r} ({len(ckpt.retry)} failed objects to retry)")
+
+    print(f"Backfilling s3://{tgt['bucket']}/{prefix} -> {tgt['index']} with {workers} workers ...")
+    stats = run_backfill(pool.client("s3"), embed_fn(bedrock, tgt["embed"]), writer, chunker,
+                         tgt["bucket"], prefix, tgt["chunking"], ckpt, workers=workers)
+    if stats["objects"]:
+        bump_generation(sess, endpoint, tgt["index"])  # retrievers drop cached hits
+
+    secs = max(stats["seconds"], 1e-9)
+    print("\n=== Backfill Summary ===")
+    print(f"  objects {stats['objects']}  chunks {stats['chunks']}  bytes {stats['bytes']}  in {stats['seconds']}s")
+    print(f"  {stats['objects'] / secs:.1f} obj/s, {stats['chunks'] / secs:.1f} chunks/s, "
+          f"{stats['bytes'] / secs / 1e6:.2f} MB/s, {stats['bulk_requests']} bulk requests")
+    print(f"  checkpoint: {checkpoint_path}")
+    if stats["failed"]:
+        raise RuntimeError(f"{stats['failed']} objects failed; rerun to retry them")
 
-    for n in reversed(doc.get("nodes", [])):
-        svc = REGISTRY[n["type"]]
-        try:
-            if hasattr(svc, "destroy"):
-                print(f"Destroying {n['id']} ({n['type']}) ...")
-                svc.destroy(n, {"session": sess})
-        except Exception as ex:
-            print(f"Warn: {n['id']}: {ex}")
+
+def cmd_simulate(doc: Dict[str, Any], docs: int = 200, doc_chars: int = 8000, queries: int = 50,
+                 seed: int = 0, model_latency_ms: float = 0.0, as_json: bool = False) -> None:
+    from utils.simulate import format_report, simulate
+
+    validate_graph(doc, port_map())
+    report = simulate(doc, n_docs=docs, doc_chars=doc_chars, n_queries=queries, seed=seed,
+                      model_latency_ms=model_latency_ms)
+    print(json.dumps(report, indent=2) if as_json else format_report(report))
+
+
+def cmd_destroy(doc: Dict[str, Any], state_path: str | None = None, max_parallel: int = 4, yes: bool = False) -> None:
+    from utils.aws import ClientPool
+    from utils.inventory import Inventory
+    from utils.poller import Poller
+
+    g = validate_graph(doc, port_map())
+    if not yes:
+        print("Type 'destroy' to confirm teardown:", end=" ")
+        if (input().strip().lower() != "destroy"):
+            print("Aborted.")
+            return
+
+    sess = _init_session(doc)
+    pool = ClientPool(sess, max_pool_connections=max(10, 2 * max_parallel))
+    ctx = {
+        "session": sess,
+        "aws": pool,
+        "inventory": Inventory(pool),
+        "poller": Poller(),
+        "region": sess.region_name,
+        "doc": doc,
+    }
+
+    def _destroy_one(nid: str) -> str:
+        svc = REGISTRY[g.types[nid]]
+        if not hasattr(svc, "destroy"):
+            return f"{g.types[nid]} has no teardown"
+        say(f"Destroying {nid} ({g.types[nid]}) ...")
+        # True once the resource is really gone; falsy when the plugin leaves it in place
+        return "deleted" if svc.destroy(g.by_id[nid], ctx) else f"{g.types[nid]} keeps its resource"
+
+    # Reverse-topological waves: a node goes only after everything that depends on it
+    order = list(reversed(g.topo_order()))
+    edges = [(e["to"], e["from"]) for e in g.valid_edges]
+    t0 = time.perf_counter()
+    results, errors, skipped = run_dag(order, edges, _destroy_one, max_parallel)
+
+    print(f"\n=== Teardown Summary ({time.perf_counter() - t0:.1f}s) ===")
+    for nid in order:
+        if nid in errors:
+            print(f"  FAILED  {nid}: {errors[nid]}")
+        elif nid in skipped:
+            print(f"  skipped {nid} (a dependent failed to delete)")
+        elif results[nid] == "deleted":
+            print(f"  deleted {nid}")
+        else:
+            print(f"  kept    {nid} ({results[nid]})")
+
+    state_path = state_path or default_state_path(doc)
+    deleted = {nid for nid, r in results.items() if r == "deleted"}
+    if deleted == set(order):
+        # Saved refs no longer describe anything; the next deploy starts fresh
+        if os.path.exists(state_path):
+            os.remove(state_path)
+    else:
+        # Forget only what was deleted so the next deploy recreates it (kept and failed
+        # nodes stay); wiring is redone in full
+        state = load_state(state_path)
+        state["nodes"] = {nid: s for nid, s in state["nodes"].items() if nid not in deleted}
+        state["wires"] = {}
+        save_state(state_path, state)
+    if errors or skipped:
+        raise RuntimeError(f"Teardown failed: {', '.join(n for n in order if n in errors)}")
 
 
 def main() -> None:
     ap = argparse.ArgumentParser(description="Composable AWS DAG deployer")
-    ap.add_argument("cmd", choices=["plan", "deploy", "destroy"])
+    ap.add_argument("cmd", choices=["plan", "deploy", "destroy", "backfill", "simulate"])
     ap.add_argument("-f", "--file", required=True, help="YAML graph file")
+    ap.add_argument("--max-parallel", type=int, default=4, help="max concurrent node deploys/deletes (deploy, destroy) or kinds refreshed (plan)")
+    ap.add_argument("--state", help="state file (default: .dagctl/<name>.state.json)")
+    ap.add_argument("--force", action="store_true", help="redeploy every node, ignoring saved state (deploy)")
+    ap.add_argument("--yes", action="store_true", help="skip the confirmation prompt (destroy)")
+    ap.add_argument("--refresh", action="store_true", help="diff the graph against live AWS state (plan)")
+    ap.add_argument("--prefix", default="", help="S3 key prefix to index (backfill)")
+    ap.add_argument("--workers", type=int, default=8, help="concurrent objects (backfill)")
+    ap.add_argument("--checkpoint", help="checkpoint file (backfill; default: .dagctl/<name>.backfill.json)")
+    ap.add_argument("--restart", action="store_true", help="ignore the checkpoint and start over (backfill)")
+    ap.add_argument("--docs", type=int, default=200, help="synthetic documents (simulate)")
+    ap.add_argument("--doc-chars", type=int, default=8000, help="average document size in chars (simulate)")
+    ap.add_argument("--queries", type=int, default=50, help="retriever queries (simulate)")
+    ap.add_argument("--seed", type=int, default=0, help="random seed (simulate)")
+    ap.add_argument("--model-latency-ms", type=float, default=0.0, help="per-call Bedrock latency to emulate (simulate)")
+    ap.add_argument("--json", action="store_true", help="machine-readable output (simulate, plan --refresh)")
     args = ap.parse_args()
 
-    load_plugins()  # auto-register managed services
     doc = _load_yaml(args.file)
 
     if args.cmd == "plan":
-        cmd_plan(doc)
+        cmd_plan(doc, refresh=args.refresh, state_path=args.state, max_parallel=args.max_parallel, as_json=args.json)
     elif args.cmd == "deploy":
-        cmd_deploy(doc)
+        cmd_deploy(doc, max_parallel=args.max_parallel, state_path=args.state, force=args.force)
+    elif args.cmd == "simulate":
+        cmd_simulate(doc, docs=args.docs, doc_chars=args.doc_chars, queries=args.queries, seed=args.seed,
+                     model_latency_ms=args.model_latency_ms, as_json=args.json)
+    elif args.cmd == "backfill":
+        cmd_backfill(doc, prefix=args.prefix, workers=args.workers, state_path=args.state,
+                     checkpoint_path=args.checkpoint, restart=args.restart)
     else:
-        cmd_destroy(doc)
+        cmd_destroy(doc, state_path=args.state, max_parallel=args.max_parallel, yes=args.yes)
 
 
 if __name__ == "__main__":
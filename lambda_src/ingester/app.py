@@ -1,21 +1,208 @@
+import codecs
+import hashlib
 import json
 import os
+import random
+import time
+from urllib.parse import unquote_plus
 import boto3
 
 s3 = boto3.client("s3")
 kinesis = boto3.client("kinesis")
 STREAM = os.getenv("STREAM", "rag-ingest")
+AGGREGATE = os.getenv("AGGREGATE", "0") == "1"  # KPL-format aggregation of small records
+AGG_MAX_BYTES = int(os.getenv("AGG_MAX_BYTES", str(50 * 1024)))
+PUT_RETRIES = int(os.getenv("PUT_RETRIES", "6"))
+CHUNK_UNIT = os.getenv("CHUNK_UNIT", "chars")  # chars | tokens (whitespace-delimited)
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "2000"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+RANGE_BYTES = int(os.getenv("RANGE_BYTES", str(1024 * 1024)))
+
+# PutRecords limits
+MAX_BATCH_RECORDS = 500
+MAX_BATCH_BYTES = 5 * 1024 * 1024
+MAX_RECORD_BYTES = 1024 * 1024
+
+_KPL_MAGIC = b"\xf3\x89\x9a\xc2"
+
+
+def _varint(n: int) -> bytes:
+    out = bytearray()
+    while True:
+        b = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return bytes(out)
+
+
+def _pb_bytes(field: int, payload: bytes) -> bytes:
+    return _varint((field << 3) | 2) + _varint(len(payload)) + payload
+
+
+def _kpl_aggregate(keys, datas) -> bytes:
+    """Encode user records as a KPL AggregatedRecord (magic + protobuf + md5).
+
+    Firehose and KCL consumers de-aggregate this format transparently.
+    """
+    table = {k: i for i, k in enumerate(dict.fromkeys(keys))}
+    msg = b"".join(_pb_bytes(1, k.encode("utf-8")) for k in table)
+    for k, d in zip(keys, datas):
+        rec = _varint((1 << 3) | 0) + _varint(table[k]) + _pb_bytes(3, d)
+        msg += _pb_bytes(3, rec)
+    return _KPL_MAGIC + msg + hashlib.md5(msg).digest()
+
+
+def partition_key(record_id: str) -> str:
+    """Hash of the record id, so chunks of one large object spread across shards."""
+    return hashlib.md5(record_id.encode("utf-8")).hexdigest()
+
+
+class Producer:
+    """Buffer records and ship them with PutRecords at the 500-record / 5 MB limits.
+
+    Only the entries that failed are retried, with jittered exponential backoff.
+    With aggregate=True, small records are first packed into KPL aggregates of
+    up to AGG_MAX_BYTES each, cutting the number of Kinesis records per shard.
+    """
+
+    def __init__(self, client, stream: str, aggregate: bool = False):
+        self.client = client
+        self.stream = stream
+        self.aggregate = aggregate
+        self.sent = 0
+        self._batch = []
+        self._batch_bytes = 0
+        self._agg_keys = []
+        self._agg_data = []
+        self._agg_bytes = 0
+
+    def put(self, data: bytes, record_id: str) -> None:
+        key = partition_key(record_id)
+        if len(data) + len(key) > MAX_RECORD_BYTES:
+            raise ValueError(f"Record {record_id} is {len(data)} bytes; Kinesis allows {MAX_RECORD_BYTES}")
+        if not self.aggregate:
+            self._add({"Data": data, "PartitionKey": key})
+            return
+        # protobuf framing is a few bytes per record on top of key + data
+        size = len(data) + len(key) + 16
+        if self._agg_data and self._agg_bytes + size > AGG_MAX_BYTES:
+            self._close_aggregate()
+        self._agg_keys.append(key)
+        self._agg_data.append(data)
+        self._agg_bytes += size
+
+    def flush(self) -> None:
+        self._close_aggregate()
+        if self._batch:
+            self._send(self._batch)
+            self._batch, self._batch_bytes = [], 0
+
+    def _close_aggregate(self) -> None:
+        if not self._agg_data:
+            return
+        if len(self._agg_data) == 1:
+            entry = {"Data": self._agg_data[0], "PartitionKey": self._agg_keys[0]}
+        else:
+            entry = {"Data": _kpl_aggregate(self._agg_keys, self._agg_data), "PartitionKey": self._agg_keys[0]}
+        self._agg_keys, self._agg_data, self._agg_bytes = [], [], 0
+        self._add(entry)
+
+    def _add(self, entry) -> None:
+        size = len(entry["Data"]) + len(entry["PartitionKey"])
+        if len(self._batch) >= MAX_BATCH_RECORDS or self._batch_bytes + size > MAX_BATCH_BYTES:
+            self._send(self._batch)
+            self._batch, self._batch_bytes = [], 0
+        self._batch.append(entry)
+        self._batch_bytes += size
+
+    def _send(self, entries) -> None:
+        pending = entries
+        for attempt in range(PUT_RETRIES + 1):
+            if attempt:
+                time.sleep(min(5.0, 0.1 * 2 ** attempt) * random.uniform(0.5, 1.0))
+            try:
+                resp = self.client.put_records(StreamName=self.stream, Records=pending)
+            except self.client.exceptions.ProvisionedThroughputExceededException:
+                continue
+            results = resp.get("Records", [])
+            failed = [e for e, r in zip(pending, results) if r.get("ErrorCode")]
+            self.sent += len(pending) - len(failed)
+            if not failed:
+                return
+            pending = failed
+        raise RuntimeError(f"PutRecords: {len(pending)} records still failing after {PUT_RETRIES} retries")
+
+
+def iter_object_text(client, bucket: str, key: str, range_bytes: int = RANGE_BYTES):
+    """Yield an object's text piece by piece using ranged GETs.
+
+    Only one range is held at a time; an incremental decoder keeps multi-byte
+    UTF-8 characters that straddle a range boundary intact.
+    """
+    size = client.head_object(Bucket=bucket, Key=key)["ContentLength"]
+    dec = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    for start in range(0, size, range_bytes):
+        end = min(start + range_bytes, size) - 1
+        body = client.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end}")["Body"].read()
+        text = dec.decode(body)
+        if text:
+            yield text
+    tail = dec.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def iter_windows(pieces, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP, unit: str = CHUNK_UNIT):
+    """Split a stream of text pieces into windows of `size` chars or tokens, each
+    sharing `overlap` units with the previous one. Memory is O(size + piece)."""
+    if not 0 <= overlap < size:
+        raise ValueError(f"chunk overlap must be in [0, {size}), got {overlap}")
+    step = size - overlap
+    emitted = False
+    if unit == "tokens":
+        buf, carry = [], ""
+        for piece in pieces:
+            toks = (carry + piece).split()
+            # a piece may end mid-word; hold the fragment back until the next one
+            carry = toks.pop() if toks and not piece[-1:].isspace() else ""
+            buf.extend(toks)
+            while len(buf) >= size:
+                yield " ".join(buf[:size])
+                emitted = True
+                del buf[:step]
+        if carry:
+            buf.append(carry)
+        if buf and (not emitted or len(buf) > overlap):
+            yield " ".join(buf)
+        return
+    if unit != "chars":
+        raise ValueError(f"CHUNK_UNIT must be 'chars' or 'tokens', got {unit!r}")
+    buf = ""
+    for piece in pieces:
+        buf += piece
+        while len(buf) >= size:
+            yield buf[:size]
+            emitted = True
+            buf = buf[step:]
+    if buf and (not emitted or len(buf) > overlap):
+        yield buf
 
 
 def handler(event, _):
-    """S3 event -> push small JSON records to Kinesis."""
+    """S3 event -> stream each object, chunk it and push one record per window to Kinesis."""
+    producer = Producer(kinesis, STREAM, aggregate=AGGREGATE)
     records = []
+    chunks = 0
     for rec in event.get("Records", []):
         b = rec["s3"]["bucket"]["name"]
-        k = rec["s3"]["object"]["key"]
-        obj = s3.get_object(Bucket=b, Key=k)
-        text = obj["Body"].read().decode("utf-8", errors="ignore")
-        payload = {"id": k, "text": text}
-        kinesis.put_record(StreamName=STREAM, Data=json.dumps(payload).encode("utf-8"), PartitionKey=k)
+        k = unquote_plus(rec["s3"]["object"]["key"])
+        for n, text in enumerate(iter_windows(iter_object_text(s3, b, k))):
+            payload = {"id": f"{k}#{n}", "doc_id": k, "chunk": n, "text": text}
+            producer.put(json.dumps(payload).encode("utf-8"), payload["id"])
+            chunks += 1
         records.append(k)
-    return {"statusCode": 200, "count": len(records)}
+    producer.flush()
+    return {"statusCode": 200, "count": len(records), "chunks": chunks}
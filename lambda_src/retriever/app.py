@@ -1,58 +1,529 @@
+import hashlib
 import json
 import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import requests
 import boto3
+from botocore.config import Config
+from requests.adapters import HTTPAdapter
 from aws_requests_auth.aws_auth import AWSRequestsAuth
 
+BATCH_CONCURRENCY = max(1, int(os.getenv("BATCH_CONCURRENCY", "8")))  # parallel embed/chat calls per batch
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "50"))
+
 sess = boto3.session.Session()
-bedrock = sess.client("bedrock-runtime")
+bedrock = sess.client(
+    "bedrock-runtime",
+    config=Config(max_pool_connections=max(10, BATCH_CONCURRENCY), retries={"max_attempts": 8, "mode": "adaptive"}),
+)
+# created once per container so warm invocations reuse the threads
+_pool = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY)
 
 INDEX = os.getenv("OPENSEARCH_INDEX", "docs")
 COLLECTION = os.getenv("COLLECTION_NAME", "rag-vec")
+ENDPOINT = os.getenv("OPENSEARCH_ENDPOINT", "")  # injected at deploy time (ref:vector_store.endpoint)
 EMBED_ID = os.getenv("EMBED_MODEL_ID", "amazon.titan-embed-text-v2:0")
+EMBED_DIMS = int(os.getenv("EMBED_DIMS", "0"))  # set by the deployer from the embeddings model node
+EMBED_NORMALIZE = os.getenv("EMBED_NORMALIZE", "true") == "true"
 CHAT_ID = os.getenv("CHAT_MODEL_ID")  # could be a full ARN if custom import
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+EMBED_CACHE_TTL_S = float(os.getenv("EMBED_CACHE_TTL_S", "3600"))
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "2048"))
+RESULT_CACHE_TTL_S = float(os.getenv("RESULT_CACHE_TTL_S", "300"))
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1024"))
+INDEX_GEN_CHECK_S = float(os.getenv("INDEX_GEN_CHECK_S", "30"))  # 0 disables the generation check
+CONTEXT_TOKENS = int(os.getenv("CONTEXT_TOKENS", "3000"))  # prompt budget for retrieved text
+CONTEXT_MIN_TOKENS = int(os.getenv("CONTEXT_MIN_TOKENS", "32"))  # don't bother with shorter truncated tails
+CHARS_PER_TOKEN = float(os.getenv("CHARS_PER_TOKEN", "4"))  # estimate; no tokenizer in the package
+SOURCE_EXCLUDES = ["embedding"]  # vectors never leave AOSS
+KNN_K = int(os.getenv("KNN_K", "5"))
+KNN_MAX_K = int(os.getenv("KNN_MAX_K", "100"))
+KNN_EF_SEARCH = int(os.getenv("KNN_EF_SEARCH", "0"))  # 0: use the index setting
+KNN_MAX_EF_SEARCH = int(os.getenv("KNN_MAX_EF_SEARCH", "1024"))
+
 
-# Resolve AOSS endpoint by collection name each time (cache in env for perf)
-def _aoss_endpoint():
+def _lookup_endpoint():
+    """Fallback when OPENSEARCH_ENDPOINT is not set: resolve by collection name (two control-plane calls)."""
     oss = sess.client("opensearchserverless")
     items = oss.list_collections(collectionFilters={"name": COLLECTION}).get("collectionSummaries", [])
     if not items:
         raise RuntimeError("OpenSearch collection not found")
-    detail = oss.batch_get_collection(identifiers=[items[0]["id"]])["collectionDetails"][0]
+    detail = oss.batch_get_collection(ids=[items[0]["id"]])["collectionDetails"][0]
     return detail["collectionEndpoint"]
 
 
-def _auth(host):
-    creds = sess.get_credentials().get_frozen_credentials()
-    return AWSRequestsAuth(creds.access_key, creds.secret_key, creds.token, host, sess.region_name, "aoss")
+class AossConnection:
+    """Per-container AOSS access: endpoint resolved once, keep-alive pooled HTTP
+    session, and a SigV4 signer rebuilt only when the credentials change.
+
+    botocore refreshes temporary credentials only when they near expiry, so the
+    signer survives across warm invocations until then.
+    """
+
+    def __init__(self, endpoint: str = ""):
+        self._endpoint = endpoint.rstrip("/") or None
+        self._lock = threading.Lock()
+        self._auth = None
+        self._creds_id = None
+        self.http = requests.Session()
+        self.http.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE))
+
+    @property
+    def endpoint(self) -> str:
+        if self._endpoint is None:
+            with self._lock:
+                if self._endpoint is None:
+                    self._endpoint = _lookup_endpoint().rstrip("/")
+        return self._endpoint
+
+    def auth(self) -> AWSRequestsAuth:
+        creds = sess.get_credentials().get_frozen_credentials()
+        ident = (creds.access_key, creds.token)
+        if ident != self._creds_id:
+            with self._lock:
+                host = self.endpoint.replace("https://", "")
+                self._auth = AWSRequestsAuth(creds.access_key, creds.secret_key, creds.token, host, sess.region_name, "aoss")
+                self._creds_id = ident
+        return self._auth
+
+    def request(self, method: str, path: str, **kw) -> requests.Response:
+        kw.setdefault("timeout", 10)
+        return self.http.request(method, f"{self.endpoint}{path}", auth=self.auth(), **kw)
+
+
+aoss = AossConnection(ENDPOINT)
+
+
+class TTLCache:
+    """Size-bounded LRU whose entries expire ttl seconds after being stored."""
+
+    def __init__(self, size: int, ttl: float):
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[object, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, value) -> None:
+        if self.size <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+# level 1: normalized query -> embedding; level 2: (embedding hash, k, index) -> hits
+_embed_cache = TTLCache(EMBED_CACHE_SIZE, EMBED_CACHE_TTL_S)
+_result_cache = TTLCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL_S)
+_index_gen = {"value": None, "checked": 0.0}
+
+
+def invalidate_cache(scope: str = "results") -> dict:
+    """Drop cached hits (scope='results') or hits and query embeddings (scope='all')."""
+    _result_cache.clear()
+    if scope == "all":
+        _embed_cache.clear()
+    return {"statusCode": 200, "invalidated": scope}
+
+
+def _check_index_generation() -> None:
+    """Invalidation hook shared by all containers: writers that rewrite the index
+    bump mappings._meta.generation; seeing a new value clears cached hits.
+    Checked at most every INDEX_GEN_CHECK_S seconds."""
+    now = time.monotonic()
+    if INDEX_GEN_CHECK_S <= 0 or now - _index_gen["checked"] < INDEX_GEN_CHECK_S:
+        return
+    _index_gen["checked"] = now
+    try:
+        r = aoss.request("GET", f"/{INDEX}/_mapping", timeout=3)
+        r.raise_for_status()
+        gen = next(iter(r.json().values()), {}).get("mappings", {}).get("_meta", {}).get("generation")
+    except Exception:
+        return
+    if gen != _index_gen["value"]:
+        if _index_gen["value"] is not None:
+            _result_cache.clear()
+        _index_gen["value"] = gen
+
+
+def _normalize_query(q: str) -> str:
+    """NFC + collapsed whitespace, as transform_embed normalizes indexed text; case is kept."""
+    return " ".join(unicodedata.normalize("NFC", q).split())
 
 
 def _embed(text: str):
     body = {"inputText": text}
+    if EMBED_ID.startswith("amazon.titan-embed-text-v2"):  # only Titan v2 takes these
+        body["normalize"] = EMBED_NORMALIZE
+        if EMBED_DIMS:
+            body["dimensions"] = EMBED_DIMS
     resp = bedrock.invoke_model(modelId=EMBED_ID, body=json.dumps(body))
-    return json.loads(resp["body"].read())["embedding"]
+    vec = json.loads(resp["body"].read())["embedding"]
+    if EMBED_DIMS and len(vec) != EMBED_DIMS:
+        raise ValueError(f"{EMBED_ID} returned {len(vec)} dims, expected {EMBED_DIMS}")
+    return vec
+
+
+def _embed_query(q: str):
+    text = _normalize_query(q)
+    key = (EMBED_ID, EMBED_DIMS, EMBED_NORMALIZE, text)
+    vec = _embed_cache.get(key)
+    if vec is None:
+        vec = _embed(text)
+        _embed_cache.put(key, vec)
+    return vec
+
+
+def search_options(body: dict):
+    """(k, ef_search) for a request: body overrides, else KNN_K / KNN_EF_SEARCH; capped."""
+    def _int(name, default, hi):
+        v = body.get(name, default)
+        if isinstance(v, bool) or not isinstance(v, int) or not 0 <= v <= hi or (name == "k" and v == 0):
+            raise ValueError(f'"{name}" must be an integer in [{int(name == "k")}, {hi}]')
+        return v
+    return _int("k", KNN_K, KNN_MAX_K), _int("ef_search", KNN_EF_SEARCH, KNN_MAX_EF_SEARCH)
+
+
+def _knn_query(vec, k, ef_search=0):
+    knn = {"vector": vec, "k": k}
+    if ef_search:
+        knn["method_parameters"] = {"ef_search": max(ef_search, k)}  # HNSW needs ef_search >= k
+    return {"size": k, "_source": {"excludes": SOURCE_EXCLUDES}, "query": {"knn": {"embedding": knn}}}
+
+
+def _hits(resp: dict):
+    return [{**h["_source"], "score": h.get("_score")} for h in resp.get("hits", {}).get("hits", [])]
 
 
-def _topk(vec, k=5):
-    ep = _aoss_endpoint()
-    host = ep.replace("https://", "")
-    q = {"size": k, "query": {"knn": {"embedding": {"vector": vec, "k": k}}}}
-    r = requests.get(f"{ep}/{INDEX}/_search", auth=_auth(host), json=q, timeout=10)
+def _topk(vec, k=KNN_K, ef_search=0):
+    r = aoss.request("POST", f"/{INDEX}/_search", json=_knn_query(vec, k, ef_search))
     r.raise_for_status()
-    return [h["_source"] for h in r.json().get("hits", {}).get("hits", [])]
+    return _hits(r.json())
 
 
-def _chat(prompt: str, context_docs):
-    ctx = "\n\n".join(d.get("text", "") for d in context_docs)
+def _msearch(vecs, k=KNN_K, ef_search=0):
+    """All kNN searches in one _msearch round-trip; a failed sub-search yields an exception in its slot."""
+    lines = []
+    for vec in vecs:
+        lines.append(json.dumps({"index": INDEX}))
+        lines.append(json.dumps(_knn_query(vec, k, ef_search)))
+    r = aoss.request("POST", "/_msearch", data="\n".join(lines) + "\n",
+                     headers={"content-type": "application/x-ndjson"}, timeout=30)
+    r.raise_for_status()
+    out = []
+    for resp in r.json().get("responses", []):
+        if "error" in resp:
+            out.append(RuntimeError(json.dumps(resp["error"])))
+        else:
+            out.append(_hits(resp))
+    return out
+
+
+def _result_key(vec, k, ef_search):
+    return (hashlib.sha256(json.dumps(vec).encode("utf-8")).hexdigest(), k, ef_search, INDEX)
+
+
+def _topk_cached(vec, k=KNN_K, ef_search=0):
+    _check_index_generation()
+    key = _result_key(vec, k, ef_search)
+    docs = _result_cache.get(key)
+    if docs is None:
+        docs = _topk(vec, k, ef_search)
+        _result_cache.put(key, docs)
+    return docs
+
+
+def _topk_many_cached(vecs, k=KNN_K, ef_search=0):
+    """_topk_cached for many vectors: cache hits are served locally, the misses share one _msearch."""
+    _check_index_generation()
+    keys = [_result_key(v, k, ef_search) for v in vecs]
+    out = [_result_cache.get(key) for key in keys]
+    missing = {}  # cache key -> first index; repeated questions share one sub-search
+    for i, docs in enumerate(out):
+        if docs is None:
+            missing.setdefault(keys[i], i)
+    if missing:
+        found = dict(zip(missing, _msearch([vecs[i] for i in missing.values()], k, ef_search)))
+        for key, docs in found.items():
+            if not isinstance(docs, Exception):
+                _result_cache.put(key, docs)
+        out = [found.get(key) if docs is None else docs for key, docs in zip(keys, out)]
+    return out
+
+
+def _tokens(text: str) -> int:
+    return int(len(text) / CHARS_PER_TOKEN + 0.999)
+
+
+def _overlap(a: str, b: str, limit: int = 4000, min_len: int = 8) -> int:
+    """Length of the longest suffix of a that is also a prefix of b (bounded by limit).
+
+    Overlaps shorter than min_len are ignored: they are usually coincidence
+    (a shared word or punctuation), not window overlap.
+    """
+    tail = a[-limit:]
+    probe = b[:64]
+    if len(probe) == 64:  # long overlaps: find the probe in tail, then confirm
+        pos = tail.find(probe)
+        while pos != -1:
+            if b.startswith(tail[pos:]):
+                return len(tail) - pos
+            pos = tail.find(probe, pos + 1)
+    for n in range(min(63, len(tail), len(b)), min_len - 1, -1):  # short ones, longest first
+        if tail.endswith(b[:n]):
+            return n
+    return 0
+
+
+_ELLIPSIS = " …"
+
+
+def _truncate(text: str, tokens: int) -> str:
+    """Cut text to at most `tokens`, ellipsis included, backing off to a word boundary."""
+    cut = text[: max(0, int(tokens * CHARS_PER_TOKEN) - len(_ELLIPSIS))]
+    if len(cut) < len(text) and " " in cut:
+        cut = cut[: cut.rindex(" ")]
+    return cut.rstrip() + _ELLIPSIS
+
+
+def pack_context(docs, budget: int = CONTEXT_TOKENS):
+    """Fit retrieved chunks into `budget` tokens, best-scoring first.
+
+    Repeated chunks are dropped; when a neighbouring chunk of the same document
+    (chunk n±1) is already packed, the text the two windows share is removed
+    from this one. The last chunk that does not fit is truncated if at least
+    CONTEXT_MIN_TOKENS remain.
+    """
+    packed, seen, taken = [], set(), {}
+    left = budget
+    for d in sorted(docs, key=lambda d: -(d.get("score") or 0.0)):
+        text = d.get("text", "")
+        ident = d.get("id") or hashlib.sha256(text.encode("utf-8")).hexdigest()
+        if not text or ident in seen:
+            continue
+        seen.add(ident)
+        doc_id, n = d.get("doc_id"), d.get("chunk")
+        if doc_id is not None and isinstance(n, int):
+            prev, nxt = taken.get((doc_id, n - 1)), taken.get((doc_id, n + 1))
+            if prev:
+                text = text[_overlap(prev, text):]
+            if nxt:
+                text = text[: len(text) - _overlap(text, nxt)]
+            taken[(doc_id, n)] = d["text"]
+        if not text.strip():
+            continue
+        cost = _tokens(text)
+        if cost > left:
+            if left < CONTEXT_MIN_TOKENS:
+                break
+            text, cost = _truncate(text, left), left
+        packed.append(text)
+        left -= cost
+    return packed
+
+
+def _chat_body(prompt: str, context_docs) -> str:
+    ctx = "\n\n".join(pack_context(context_docs))
     body = {"inputText": f"Use the context to answer.\n\nContext:\n{ctx}\n\nQuestion:\n{prompt}", "inferenceConfig": {"temperature": 0.2}}
-    resp = bedrock.invoke_model(modelId=CHAT_ID, body=json.dumps(body))
+    return json.dumps(body)
+
+
+def _chat(prompt: str, context_docs):
+    resp = bedrock.invoke_model(modelId=CHAT_ID, body=_chat_body(prompt, context_docs))
     return json.loads(resp["body"].read()).get("outputText", "")
 
 
+def _chunk_text(chunk: dict) -> str:
+    """Token text from one streamed chunk (Titan, Llama/imported, Anthropic shapes)."""
+    for k in ("outputText", "generation", "completion"):
+        if chunk.get(k):
+            return chunk[k]
+    return (chunk.get("delta") or {}).get("text", "")
+
+
+def _chat_stream(prompt: str, context_docs):
+    """Yield answer text as Bedrock generates it (InvokeModelWithResponseStream)."""
+    resp = bedrock.invoke_model_with_response_stream(modelId=CHAT_ID, body=_chat_body(prompt, context_docs))
+    for event in resp["body"]:
+        if "chunk" in event:
+            text = _chunk_text(json.loads(event["chunk"]["bytes"]))
+            if text:
+                yield text
+
+
+def answer(q: str, k: int = KNN_K, ef_search: int = KNN_EF_SEARCH) -> dict:
+    vec = _embed_query(q)
+    docs = _topk_cached(vec, k, ef_search)
+    return {"answer": _chat(q, docs), "docs": docs}
+
+
+def answer_batch(questions, k: int = KNN_K, ef_search: int = KNN_EF_SEARCH) -> dict:
+    """Answer many questions with shared round-trips: concurrent embeddings, one
+    _msearch for all kNN lookups, then chat calls in parallel (BATCH_CONCURRENCY).
+    Results keep input order; a failing question gets an "error" entry."""
+    if len(questions) > BATCH_MAX_QUESTIONS:
+        raise ValueError(f"at most {BATCH_MAX_QUESTIONS} questions per batch, got {len(questions)}")
+    results = [None] * len(questions)
+    embeds = [_pool.submit(_embed_query, q) for q in questions]
+    vecs = {}
+    for i, fut in enumerate(embeds):
+        try:
+            vecs[i] = fut.result()
+        except Exception as ex:
+            results[i] = {"error": f"embed: {ex}"}
+    idx = list(vecs)
+    docs = {}
+    if idx:
+        for i, hits in zip(idx, _topk_many_cached([vecs[i] for i in idx], k, ef_search)):
+            if isinstance(hits, Exception):
+                results[i] = {"error": f"search: {hits}"}
+            else:
+                docs[i] = hits
+    chats = {i: _pool.submit(_chat, questions[i], d) for i, d in docs.items()}
+    for i, fut in chats.items():
+        try:
+            results[i] = {"answer": fut.result(), "docs": docs[i]}
+        except Exception as ex:
+            results[i] = {"error": f"chat: {ex}", "docs": docs[i]}
+    return {"results": results}
+
+
+def _questions(body: dict):
+    qs = body.get("questions")
+    if not isinstance(qs, list) or not all(isinstance(q, str) for q in qs):
+        raise ValueError('"questions" must be a list of strings')
+    return qs
+
+
+def stream_answer(q: str, k: int = KNN_K, ef_search: int = KNN_EF_SEARCH):
+    """Events for a streamed reply: retrieved docs first, then tokens as they arrive."""
+    vec = _embed_query(q)
+    docs = _topk_cached(vec, k, ef_search)
+    yield {"type": "docs", "docs": docs}
+    for text in _chat_stream(q, docs):
+        yield {"type": "token", "text": text}
+    yield {"type": "done"}
+
+
 def handler(event, _):
-    body = json.loads(event.get("body", "{}"))
-    q = body.get("q", "")
-    vec = _embed(q)
-    docs = _topk(vec, 5)
-    ans = _chat(q, docs)
-    return {"statusCode": 200, "headers": {"content-type": "application/json"}, "body": json.dumps({"answer": ans, "docs": docs})}
+    if event.get("action") == "invalidate_cache":  # direct invoke, e.g. after re-indexing
+        return invalidate_cache(event.get("scope", "results"))
+    body = json.loads(event.get("body") or "{}")
+    try:
+        opts = search_options(body)
+        if event.get("rawPath", "").rstrip("/").endswith("/chat/batch"):
+            out = answer_batch(_questions(body), *opts)
+        else:
+            out = answer(body.get("q", ""), *opts)
+    except ValueError as ex:
+        return {"statusCode": 400, "headers": {"content-type": "application/json"}, "body": json.dumps({"error": str(ex)})}
+    return {"statusCode": 200, "headers": {"content-type": "application/json"}, "body": json.dumps(out)}
+
+
+# where the Lambda Web Adapter forwards non-HTTP events (its AWS_LWA_PASS_THROUGH_PATH)
+EVENTS_PATH = os.getenv("AWS_LWA_PASS_THROUGH_PATH", "/events").rstrip("/")
+
+
+class StreamingHandler(BaseHTTPRequestHandler):
+    """HTTP front end used behind the Lambda Web Adapter (response streaming mode).
+
+    POST /chat/stream relays NDJSON events with chunked encoding as they are
+    produced; POST /chat and POST /chat/batch return buffered JSON replies, or a
+    JSON 500 when Bedrock or AOSS fails.
+    Non-HTTP invokes (e.g. {"action": "invalidate_cache"}) arrive from the
+    adapter as POST /events with the raw event as body and go to handler().
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._send(200, b"ok", "text/plain")  # adapter readiness check
+
+    def do_POST(self):
+        length = int(self.headers.get("content-length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send(400, b'{"error": "invalid JSON"}')
+            return
+        path = self.path.split("?", 1)[0].rstrip("/")
+        try:
+            self._dispatch(path, body)
+        except Exception as ex:  # Bedrock/AOSS failure: reply like a failed API Gateway invoke
+            self._send(500, json.dumps({"error": str(ex)}).encode("utf-8"))
+
+    def _dispatch(self, path: str, body: dict) -> None:
+        if path == EVENTS_PATH:
+            self._send(200, json.dumps(handler(body, None)).encode("utf-8"))
+            return
+        q = body.get("q", "")
+        try:
+            opts = search_options(body)
+        except ValueError as ex:
+            self._send(400, json.dumps({"error": str(ex)}).encode("utf-8"))
+            return
+        if path.endswith("/chat/stream"):
+            self.send_response(200)
+            self.send_header("content-type", "application/x-ndjson")
+            self.send_header("transfer-encoding", "chunked")
+            self.end_headers()
+            try:
+                for ev in stream_answer(q, *opts):
+                    self._chunk((json.dumps(ev) + "\n").encode("utf-8"))
+            except Exception as ex:
+                self._chunk((json.dumps({"type": "error", "error": str(ex)}) + "\n").encode("utf-8"))
+            self._chunk(b"")
+        elif path.endswith("/chat/batch"):
+            try:
+                out = answer_batch(_questions(body), *opts)
+            except ValueError as ex:
+                self._send(400, json.dumps({"error": str(ex)}).encode("utf-8"))
+                return
+            self._send(200, json.dumps(out).encode("utf-8"))
+        elif path.endswith("/chat"):
+            self._send(200, json.dumps(answer(q, *opts)).encode("utf-8"))
+        else:
+            self._send(404, b'{"error": "not found"}')
+
+    def _chunk(self, data: bytes) -> None:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _send(self, status: int, data: bytes, ctype: str = "application/json") -> None:
+        self.send_response(status)
+        self.send_header("content-type", ctype)
+        self.send_header("content-length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+def serve(port: int = int(os.getenv("PORT", "8080"))) -> None:
+    """Entry point for run.sh when the function URL uses RESPONSE_STREAM."""
+    ThreadingHTTPServer(("127.0.0.1", port), StreamingHandler).serve_forever()
@@ -0,0 +1,3 @@
+#!/bin/bash
+# Lambda Web Adapter entry point (function_url.invoke_mode: RESPONSE_STREAM)
+exec python3 -c "import app; app.serve()"
@@ -1,15 +1,169 @@
+import base64
+import hashlib
 import json
 import os
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import boto3
+from botocore.config import Config
 
-bedrock = boto3.client("bedrock-runtime")
 EMBED_MODEL_ID = os.getenv("EMBED_MODEL_ID", "amazon.titan-embed-text-v2:0")
+EMBED_DIMS = int(os.getenv("EMBED_DIMS", "0"))  # set by the deployer from the embeddings model node
+EMBED_NORMALIZE = os.getenv("EMBED_NORMALIZE", "true") == "true"
+EMBED_CONCURRENCY = max(1, int(os.getenv("EMBED_CONCURRENCY", "16")))
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "10000"))  # in-process entries; 0 disables
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", "")  # e.g. /tmp/embed-cache; empty disables the disk tier
+EMBED_CACHE_MAX_MB = int(os.getenv("EMBED_CACHE_MAX_MB", "256"))
+
+# one HTTP connection per in-flight call; adaptive retries absorb Bedrock throttling
+bedrock = boto3.client(
+    "bedrock-runtime",
+    config=Config(max_pool_connections=max(10, EMBED_CONCURRENCY), retries={"max_attempts": 8, "mode": "adaptive"}),
+)
+# created once per container so warm invocations reuse the threads
+_pool = ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY)
+
+
+def normalize(text: str) -> str:
+    """NFC + collapsed whitespace: texts that differ only in layout share one embedding."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(text: str) -> str:
+    return hashlib.sha256(f"{EMBED_MODEL_ID}\0{EMBED_DIMS}\0{EMBED_NORMALIZE}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """LRU in memory (survives warm invocations) over an optional size-bounded disk tier.
+
+    Disk entries live at <dir>/<key[:2]>/<key>.json; when the tier exceeds
+    max_bytes the least recently used files (by mtime, refreshed on hit) go first.
+    """
+
+    def __init__(self, size: int, disk_dir: str = "", max_bytes: int = 0):
+        self.size = size
+        self.disk_dir = disk_dir
+        self.max_bytes = max_bytes
+        self.stats = {"mem_hits": 0, "disk_hits": 0, "misses": 0, "batch_dups": 0}
+        self._mem: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = None  # scanned lazily on first write
+
+    def get(self, key: str):
+        with self._lock:
+            vec = self._mem.get(key)
+            if vec is not None:
+                self._mem.move_to_end(key)
+                self.stats["mem_hits"] += 1
+                return vec
+        vec = self._disk_get(key)
+        with self._lock:
+            if vec is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["disk_hits"] += 1
+        self._mem_put(key, vec)
+        return vec
+
+    def put(self, key: str, vec) -> None:
+        self._mem_put(key, vec)
+        self._disk_put(key, vec)
+
+    def _mem_put(self, key: str, vec) -> None:
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._mem[key] = vec
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.size:
+                self._mem.popitem(last=False)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _disk_get(self, key: str):
+        if not self.disk_dir:
+            return None
+        p = self._path(key)
+        try:
+            with open(p, "r") as fh:
+                vec = json.load(fh)
+            os.utime(p)  # mtime doubles as LRU clock
+            return vec
+        except (OSError, ValueError):
+            return None
+
+    def _disk_put(self, key: str, vec) -> None:
+        if not self.disk_dir or self.max_bytes <= 0:
+            return
+        p = self._path(key)
+        data = json.dumps(vec)
+        try:
+            os.makedirs(os.path.dirname(p), exist_ok=True)
+            tmp = f"{p}.{threading.get_ident()}.tmp"
+            with open(tmp, "w") as fh:
+                fh.write(data)
+            os.replace(tmp, p)
+        except OSError:
+            return
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(s for _, s, _ in self._disk_files())
+            else:
+                self._disk_bytes += len(data)
+            if self._disk_bytes > self.max_bytes:
+                self._evict()
+
+    def _disk_files(self):
+        for root, _, files in os.walk(self.disk_dir):
+            for f in files:
+                fp = os.path.join(root, f)
+                try:
+                    st = os.stat(fp)
+                except OSError:
+                    continue
+                yield fp, st.st_size, st.st_mtime
+
+    def _evict(self) -> None:
+        """Trim the disk tier to 90% of its budget, oldest first (caller holds the lock)."""
+        files = sorted(self._disk_files(), key=lambda f: f[2])
+        total = sum(s for _, s, _ in files)
+        target = int(self.max_bytes * 0.9)
+        for fp, size, _ in files:
+            if total <= target:
+                break
+            try:
+                os.remove(fp)
+                total -= size
+            except OSError:
+                pass
+        self._disk_bytes = total
+
+
+_cache = EmbeddingCache(EMBED_CACHE_SIZE, EMBED_CACHE_DIR, EMBED_CACHE_MAX_MB * 1024 * 1024)
 
 
 def _embed(text: str):
     body = {"inputText": text}
+    if EMBED_MODEL_ID.startswith("amazon.titan-embed-text-v2"):  # only Titan v2 takes these
+        body["normalize"] = EMBED_NORMALIZE
+        if EMBED_DIMS:
+            body["dimensions"] = EMBED_DIMS
     resp = bedrock.invoke_model(modelId=EMBED_MODEL_ID, body=json.dumps(body))
-    return json.loads(resp["body"].read())["embedding"]
+    vec = json.loads(resp["body"].read())["embedding"]
+    if EMBED_DIMS and len(vec) != EMBED_DIMS:  # fail the record rather than the index write
+        raise ValueError(f"{EMBED_MODEL_ID} returned {len(vec)} dims, expected {EMBED_DIMS}")
+    return vec
+
+
+def _embed_cached(key: str, text: str):
+    vec = _cache.get(key)
+    if vec is None:
+        vec = _embed(text)
+        _cache.put(key, vec)
+    return vec
 
 
 def handler(event, _):
@@ -17,16 +171,45 @@ def handler(event, _):
     Firehose Lambda Transform: receives 'records' and must return transformed batch:
     { "records": [ { "recordId":..., "result":"Ok", "data": base64(json) }, ... ] }
     Each data payload will be indexed into OpenSearch by Firehose destination.
+    Identical texts in a batch are embedded once, cached embeddings skip Bedrock,
+    and the remaining calls run concurrently (EMBED_CONCURRENCY); output keeps input order.
     """
-    import base64
-    out = {"records": []}
-    for r in event.get("records", []):
+    records = event.get("records", [])
+    payloads = {}
+    unique = {}  # cache key -> normalized text
+    for r in records:
         try:
             payload = json.loads(base64.b64decode(r["data"]))
-            vec = _embed(payload["text"])
-            doc = {"id": payload["id"], "text": payload["text"], "embedding": vec}
-            enc = base64.b64encode(json.dumps(doc).encode("utf-8")).decode("utf-8")
-            out["records"].append({"recordId": r["recordId"], "result": "Ok", "data": enc})
+            if payload.get("id") is None:
+                raise KeyError("id")
+            text = normalize(payload["text"])
+            key = cache_key(text)
         except Exception:
+            continue
+        payloads[r["recordId"]] = (payload, key)
+        if key in unique:
+            _cache.stats["batch_dups"] += 1
+        unique[key] = text
+
+    keys = list(unique)
+    vectors = {}
+    for key, fut in zip(keys, [_pool.submit(_embed_cached, k, unique[k]) for k in keys]):
+        try:
+            vectors[key] = fut.result()
+        except Exception:
+            pass
+
+    out = {"records": []}
+    for r in records:
+        payload, key = payloads.get(r["recordId"], (None, None))
+        if key not in vectors:
             out["records"].append({"recordId": r["recordId"], "result": "ProcessingFailed", "data": r["data"]})
+            continue
+        doc = {"id": payload["id"], "text": payload["text"], "embedding": vectors[key]}
+        for k in ("doc_id", "chunk"):
+            if k in payload:
+                doc[k] = payload[k]
+        enc = base64.b64encode(json.dumps(doc).encode("utf-8")).decode("utf-8")
+        out["records"].append({"recordId": r["recordId"], "result": "Ok", "data": enc})
+    print(json.dumps({"embed_cache": _cache.stats, "records": len(records), "unique": len(keys)}))
     return out
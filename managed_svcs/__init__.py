@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import importlib
+import threading
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List
+
+from .manifest import PLUGINS
+
+
+class _Registry(Mapping):
+    """Node kind -> service class, importing each plugin module on first lookup.
+
+    Keys come from the manifest, so iterating or testing membership imports
+    nothing. Lookups are thread-safe (deploy workers resolve kinds concurrently).
+    """
+
+    def __init__(self) -> None:
+        self._loaded: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, kind: str) -> Any:
+        svc = self._loaded.get(kind)
+        if svc is not None:
+            return svc
+        if kind not in PLUGINS:
+            raise KeyError(kind)
+        with self._lock:
+            if kind not in self._loaded:
+                svc = importlib.import_module(PLUGINS[kind]["module"]).SERVICE
+                if svc.NODE_KIND != kind:
+                    raise ImportError(f"{PLUGINS[kind]['module']} provides {svc.NODE_KIND}, manifest says {kind}")
+                self._loaded[kind] = svc
+            return self._loaded[kind]
+
+    def __contains__(self, kind: object) -> bool:
+        return kind in PLUGINS
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(PLUGINS)
+
+    def __len__(self) -> int:
+        return len(PLUGINS)
+
+
+REGISTRY = _Registry()
+
+
+def register(service: Any) -> None:
+    """Add an already-imported service (e.g. one defined outside this package)."""
+    PLUGINS[service.NODE_KIND] = {"module": service.__module__, "in": service.IN_PORTS, "out": service.OUT_PORTS}
+    REGISTRY._loaded[service.NODE_KIND] = service
+
+
+def port_map() -> Dict[str, Dict[str, List[str]]]:
+    """{kind: {"in": [...], "out": [...]}} straight from the manifest; imports no plugin."""
+    return {k: {"in": v["in"], "out": v["out"]} for k, v in PLUGINS.items()}
+
+
+def load_plugins() -> None:
+    """Import every plugin in the manifest now instead of on first use."""
+    for kind in PLUGINS:
+        REGISTRY[kind]
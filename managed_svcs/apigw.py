@@ -1,23 +1,30 @@
 from __future__ import annotations
 from typing import Any, Dict, List
+from utils.aws import function_arn
+from utils.refresh import fan_out
+from managed_svcs.manifest import PLUGINS
+
+# routes served by the integrated Lambda (one integration, several route keys)
+ROUTES = ("POST /chat", "POST /chat/batch")
 
 
 class ApiHttp:
     NODE_KIND = "apigw.http"
-    IN_PORTS: List[str] = []
-    OUT_PORTS: List[str] = ["http"]
+    IN_PORTS: List[str] = PLUGINS[NODE_KIND]["in"]
+    OUT_PORTS: List[str] = PLUGINS[NODE_KIND]["out"]
 
     @staticmethod
     def deploy(node: Dict[str, Any], ctx: Dict[str, Any]) -> Dict[str, Any]:
-        api = ctx["session"].client("apigatewayv2")
+        api = ctx["aws"].client("apigatewayv2")
         name = node["props"]["name"]
-        apis = api.get_apis().get("Items", [])
-        found = next((a for a in apis if a["Name"] == name and a["ProtocolType"] == "HTTP"), None)
+        found = ctx["inventory"].get("apigw", name)
         if not found:
             created = api.create_api(Name=name, ProtocolType="HTTP")
             api_id = created["ApiId"]
+            arn = f"arn:aws:apigateway:{ctx['region']}::/apis/{api_id}"
+            ctx["inventory"].put("apigw", name, {"id": api_id, "arn": arn, "raw": created})
         else:
-            api_id = found["ApiId"]
+            api_id = found["id"]
         # $default stage
         try:
             api.get_stage(ApiId=api_id, StageName="$default")
@@ -36,19 +43,23 @@ class ApiHttp:
         url = f"https://{api_id}.execute-api.{ctx['region']}.amazonaws.com"
         return {"api_id": api_id, "invoke_url": url}
 
+    @staticmethod
+    def wire_key(edge, types):
+        return (edge["from"], edge["to"]) if edge["via"] == "http" else None
+
     @staticmethod
     def wire(edge, refs, ctx) -> None:
         if edge["via"] != "http":
             return
-        api_ref = next((r for r in refs.values() if r.get("api_id")), None)
-        lam_ref = next((r for r in refs.values() if r.get("function_name") == "rag-retriever"), None)
-        if not api_ref or not lam_ref:
+        api_ref = refs.get(edge["from"], {})
+        lam_ref = refs.get(edge["to"], {})
+        if not api_ref.get("api_id") or not lam_ref.get("function_name"):
             return
-        api = ctx["session"].client("apigatewayv2")
-        lam = ctx["session"].client("lambda")
+        api = ctx["aws"].client("apigatewayv2")
+        lam = ctx["aws"].client("lambda")
         api_id = api_ref["api_id"]
         fn = lam_ref["function_name"]
-        fn_arn = lam.get_function(FunctionName=fn)["Configuration"]["FunctionArn"]
+        fn_arn = function_arn(ctx["aws"], fn)
 
         # permission
         try:
@@ -68,19 +79,46 @@ class ApiHttp:
             IntegrationUri=f"arn:aws:apigateway:{ctx['region']}:lambda:path/2015-03-31/functions/{fn_arn}/invocations",
             PayloadFormatVersion="2.0",
         )
-        # route
-        try:
-            api.create_route(ApiId=api_id, RouteKey="POST /chat", Target=f"integrations/{integ['IntegrationId']}")
-        except Exception:
-            pass
+        # routes
+        for key in ROUTES:
+            try:
+                api.create_route(ApiId=api_id, RouteKey=key, Target=f"integrations/{integ['IntegrationId']}")
+            except Exception:
+                pass
+
+    @staticmethod
+    def desired(node: Dict[str, Any], ctx: Dict[str, Any]) -> Dict[str, Any]:
+        wired = any(e["from"] == node["id"] and e["via"] == "http" for e in ctx["doc"].get("edges", []))
+        return {"protocol": "HTTP", "routes": sorted(ROUTES) if wired else []}
+
+    @staticmethod
+    def refresh(nodes: List[Dict[str, Any]], ctx: Dict[str, Any]) -> Dict[str, Any]:
+        """APIs from the shared inventory (one paginated listing), then route keys of the matching ones in parallel."""
+        api = ctx["aws"].client("apigatewayv2")
+        found = {n["id"]: ctx["inventory"].get("apigw", n["props"]["name"]) for n in nodes}
+
+        def _routes(api_id: str) -> List[str]:
+            keys, token = [], None
+            while True:
+                page = api.get_routes(ApiId=api_id, **({"NextToken": token} if token else {}))
+                keys += [r["RouteKey"] for r in page.get("Items", [])]
+                token = page.get("NextToken")
+                if not token:
+                    return sorted(keys)
+
+        routes = fan_out(_routes, [a["id"] for a in found.values() if a])
+        return {nid: {"protocol": a["raw"]["ProtocolType"], "routes": routes[a["id"]]} if a else None
+                for nid, a in found.items()}
 
     @staticmethod
-    def destroy(node: Dict[str, Any], ctx: Dict[str, Any]) -> None:
-        api = ctx["session"].client("apigatewayv2")
+    def destroy(node: Dict[str, Any], ctx: Dict[str, Any]) -> bool:
+        api = ctx["aws"].client("apigatewayv2")
         name = node["props"]["name"]
-        for a in api.get_apis().get("Items", []):
-            if a["Name"] == name and a["ProtocolType"] == "HTTP":
-                api.delete_api(ApiId=a["ApiId"])
+        found = ctx["inventory"].get("apigw", name)
+        if found:
+            api.delete_api(ApiId=found["id"])
+            ctx["inventory"].discard("apigw", name)
+        return True
 
 
 SERVICE = ApiHttp
@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Protocol
+
+
+class Service(Protocol):
+    """What a managed-service plugin exposes (as static methods on its SERVICE class).
+
+    Only NODE_KIND, the ports and deploy() are required. wire()/wire_key(),
+    desired()/refresh() and destroy() are optional; callers check with hasattr.
+    destroy() returns True once the resource is gone (deleted or already absent)
+    and False when it deliberately leaves it in place.
+    """
+
+    NODE_KIND: str
+    IN_PORTS: List[str]
+    OUT_PORTS: List[str]
+
+    @staticmethod
+    def deploy(node: Dict[str, Any], ctx: Dict[str, Any]) -> Dict[str, Any]: ...
@@ -1,15 +1,20 @@
 from __future__ import annotations
-import json, time
+import json
 from typing import Any, Dict, List
+from utils.aws import function_config, is_not_found
+from utils.graph import embedding_spec
+from utils.poller import import_completed, lambda_updated
+from utils.refresh import fan_out
+from managed_svcs.manifest import PLUGINS
 
 
 class BedrockModel:
     NODE_KIND = "bedrock.model"
-    IN_PORTS: List[str] = ["invoke"]
-    OUT_PORTS: List[str] = ["vectors", "tokens", "invoke"]
+    IN_PORTS: List[str] = PLUGINS[NODE_KIND]["in"]
+    OUT_PORTS: List[str] = PLUGINS[NODE_KIND]["out"]
 
     @staticmethod
-    def _import_hf(bedrock, s3_uri: str, model_name: str, arch_hint: str | None) -> str:
+    def _import_hf(bedrock, s3_uri: str, model_name: str, arch_hint: str | None, poller) -> str:
         resp = bedrock.create_model_import_job(
             jobName=f"import-{model_name}",
             modelName=model_name,
@@ -17,46 +22,103 @@ class BedrockModel:
             **({"architecture": arch_hint} if arch_hint else {}),
         )
         job_arn = resp["jobArn"]
-        for _ in range(120):
-            d = bedrock.get_model_import_job(jobIdentifier=job_arn)
-            st = d["status"]
-            if st in ("Completed", "Failed"):
-                if st == "Failed":
-                    raise RuntimeError(f"Bedrock import failed: {d}")
-                return d["modelArn"]
-            time.sleep(10)
-        raise TimeoutError("Model import timed out")
+        # imports take minutes; the shared poller lets other slow nodes wait alongside
+        d = poller.wait(f"bedrock import {model_name}", import_completed(bedrock, job_arn), timeout=1200, first_delay=10)
+        return d["importedModelArn"]
 
     @staticmethod
     def deploy(node: Dict[str, Any], ctx: Dict[str, Any]) -> Dict[str, Any]:
-        br = ctx["session"].client("bedrock")
+        br = ctx["aws"].client("bedrock")
         props = node.get("props", {})
         mode = props["mode"]
         if "model_id" in props:
-            return {"mode": mode, "model_id": props["model_id"]}
-        if "import_from_s3" in props:
-            arn = BedrockModel._import_hf(br, props["import_from_s3"], props["model_name"], props.get("arch_hint"))
-            return {"mode": mode, "model_id": arn}
-        raise ValueError("bedrock.model requires either model_id or import_from_s3")
+            out = {"mode": mode, "model_id": props["model_id"]}
+        elif "import_from_s3" in props:
+            arn = BedrockModel._import_hf(br, props["import_from_s3"], props["model_name"], props.get("arch_hint"), ctx["poller"])
+            out = {"mode": mode, "model_id": arn}
+        else:
+            raise ValueError("bedrock.model requires either model_id or import_from_s3")
+        if mode == "embeddings":
+            spec = embedding_spec(props)
+            out.update(dimensions=spec["dimensions"], normalize=spec["normalize"])
+        return out
+
+    @staticmethod
+    def desired(node: Dict[str, Any], ctx: Dict[str, Any]) -> Dict[str, Any]:
+        props = node.get("props", {})
+        return {"model": props.get("model_id") or props.get("model_name")}
+
+    @staticmethod
+    def refresh(nodes: List[Dict[str, Any]], ctx: Dict[str, Any]) -> Dict[str, Any]:
+        """Foundation models are looked up in parallel; imported models come from one paginated listing."""
+        br = ctx["aws"].client("bedrock")
+        out: Dict[str, Any] = {}
+        imports = [n for n in nodes if "model_id" not in n.get("props", {})]
+        if imports:
+            names, token = set(), None
+            while True:
+                page = br.list_imported_models(**({"nextToken": token} if token else {}))
+                names |= {m["modelName"] for m in page.get("modelSummaries", [])}
+                token = page.get("nextToken")
+                if not token:
+                    break
+            for n in imports:
+                name = n["props"].get("model_name")
+                out[n["id"]] = {"model": name} if name in names else None
+
+        def _foundation(model_id: str):
+            try:
+                d = br.get_foundation_model(modelIdentifier=model_id)["modelDetails"]
+            except Exception as ex:
+                if is_not_found(ex):
+                    return None
+                raise
+            return {"model": d["modelId"], "lifecycle": d.get("modelLifecycle", {}).get("status")}
+
+        live = fan_out(_foundation, [n["props"]["model_id"] for n in nodes if "model_id" in n.get("props", {})])
+        for n in nodes:
+            if "model_id" in n.get("props", {}):
+                out[n["id"]] = live[n["props"]["model_id"]]
+        return out
+
+    @staticmethod
+    def _push_embed_env(ctx, fn_name: str, model_ref: Dict[str, Any]) -> None:
+        """Set EMBED_MODEL_ID/EMBED_DIMS/EMBED_NORMALIZE on a Lambda that invokes an embeddings model."""
+        lam = ctx["aws"].client("lambda")
+        cur = (function_config(ctx["aws"], fn_name).get("Environment") or {}).get("Variables", {})
+        want = {
+            "EMBED_MODEL_ID": model_ref["model_id"],
+            "EMBED_DIMS": str(model_ref["dimensions"]),
+            "EMBED_NORMALIZE": "true" if model_ref["normalize"] else "false",
+        }
+        if all(cur.get(k) == v for k, v in want.items()):
+            return
+        lam.update_function_configuration(FunctionName=fn_name, Environment={"Variables": {**cur, **want}})
+        ctx["poller"].wait(f"lambda {fn_name}", lambda_updated(lam, fn_name), timeout=300, first_delay=1)
+        ctx["aws"].forget(("lambda", fn_name))
+
+    @staticmethod
+    def wire_key(edge, types):
+        return (edge["from"], edge["to"]) if edge["via"] == "invoke" else None
 
     @staticmethod
     def wire(edge, refs, ctx) -> None:
-        """Attach bedrock:InvokeModel to Lambda on any edge with via=='invoke'."""
+        """Attach bedrock:InvokeModel to Lambda on any edge with via=='invoke';
+        embeddings models also push their dimensions into the Lambda's env."""
         if edge["via"] != "invoke":
             return
-        sess = ctx["session"]
-        lam = sess.client("lambda")
-        iam = sess.client("iam")
+        iam = ctx["aws"].client("iam")
 
         src_ref = refs.get(edge["from"], {})
         dst_ref = refs.get(edge["to"], {})
 
         fn_name = src_ref.get("function_name") or dst_ref.get("function_name")
-        model_id = src_ref.get("model_id") or dst_ref.get("model_id")
+        model_ref = src_ref if "model_id" in src_ref else dst_ref
+        model_id = model_ref.get("model_id")
         if not fn_name or not model_id:
             return
 
-        role_arn = lam.get_function(FunctionName=fn_name)["Configuration"]["Role"]
+        role_arn = function_config(ctx["aws"], fn_name)["Role"]
         role_name = role_arn.split("/")[-1]
         policy = {
             "Version": "2012-10-17",
@@ -66,7 +128,11 @@ class BedrockModel:
                 "Resource": model_id if model_id.startswith("arn:") else "*",
             }],
         }
-        iam.put_role_policy(RoleName=role_name, PolicyName=f"bedrock-invoke-{fn_name}", PolicyDocument=json.dumps(policy))
+        # one inline policy per model, so a Lambda invoking several keeps all grants
+        model_node = edge["from"] if model_ref is src_ref else edge["to"]
+        iam.put_role_policy(RoleName=role_name, PolicyName=f"bedrock-invoke-{model_node}", PolicyDocument=json.dumps(policy))
+        if model_ref.get("mode") == "embeddings":
+            BedrockModel._push_embed_env(ctx, fn_name, model_ref)
 
 
 SERVICE = BedrockModel
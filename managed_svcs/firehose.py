@@ -1,18 +1,16 @@
 from __future__ import annotations
 import json
 from typing import Any, Dict, List
-from utils.aws import tag_list
+from utils.aws import function_arn, is_not_found, stream_arn, tag_list
+from utils.poller import delivery_deleted
+from utils.refresh import fan_out
+from managed_svcs.manifest import PLUGINS
 
 
 class FirehoseDelivery:
     NODE_KIND = "firehose.delivery"
-    IN_PORTS: List[str] = ["records", "transform", "destination"]
-    OUT_PORTS: List[str] = ["delivery"]
-
-    @staticmethod
-    def _kds_arn(sess, name: str) -> str:
-        k = sess.client("kinesis")
-        return k.describe_stream_summary(StreamName=name)["StreamDescriptionSummary"]["StreamARN"]
+    IN_PORTS: List[str] = PLUGINS[NODE_KIND]["in"]
+    OUT_PORTS: List[str] = PLUGINS[NODE_KIND]["out"]
 
     @staticmethod
     def _ensure_role(iam, name: str) -> str:
@@ -45,12 +43,26 @@ class FirehoseDelivery:
             "transform_lambda": props["transform_lambda"],
         }
 
+    @staticmethod
+    def wire_key(edge, types):
+        # the whole delivery stream is (re)configured once, not once per edge
+        return edge["to"] if types[edge["to"]] == FirehoseDelivery.NODE_KIND else edge["from"]
+
+    @staticmethod
+    def _vector_ref(nid: str, refs, ctx) -> Dict[str, Any] | None:
+        """The vector store feeding this delivery via its 'destination' edge."""
+        for e in ctx["doc"].get("edges", []):
+            if e["to"] == nid and e["via"] == "destination":
+                return refs.get(e["from"])
+        return next((r for r in refs.values() if r.get("endpoint") and r.get("index")), None)
+
     @staticmethod
     def wire(edge, refs, ctx) -> None:
         # Only proceed when we see all parts (delivery + vector store)
-        myself = next((r for r in refs.values() if r.get("delivery_name")), None)
-        vector = next((r for r in refs.values() if r.get("endpoint") and r.get("index")), None)
-        if not (myself and vector):
+        nid = edge["to"] if refs.get(edge["to"], {}).get("delivery_name") else edge["from"]
+        myself = refs.get(nid)
+        vector = FirehoseDelivery._vector_ref(nid, refs, ctx)
+        if not (myself and myself.get("delivery_name") and vector and vector.get("endpoint")):
             return
 
         name = myself["delivery_name"]
@@ -59,17 +71,18 @@ class FirehoseDelivery:
         os_endpoint = vector["endpoint"]
         os_index = vector["index"]
 
-        sess = ctx["session"]
-        fh = sess.client("firehose")
-        iam = sess.client("iam")
-        L = sess.client("lambda")
+        pool = ctx["aws"]
+        fh = pool.client("firehose")
+        iam = pool.client("iam")
+        L = pool.client("lambda")
+        lam_arn = function_arn(pool, lam_name)
 
         role_arn = FirehoseDelivery._ensure_role(iam, f"{name}-role")
 
         # Allow Firehose to invoke the transform Lambda
         try:
             L.add_permission(
-                FunctionName=_lambda_arn(sess, lam_name),
+                FunctionName=lam_arn,
                 StatementId=f"firehose-{name}",
                 Action="lambda:InvokeFunction",
                 Principal="firehose.amazonaws.com",
@@ -79,13 +92,13 @@ class FirehoseDelivery:
 
         src = {
             "KinesisStreamSourceConfiguration": {
-                "KinesisStreamARN": FirehoseDelivery._kds_arn(sess, stream),
+                "KinesisStreamARN": stream_arn(pool, stream),
                 "RoleARN": role_arn,
             }
         }
         proc = {
             "Enabled": True,
-            "Processors": [{"Type": "Lambda", "Parameters": [{"ParameterName": "LambdaArn", "ParameterValue": _lambda_arn(sess, lam_name)}]}],
+            "Processors": [{"Type": "Lambda", "Parameters": [{"ParameterName": "LambdaArn", "ParameterValue": lam_arn}]}],
         }
         dest = {
             "CollectionEndpoint": os_endpoint,
@@ -95,7 +108,6 @@ class FirehoseDelivery:
         }
 
         try:
-            fh.describe_delivery_stream(DeliveryStreamName=name)
             v = fh.describe_delivery_stream(DeliveryStreamName=name)["DeliveryStreamDescription"]["VersionId"]
             fh.update_destination(
                 DeliveryStreamName=name,
@@ -118,18 +130,52 @@ class FirehoseDelivery:
         myself["index"] = os_index
 
     @staticmethod
-    def destroy(node: Dict[str, Any], ctx: Dict[str, Any]) -> None:
-        fh = ctx["session"].client("firehose")
+    def desired(node: Dict[str, Any], ctx: Dict[str, Any]) -> Dict[str, Any]:
+        props = node.get("props", {})
+        return {"source_stream": props["source_stream"], "transform_lambda": props["transform_lambda"]}
+
+    @staticmethod
+    def refresh(nodes: List[Dict[str, Any]], ctx: Dict[str, Any]) -> Dict[str, Any]:
+        """Source stream and transform function of each delivery stream, described in parallel."""
+        fh = ctx["aws"].client("firehose")
+        names = {n["id"]: n["props"]["name"] for n in nodes}
+
+        def _one(name: str):
+            try:
+                d = fh.describe_delivery_stream(DeliveryStreamName=name)["DeliveryStreamDescription"]
+            except Exception as ex:
+                if is_not_found(ex):
+                    return None
+                raise
+            src = d.get("Source", {}).get("KinesisStreamSourceDescription", {}).get("KinesisStreamARN", "")
+            lam = None
+            for dest in d.get("Destinations", []):
+                for desc in dest.values():
+                    if not isinstance(desc, dict):
+                        continue
+                    for proc in desc.get("ProcessingConfiguration", {}).get("Processors", []):
+                        for p in proc.get("Parameters", []):
+                            if p.get("ParameterName") == "LambdaArn":
+                                lam = p["ParameterValue"].split(":")[6]  # arn:aws:lambda:<region>:<acct>:function:<name>[:qualifier]
+            return {"source_stream": src.rsplit("/", 1)[-1] or None, "transform_lambda": lam,
+                    "status": d["DeliveryStreamStatus"]}
+
+        live = fan_out(_one, names.values())
+        return {nid: live[name] for nid, name in names.items()}
+
+    @staticmethod
+    def destroy(node: Dict[str, Any], ctx: Dict[str, Any]) -> bool:
+        fh = ctx["aws"].client("firehose")
         name = node["props"]["name"]
         try:
             fh.delete_delivery_stream(DeliveryStreamName=name, AllowForceDelete=True)
-        except Exception:
-            pass
-
-
-def _lambda_arn(sess, fn_name: str) -> str:
-    lam = sess.client("lambda")
-    return lam.get_function(FunctionName=fn_name)["Configuration"]["FunctionArn"]
+        except Exception as ex:
+            if is_not_found(ex):
+                return True
+            raise
+        # the source stream and the transform Lambda go only after the delivery stream is gone
+        ctx["poller"].wait(f"firehose {name} deletion", delivery_deleted(fh, name), timeout=900)
+        return True
 
 
 SERVICE = FirehoseDelivery
@@ -2,33 +2,64 @@ from __future__ import annotations
 
 from typing import Any, Dict, List
 
+from utils.aws import is_not_found, stream_arn
+from utils.poller import stream_active, stream_deleted
+from utils.refresh import fan_out
+from managed_svcs.manifest import PLUGINS
+
 
 class KinesisStream:
     NODE_KIND = "kinesis.stream"
-    IN_PORTS: List[str] = []
-    OUT_PORTS: List[str] = ["records"]
+    IN_PORTS: List[str] = PLUGINS[NODE_KIND]["in"]
+    OUT_PORTS: List[str] = PLUGINS[NODE_KIND]["out"]
 
     @staticmethod
     def deploy(node: Dict[str, Any], ctx: Dict[str, Any]) -> Dict[str, Any]:
-        kinesis = ctx["session"].client("kinesis")
+        kinesis = ctx["aws"].client("kinesis")
         name = node.get("props", {}).get("name", node["id"])
         shards = int(node.get("props", {}).get("shard_count", 1))
-        try:
-            kinesis.describe_stream_summary(StreamName=name)
-        except kinesis.exceptions.ResourceNotFoundException:
+        if ctx["inventory"].get("kinesis", name) is None:
             kinesis.create_stream(StreamName=name, ShardCount=shards)
-            kinesis.get_waiter("stream_exists").wait(StreamName=name)
-        arn = kinesis.describe_stream_summary(StreamName=name)["StreamDescriptionSummary"]["StreamARN"]
+            s = ctx["poller"].wait(f"kinesis stream {name}", stream_active(kinesis, name), timeout=300, first_delay=5)
+            ctx["inventory"].put("kinesis", name, {"id": name, "arn": s["StreamARN"], "status": s["StreamStatus"], "raw": s})
+        arn = stream_arn(ctx["aws"], name)
         return {"stream_name": name, "stream_arn": arn}
 
     @staticmethod
-    def destroy(node: Dict[str, Any], ctx: Dict[str, Any]) -> None:
-        kinesis = ctx["session"].client("kinesis")
+    def desired(node: Dict[str, Any], ctx: Dict[str, Any]) -> Dict[str, Any]:
+        return {"shard_count": int(node.get("props", {}).get("shard_count", 1))}
+
+    @staticmethod
+    def refresh(nodes: List[Dict[str, Any]], ctx: Dict[str, Any]) -> Dict[str, Any]:
+        """Live shard count per stream; one describe_stream_summary per stream, in parallel."""
+        kinesis = ctx["aws"].client("kinesis")
+        names = {n["id"]: n.get("props", {}).get("name", n["id"]) for n in nodes}
+
+        def _one(name: str):
+            try:
+                d = kinesis.describe_stream_summary(StreamName=name)["StreamDescriptionSummary"]
+            except Exception as ex:
+                if is_not_found(ex):
+                    return None
+                raise
+            return {"shard_count": d["OpenShardCount"], "status": d["StreamStatus"]}
+
+        live = fan_out(_one, names.values())
+        return {nid: live[name] for nid, name in names.items()}
+
+    @staticmethod
+    def destroy(node: Dict[str, Any], ctx: Dict[str, Any]) -> bool:
+        kinesis = ctx["aws"].client("kinesis")
         name = node.get("props", {}).get("name", node["id"])
         try:
             kinesis.delete_stream(StreamName=name, EnforceConsumerDeletion=True)
-        except Exception:
-            pass
+        except Exception as ex:
+            if is_not_found(ex):
+                return True
+            raise
+        ctx["poller"].wait(f"kinesis stream {name} deletion", stream_deleted(kinesis, name), timeout=600)
+        ctx["inventory"].discard("kinesis", name)
+        return True
 
 
 SERVICE = KinesisStream
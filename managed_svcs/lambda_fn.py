@@ -1,13 +1,47 @@
 from __future__ import annotations
 import json
 from typing import Any, Dict, List
-from utils.aws import make_inline_zip_from_dir
+from utils.artifacts import build_lambda_zip, cached_lambda_zip, code_location
+from utils.aws import function_arn, is_not_found
+from utils.poller import lambda_updated
+from utils.refresh import fan_out
+from managed_svcs.manifest import PLUGINS
+
+
+# Python has no native response streaming; RESPONSE_STREAM URLs run the function
+# behind the Lambda Web Adapter layer (override with function_url.adapter_layer)
+_LWA_ACCOUNT = "753240598075"
+_LWA_VERSION = 24
+_LWA_LAYERS = {"x86_64": "LambdaAdapterLayerX86", "arm64": "LambdaAdapterLayerArm64"}
+
+# env set by wiring (bedrock.model embeddings); carried over on redeploy unless props.env sets it
+_WIRED_ENV = ("EMBED_MODEL_ID", "EMBED_DIMS", "EMBED_NORMALIZE")
+
+# what a bare "ref:<node>" resolves to, by the first key the node's refs carry
+_REF_DEFAULT_KEYS = ("model_id", "endpoint", "lambda_arn", "stream_name", "bucket", "invoke_url", "delivery_name")
+
+
+def _resolve_env(env: Dict[str, Any], refs: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+    """Replace 'ref:<node>[.<key>]' env values with outputs of already-deployed upstream nodes."""
+    out: Dict[str, str] = {}
+    for k, v in (env or {}).items():
+        if isinstance(v, str) and v.startswith("ref:"):
+            nid, _, key = v[len("ref:"):].partition(".")
+            ref = refs.get(nid)
+            if ref is None:
+                raise ValueError(f"env {k}={v}: '{nid}' has not been deployed upstream of this function")
+            key = key or next((c for c in _REF_DEFAULT_KEYS if c in ref), "")
+            if key not in ref:
+                raise ValueError(f"env {k}={v}: '{nid}' has no output '{key}' (has: {', '.join(sorted(ref))})")
+            v = ref[key]
+        out[k] = str(v)
+    return out
 
 
 class LambdaFn:
     NODE_KIND = "lambda.fn"
-    IN_PORTS: List[str] = ["records", "s3_event", "http", "invoke"]
-    OUT_PORTS: List[str] = ["invoke", "s3_put", "vectors"]
+    IN_PORTS: List[str] = PLUGINS[NODE_KIND]["in"]
+    OUT_PORTS: List[str] = PLUGINS[NODE_KIND]["out"]
 
     @staticmethod
     def _ensure_role(iam, role_name: str) -> str:
@@ -45,51 +79,119 @@ class LambdaFn:
             }),
         )
 
+    @staticmethod
+    def _ensure_url(lam, fn: str, cfg: Dict[str, Any]) -> str:
+        """Create or update the function URL; AuthType NONE also gets the public invoke permission."""
+        args = {"FunctionName": fn, "AuthType": cfg.get("auth_type", "AWS_IAM"), "InvokeMode": cfg.get("invoke_mode", "BUFFERED")}
+        try:
+            url = lam.update_function_url_config(**args)["FunctionUrl"]
+        except lam.exceptions.ResourceNotFoundException:
+            url = lam.create_function_url_config(**args)["FunctionUrl"]
+        if args["AuthType"] == "NONE":
+            try:
+                lam.add_permission(
+                    FunctionName=fn,
+                    StatementId="function-url-public",
+                    Action="lambda:InvokeFunctionUrl",
+                    Principal="*",
+                    FunctionUrlAuthType="NONE",
+                )
+            except lam.exceptions.ResourceConflictException:
+                pass
+        return url
+
+    @staticmethod
+    def _streams(props: Dict[str, Any]) -> bool:
+        return (props.get("function_url") or {}).get("invoke_mode") == "RESPONSE_STREAM"
+
+    @staticmethod
+    def _entry(props: Dict[str, Any], region: str):
+        """(handler, layers); RESPONSE_STREAM functions start run.sh under the Web Adapter layer."""
+        handler = props.get("handler", "app.handler")
+        layers = list(props.get("layers", []))
+        if LambdaFn._streams(props):
+            url_cfg = props["function_url"]
+            arch = props.get("architecture", "x86_64")
+            handler = url_cfg.get("handler", "run.sh")
+            layers.append(url_cfg.get("adapter_layer")
+                          or f"arn:aws:lambda:{region}:{_LWA_ACCOUNT}:layer:{_LWA_LAYERS[arch]}:{_LWA_VERSION}")
+        return handler, layers
+
+    @staticmethod
+    def _env(props: Dict[str, Any], refs: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+        env = _resolve_env(props.get("env", {}), refs)
+        if LambdaFn._streams(props):
+            env = {"AWS_LAMBDA_EXEC_WRAPPER": "/opt/bootstrap", "AWS_LWA_INVOKE_MODE": "response_stream", "PORT": "8080", **env}
+        return env
+
     @staticmethod
     def deploy(node: Dict[str, Any], ctx: Dict[str, Any]) -> Dict[str, Any]:
         props = node.get("props", {})
-        lam = ctx["session"].client("lambda")
-        iam = ctx["session"].client("iam")
+        lam = ctx["aws"].client("lambda")
+        iam = ctx["aws"].client("iam")
 
         fn = props["function_name"]
         role_arn = LambdaFn._ensure_role(iam, f"{fn}-exec")
-        code_zip = make_inline_zip_from_dir(props["source_dir"]) if props.get("source_dir") else None
-        if not code_zip:
-            code_zip = make_inline_zip_from_dir("lambda_src/ingester")
+        arch = props.get("architecture", "x86_64")
+        zip_path, code_sha = build_lambda_zip(props.get("source_dir") or "lambda_src/ingester", props["runtime"], arch)
+        bucket = props.get("artifact_bucket") or ctx["doc"].get("artifact_bucket")
+        code = code_location(ctx["aws"], fn, zip_path, code_sha, bucket)
+
+        handler, layers = LambdaFn._entry(props, ctx["region"])
+        env = LambdaFn._env(props, ctx["refs"])
+        url_cfg = props.get("function_url")
 
         create_args = {
             "FunctionName": fn,
             "Runtime": props["runtime"],
             "Role": role_arn,
-            "Handler": props.get("handler", "app.handler"),
-            "Code": {"ZipFile": code_zip},
+            "Handler": handler,
+            "Code": code,
+            "Architectures": [arch],
+            "Layers": layers,
             "Timeout": int(props["timeout_s"]),
             "MemorySize": int(props["memory_mb"]),
             "Tags": ctx.get("tags", {}),
-            "Environment": {"Variables": props.get("env", {})},
+            "Environment": {"Variables": env},
         }
 
         try:
-            lam.get_function(FunctionName=fn)
-            lam.update_function_code(FunctionName=fn, ZipFile=code_zip, Publish=True)
+            live = lam.get_function(FunctionName=fn)["Configuration"]
+            # identical artifact: skip the upload and the new version
+            wired = (live.get("Environment") or {}).get("Variables", {})
+            env.update({k: wired[k] for k in _WIRED_ENV if k in wired and k not in env})
+            if live.get("CodeSha256") != code_sha:
+                lam.update_function_code(FunctionName=fn, Architectures=[arch], Publish=True, **code)
+                # a configuration update is rejected while the code update is in progress
+                ctx["poller"].wait(f"lambda {fn}", lambda_updated(lam, fn), timeout=300, first_delay=1)
             lam.update_function_configuration(
                 FunctionName=fn,
                 Role=role_arn,
                 Runtime=props["runtime"],
-                Handler=create_args["Handler"],
+                Handler=handler,
+                Layers=layers,
                 Timeout=int(props["timeout_s"]),
                 MemorySize=int(props["memory_mb"]),
                 Environment=create_args["Environment"],
             )
         except lam.exceptions.ResourceNotFoundException:
             lam.create_function(**create_args)
+        ctx["poller"].wait(f"lambda {fn}", lambda_updated(lam, fn), timeout=300, first_delay=1)
 
         # Attach producer policies if this looks like the ingester
         if fn == "rag-s3-producer":
             LambdaFn._attach_ingest_policies(iam, fn, props)
 
-        arn = lam.get_function(FunctionName=fn)["Configuration"]["FunctionArn"]
-        return {"function_name": fn, "lambda_arn": arn}
+        ctx["aws"].forget(("lambda", fn))  # configuration just changed
+        arn = function_arn(ctx["aws"], fn)
+        out = {"function_name": fn, "lambda_arn": arn}
+        if url_cfg:
+            out["function_url"] = LambdaFn._ensure_url(lam, fn, url_cfg)
+        return out
+
+    @staticmethod
+    def wire_key(edge, types):
+        return None  # nothing to wire from the Lambda side
 
     @staticmethod
     def wire(edge, refs, ctx) -> None:
@@ -97,13 +199,68 @@ class LambdaFn:
         return
 
     @staticmethod
-    def destroy(node: Dict[str, Any], ctx: Dict[str, Any]) -> None:
-        lam = ctx["session"].client("lambda")
-        fn = node["props"]["function_name"]
+    def desired(node: Dict[str, Any], ctx: Dict[str, Any]) -> Dict[str, Any]:
+        """Configuration the graph asks for. Env is compared only when every ref is in the saved
+        state, code only when the artifact can be had without vendoring (see cached_lambda_zip)."""
+        props = node.get("props", {})
+        arch = props.get("architecture", "x86_64")
+        handler, layers = LambdaFn._entry(props, ctx["region"])
+        out: Dict[str, Any] = {
+            "runtime": props["runtime"],
+            "handler": handler,
+            "architecture": arch,
+            "layers": layers,
+            "memory_mb": int(props["memory_mb"]),
+            "timeout_s": int(props["timeout_s"]),
+        }
         try:
-            lam.delete_function(FunctionName=fn)
-        except Exception:
+            env = LambdaFn._env(props, ctx["refs"])
+            out["env"] = {k: v for k, v in env.items() if k not in _WIRED_ENV}
+        except ValueError:
             pass
+        built = cached_lambda_zip(props.get("source_dir") or "lambda_src/ingester", props["runtime"], arch)
+        if built:
+            out["code_sha256"] = built[1]
+        return out
+
+    @staticmethod
+    def refresh(nodes: List[Dict[str, Any]], ctx: Dict[str, Any]) -> Dict[str, Any]:
+        """Live configuration of each function, fetched in parallel."""
+        lam = ctx["aws"].client("lambda")
+        names = {n["id"]: n["props"]["function_name"] for n in nodes}
+
+        def _one(fn: str):
+            try:
+                cfg = lam.get_function_configuration(FunctionName=fn)
+            except Exception as ex:
+                if is_not_found(ex):
+                    return None
+                raise
+            env = (cfg.get("Environment") or {}).get("Variables", {})
+            return {
+                "runtime": cfg.get("Runtime"),
+                "handler": cfg.get("Handler"),
+                "architecture": (cfg.get("Architectures") or ["x86_64"])[0],
+                "layers": [layer["Arn"] for layer in cfg.get("Layers", [])],
+                "memory_mb": cfg.get("MemorySize"),
+                "timeout_s": cfg.get("Timeout"),
+                "env": {k: v for k, v in env.items() if k not in _WIRED_ENV},
+                "code_sha256": cfg.get("CodeSha256"),
+            }
+
+        live = fan_out(_one, names.values())
+        return {nid: live[fn] for nid, fn in names.items()}
+
+    @staticmethod
+    def destroy(node: Dict[str, Any], ctx: Dict[str, Any]) -> bool:
+        lam = ctx["aws"].client("lambda")
+        fn = node["props"]["function_name"]
+        try:
+            lam.delete_function(FunctionName=fn)  # also removes its function URL
+        except Exception as ex:
+            if not is_not_found(ex):
+                raise
+        return True
 
 
 SERVICE = LambdaFn
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from typing import Any, Dict
+
+# Node kind -> plugin module and typed ports. Validation and planning read this
+# table only; a plugin module (and the AWS SDK behind it) is imported the first
+# time a command looks its kind up in REGISTRY.
+PLUGINS: Dict[str, Dict[str, Any]] = {
+    "s3.bucket": {
+        "module": "managed_svcs.s3",
+        "in": [],
+        "out": ["s3_event", "s3_path"],
+    },
+    "kinesis.stream": {
+        "module": "managed_svcs.kinesis",
+        "in": ["records"],
+        "out": ["records"],
+    },
+    "firehose.delivery": {
+        "module": "managed_svcs.firehose",
+        "in": ["records", "transform", "destination"],
+        "out": ["delivery"],
+    },
+    "lambda.fn": {
+        "module": "managed_svcs.lambda_fn",
+        "in": ["records", "s3_event", "http", "invoke", "search"],
+        "out": ["invoke", "s3_put", "vectors", "records"],
+    },
+    "opensearch.vector": {
+        "module": "managed_svcs.opensearch",
+        "in": ["vectors", "destination", "search"],
+        "out": ["topk", "destination", "search"],
+    },
+    "bedrock.model": {
+        "module": "managed_svcs.bedrock",
+        "in": ["invoke"],
+        "out": ["vectors", "tokens", "invoke"],
+    },
+    "apigw.http": {
+        "module": "managed_svcs.apigw",
+        "in": [],
+        "out": ["http"],
+    },
+}
@@ -1,20 +1,28 @@
 from __future__ import annotations
 import json
+import time
 import requests
 from typing import Any, Dict, List
-from utils.aws import sigv4_auth
+from utils.aws import account_id, sigv4_auth
+from utils.graph import embedding_spec
+from utils.poller import collection_active, collection_deleted
+from utils.refresh import fan_out
+from managed_svcs.manifest import PLUGINS
+
+# k-NN index defaults; validate_graph checks the combinations
+KNN_DEFAULTS = {"engine": "faiss", "space_type": "l2", "m": 16, "ef_construction": 128, "ef_search": 100, "quantization": "none"}
 
 
 class OpenSearchVector:
     NODE_KIND = "opensearch.vector"
-    IN_PORTS: List[str] = ["vectors", "destination", "search"]
-    OUT_PORTS: List[str] = ["topk"]
+    IN_PORTS: List[str] = PLUGINS[NODE_KIND]["in"]
+    OUT_PORTS: List[str] = PLUGINS[NODE_KIND]["out"]
 
     @staticmethod
     def _ensure_policies(ctx, collection_name: str) -> None:
         """Create encryption, network, and data access policies (idempotent)."""
-        oss = ctx["session"].client("opensearchserverless")
-        acct = ctx["session"].client("sts").get_caller_identity()["Account"]
+        oss = ctx["aws"].client("opensearchserverless")
+        acct = account_id(ctx["aws"])
 
         # encryption
         try:
@@ -67,63 +75,176 @@ class OpenSearchVector:
         except oss.exceptions.ConflictException:
             pass
 
+    @staticmethod
+    def knn_settings(props: Dict[str, Any]) -> Dict[str, Any]:
+        """props merged over KNN_DEFAULTS (engine, space_type, m, ef_construction, ef_search, quantization)."""
+        return {k: props.get(k, v) for k, v in KNN_DEFAULTS.items()}
+
+    @staticmethod
+    def _vector_field(dims: int, knn: Dict[str, Any]) -> Dict[str, Any]:
+        """knn_vector mapping: HNSW with the chosen engine; fp16 = faiss SQ, byte = lucene SQ (both server-side)."""
+        params: Dict[str, Any] = {"m": int(knn["m"]), "ef_construction": int(knn["ef_construction"])}
+        if knn["quantization"] == "fp16":
+            params["encoder"] = {"name": "sq", "parameters": {"type": "fp16"}}
+        elif knn["quantization"] == "byte":
+            params["encoder"] = {"name": "sq"}
+        method = {"name": "hnsw", "engine": knn["engine"], "space_type": knn["space_type"], "parameters": params}
+        return {"type": "knn_vector", "dimension": dims, "method": method}
+
+    @staticmethod
+    def _upstream_dims(node: Dict[str, Any], ctx: Dict[str, Any]) -> int:
+        """dimensions of the embeddings model feeding this store over a 'vectors' edge (0 if none).
+
+        Taken from the model's refs once deployed, else from its props (plan --refresh).
+        """
+        for e in ctx["doc"].get("edges", []):
+            if e["to"] == node["id"] and e["via"] == "vectors":
+                dims = ctx["refs"].get(e["from"], {}).get("dimensions")
+                if not dims:
+                    src = next((n for n in ctx["doc"]["nodes"] if n["id"] == e["from"]), {})
+                    dims = embedding_spec(src.get("props", {}))["dimensions"]
+                if dims:
+                    return int(dims)
+        return 0
+
     @staticmethod
     def deploy(node: Dict[str, Any], ctx: Dict[str, Any]) -> Dict[str, Any]:
-        oss = ctx["session"].client("opensearchserverless")
+        oss = ctx["aws"].client("opensearchserverless")
         props = node.get("props", {})
-        cn, idx, dims = props["collection_name"], props["index_name"], int(props["dims"])
+        cn, idx = props["collection_name"], props["index_name"]
+        dims = OpenSearchVector._upstream_dims(node, ctx) or int(props["dims"])
+        knn = OpenSearchVector.knn_settings(props)
 
         # collection
-        items = oss.list_collections(collectionFilters={"name": cn}).get("collectionSummaries", [])
-        if items:
-            cid = items[0]["id"]
+        found = ctx["inventory"].get("aoss", cn)
+        if found:
+            cid = found["id"]
         else:
-            cid = oss.create_collection(name=cn, type="SEARCH")["id"]
-        endpoint = oss.batch_get_collection(identifiers=[cid])["collectionDetails"][0]["collectionEndpoint"]
-
+            created = oss.create_collection(name=cn, type="SEARCH")["createCollectionDetail"]
+            cid = created["id"]
+            ctx["inventory"].put("aoss", cn, {"id": cid, "arn": created.get("arn"), "status": created.get("status"), "raw": created})
         # policies (safe to call here; repeated later in wire() to capture new principals)
         OpenSearchVector._ensure_policies(ctx, cn)
 
+        # the endpoint rejects index writes until the collection is ACTIVE
+        detail = ctx["poller"].wait(f"aoss collection {cn}", collection_active(oss, cid), timeout=900)
+        endpoint = detail["collectionEndpoint"]
+
         # index
         host = endpoint.replace("https://", "")
         auth = sigv4_auth(ctx["session"], host, "aoss")
+        settings: Dict[str, Any] = {"index.knn": True, "index": {"number_of_shards": 1, "number_of_replicas": 1}}
+        if knn["engine"] != "lucene":  # lucene takes its candidate count from the query's k
+            settings["index.knn.algo_param.ef_search"] = int(knn["ef_search"])
+        # method/engine are fixed at index creation; an existing index keeps its mapping (400 below)
         body = {
-            "settings": {"index.knn": True, "index": {"number_of_shards": 1, "number_of_replicas": 1}},
+            "settings": settings,
             "mappings": {
+                # retrievers drop cached hits when this changes (new or rewritten index)
+                "_meta": {"generation": time.time_ns()},
                 "properties": {
                     "id": {"type": "keyword"},
                     "text": {"type": "text"},
-                    "embedding": {"type": "knn_vector", "dimension": dims},
+                    "embedding": OpenSearchVector._vector_field(dims, knn),
                 }
             },
         }
         r = requests.put(f"{endpoint}/{idx}", auth=auth, json=body)
         if r.status_code not in (200, 201, 400):
             r.raise_for_status()
-        return {"endpoint": endpoint, "index": idx, "dims": dims, "collection": cn}
+        if r.status_code == 400:  # index exists; its dimension cannot change in place
+            m = requests.get(f"{endpoint}/{idx}/_mapping", auth=auth)
+            m.raise_for_status()
+            live = next(iter(m.json().values()), {}).get("mappings", {}).get("properties", {}).get("embedding", {})
+            if live.get("dimension") not in (None, dims):
+                raise RuntimeError(f"Index {idx} has dimension {live['dimension']}, graph wants {dims}; reindex into a new index")
+        return {"endpoint": endpoint, "index": idx, "dims": dims, "collection": cn,
+                "engine": knn["engine"], "ef_search": int(knn["ef_search"])}
+
+    @staticmethod
+    def wire_key(edge, types):
+        # one policy refresh per collection, however many edges touch it
+        return edge["from"] if types[edge["from"]] == OpenSearchVector.NODE_KIND else edge["to"]
 
     @staticmethod
     def wire(edge, refs, ctx) -> None:
         """Re-ensure data access policies after all refs (roles) exist."""
-        # Run once per deploy (cheap + idempotent)
-        done_flag = "__aoss_policies_done__"
-        any_aoss = next((r for r in refs.values() if r.get("collection")), None)
-        if not any_aoss or refs.get(done_flag):
+        mine = next((refs.get(n, {}) for n in (edge["from"], edge["to"]) if refs.get(n, {}).get("collection")), None)
+        if not mine:
             return
-        cn = any_aoss["collection"]
-        OpenSearchVector._ensure_policies(ctx, cn)
-        refs[done_flag] = {"ok": True}
+        OpenSearchVector._ensure_policies(ctx, mine["collection"])
+
+    @staticmethod
+    def desired(node: Dict[str, Any], ctx: Dict[str, Any]) -> Dict[str, Any]:
+        props = node.get("props", {})
+        knn = OpenSearchVector.knn_settings(props)
+        return {
+            "type": "SEARCH",
+            "status": "ACTIVE",
+            "index": props["index_name"],
+            "dims": OpenSearchVector._upstream_dims(node, ctx) or int(props["dims"]),
+            "engine": knn["engine"],
+            "space_type": knn["space_type"],
+            "m": int(knn["m"]),
+            "ef_construction": int(knn["ef_construction"]),
+        }
+
+    @staticmethod
+    def refresh(nodes: List[Dict[str, Any]], ctx: Dict[str, Any]) -> Dict[str, Any]:
+        """Every collection in one batch_get_collection, then each index mapping in parallel."""
+        oss = ctx["aws"].client("opensearchserverless")
+        names = sorted({n["props"]["collection_name"] for n in nodes})
+        details: Dict[str, Dict[str, Any]] = {}
+        for i in range(0, len(names), 100):  # API limit per call
+            for d in oss.batch_get_collection(names=names[i:i + 100]).get("collectionDetails", []):
+                details[d["name"]] = d
+
+        def _mapping(nid: str) -> Dict[str, Any]:
+            node = next(n for n in nodes if n["id"] == nid)
+            d = details[node["props"]["collection_name"]]
+            idx = node["props"]["index_name"]
+            live: Dict[str, Any] = {"type": d.get("type"), "status": d.get("status"), "index": None}
+            if d.get("status") != "ACTIVE":
+                return live
+            endpoint = d["collectionEndpoint"]
+            r = requests.get(f"{endpoint}/{idx}/_mapping",
+                             auth=sigv4_auth(ctx["session"], endpoint.replace("https://", ""), "aoss"), timeout=30)
+            if r.status_code == 404:
+                return live
+            r.raise_for_status()
+            emb = next(iter(r.json().values()), {}).get("mappings", {}).get("properties", {}).get("embedding", {})
+            method = emb.get("method", {})
+            params = method.get("parameters", {})
+            live.update(index=idx, dims=emb.get("dimension"), engine=method.get("engine"),
+                        space_type=method.get("space_type"), m=params.get("m"), ef_construction=params.get("ef_construction"))
+            return live
+
+        live = fan_out(_mapping, [n["id"] for n in nodes if n["props"]["collection_name"] in details])
+        return {n["id"]: live.get(n["id"]) for n in nodes}
 
     @staticmethod
-    def destroy(node: Dict[str, Any], ctx: Dict[str, Any]) -> None:
-        oss = ctx["session"].client("opensearchserverless")
+    def destroy(node: Dict[str, Any], ctx: Dict[str, Any]) -> bool:
+        oss = ctx["aws"].client("opensearchserverless")
         cn = node["props"]["collection_name"]
+        found = ctx["inventory"].get("aoss", cn)
+        if found:
+            try:
+                oss.delete_collection(id=found["id"])
+            except oss.exceptions.ResourceNotFoundException:
+                pass
+            # the encryption policy cannot be deleted while a collection still uses it
+            ctx["poller"].wait(f"aoss collection {cn} deletion", collection_deleted(oss, found["id"]), timeout=900)
+            ctx["inventory"].discard("aoss", cn)
+        for kind, name in (("encryption", f"{cn}-enc"), ("network", f"{cn}-net")):
+            try:
+                oss.delete_security_policy(type=kind, name=name)
+            except oss.exceptions.ResourceNotFoundException:
+                pass
         try:
-            items = oss.list_collections(collectionFilters={"name": cn}).get("collectionSummaries", [])
-            for it in items:
-                oss.delete_collection(id=it["id"])
-        except Exception:
+            oss.delete_access_policy(type="data", name=f"{cn}-access")
+        except oss.exceptions.ResourceNotFoundException:
             pass
+        return True
 
 
 SERVICE = OpenSearchVector
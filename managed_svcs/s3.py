@@ -1,26 +1,23 @@
 from __future__ import annotations
 from typing import Any, Dict, List
-from utils.aws import tag_list
+from utils.aws import function_arn, tag_list
+from utils.refresh import fan_out
+from managed_svcs.manifest import PLUGINS
 
 
 class S3Bucket:
     NODE_KIND = "s3.bucket"
-    IN_PORTS: List[str] = []
-    OUT_PORTS: List[str] = ["s3_event", "s3_path"]
+    IN_PORTS: List[str] = PLUGINS[NODE_KIND]["in"]
+    OUT_PORTS: List[str] = PLUGINS[NODE_KIND]["out"]
 
     @staticmethod
     def deploy(node: Dict[str, Any], ctx: Dict[str, Any]) -> Dict[str, Any]:
-        s3 = ctx["session"].client("s3")
+        s3 = ctx["aws"].client("s3")
         props = node.get("props", {})
         bucket = props["bucket_name"]
         region = ctx["region"]
 
-        exists = True
-        try:
-            s3.head_bucket(Bucket=bucket)
-        except Exception:
-            exists = False
-        if not exists:
+        if ctx["inventory"].get("s3", bucket) is None:
             args = {"Bucket": bucket}
             if region != "us-east-1":
                 args["CreateBucketConfiguration"] = {"LocationConstraint": region}
@@ -40,6 +37,7 @@ class S3Bucket:
                     "Rules": [{"ApplyServerSideEncryptionByDefault": {"SSEAlgorithm": "AES256"}}]
                 },
             )
+            ctx["inventory"].put("s3", bucket, {"id": bucket, "arn": f"arn:aws:s3:::{bucket}", "raw": {"Name": bucket}})
         if ctx.get("tags"):
             s3.put_bucket_tagging(Bucket=bucket, Tagging={"TagSet": tag_list(ctx["tags"])})
         if props.get("lifecycle_days_glacier"):
@@ -56,14 +54,43 @@ class S3Bucket:
             )
         return {"bucket": bucket, "region": region}
 
+    @staticmethod
+    def desired(node: Dict[str, Any], ctx: Dict[str, Any]) -> Dict[str, Any]:
+        days = node.get("props", {}).get("lifecycle_days_glacier")
+        return {"lifecycle_days_glacier": int(days) if days else None}
+
+    @staticmethod
+    def refresh(nodes: List[Dict[str, Any]], ctx: Dict[str, Any]) -> Dict[str, Any]:
+        """Existence from the shared inventory, then the lifecycle of each existing bucket in parallel."""
+        s3 = ctx["aws"].client("s3")
+        owned = set(ctx["inventory"].names("s3"))
+        names = {n["id"]: n["props"]["bucket_name"] for n in nodes}
+
+        def _one(bucket: str):
+            try:
+                rules = s3.get_bucket_lifecycle_configuration(Bucket=bucket).get("Rules", [])
+            except s3.exceptions.ClientError as ex:
+                if ex.response.get("Error", {}).get("Code") != "NoSuchLifecycleConfiguration":
+                    raise
+                rules = []
+            days = next((t["Days"] for r in rules if r.get("ID") == "to-glacier"
+                         for t in r.get("Transitions", []) if t.get("StorageClass") == "GLACIER"), None)
+            return {"lifecycle_days_glacier": days}
+
+        live = fan_out(_one, [b for b in names.values() if b in owned])
+        return {nid: live.get(bucket) for nid, bucket in names.items()}
+
+    @staticmethod
+    def wire_key(edge, types):
+        return (edge["from"], edge["to"]) if edge["via"] == "s3_event" else None
+
     @staticmethod
     def wire(edge, refs, ctx) -> None:
         """Wire S3:ObjectCreated -> Lambda when via == 's3_event'."""
         if edge["via"] != "s3_event":
             return
-        sess = ctx["session"]
-        s3 = sess.client("s3")
-        lam = sess.client("lambda")
+        s3 = ctx["aws"].client("s3")
+        lam = ctx["aws"].client("lambda")
 
         src = refs.get(edge["from"], {})
         dst = refs.get(edge["to"], {})
@@ -72,7 +99,7 @@ class S3Bucket:
         if not bucket or not fn_name:
             return
 
-        fn_arn = lam.get_function(FunctionName=fn_name)["Configuration"]["FunctionArn"]
+        fn_arn = function_arn(ctx["aws"], fn_name)
         # permission
         try:
             lam.add_permission(
@@ -94,9 +121,9 @@ class S3Bucket:
             )
 
     @staticmethod
-    def destroy(node: Dict[str, Any], ctx: Dict[str, Any]) -> None:
-        # do not auto-empty buckets in PoC
-        pass
+    def destroy(node: Dict[str, Any], ctx: Dict[str, Any]) -> bool:
+        # do not auto-empty buckets in PoC: the bucket is kept
+        return False
 
 
 SERVICE = S3Bucket
@@ -0,0 +1,26 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+# run from any directory: the repo root holds the utils/ and managed_svcs/ packages
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def load_lambda(monkeypatch):
+    """Import lambda_src/<name>/app.py as a fresh module with the given env vars set."""
+
+    def load(name, **env):
+        pytest.importorskip("boto3")
+        monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+        for k, v in env.items():
+            monkeypatch.setenv(k, str(v))
+        spec = importlib.util.spec_from_file_location(f"{name}_app", os.path.join(ROOT, "lambda_src", name, "app.py"))
+        mod = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(mod)
+        return mod
+
+    return load
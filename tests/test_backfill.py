@@ -0,0 +1,148 @@
+from utils.backfill import BulkWriter, Checkpoint
+
+
+def _ckpt(tmp_path, **meta):
+    args = {"bucket": "b", "prefix": "p/", "index": "docs", **meta}
+    return Checkpoint(str(tmp_path / "ckpt.json"), args["bucket"], args["prefix"], args["index"])
+
+
+def test_watermark_advances_only_over_the_settled_prefix(tmp_path):
+    ck = _ckpt(tmp_path)
+    for k in ("a", "b", "c"):
+        ck.started(k)
+    ck.finished("b", 2, 20)
+    assert ck.after == "" and ck.done_ahead == {"b"}
+    assert ck.skip("b") and not ck.skip("a")
+    ck.finished("a", 1, 10)
+    assert ck.after == "b" and ck.done_ahead == set()
+    ck.finished("c", 1, 5)
+    assert ck.after == "c"
+    assert ck.totals == {"objects": 3, "chunks": 4, "bytes": 35}
+
+
+def test_failures_settle_the_watermark_and_are_retried_after_reload(tmp_path):
+    ck = _ckpt(tmp_path)
+    for k in ("a", "b", "c"):
+        ck.started(k)
+    ck.finished("a", 1, 1)
+    ck.finished("b", 0, 0, error="boom")
+    ck.finished("c", 1, 1)
+    assert ck.after == "c" and ck.failed == {"b": "boom"}
+    ck.save()
+
+    again = _ckpt(tmp_path).load()
+    assert again.after == "c" and again.retry == ["b"]
+    assert again.totals["objects"] == 2
+    again.started("b", listed=False)
+    again.finished("b", 3, 7)
+    assert again.failed == {} and again.after == "c"
+
+
+def test_checkpoint_for_another_target_is_ignored(tmp_path):
+    ck = _ckpt(tmp_path)
+    ck.started("a")
+    ck.finished("a", 1, 1)
+    ck.save()
+    other = _ckpt(tmp_path, index="other").load()
+    assert other.after == "" and other.totals["objects"] == 0
+
+
+class _Resp:
+    def __init__(self, status, items=None):
+        self.status_code = status
+        self._items = items or []
+
+    def json(self):
+        return {"items": self._items}
+
+
+def _writer(responses, **kw):
+    sent = []
+
+    def post(path, body):
+        sent.append(body)
+        return responses.pop(0)
+
+    return BulkWriter(post, "docs", retries=2, **kw), sent
+
+
+def test_rejected_request_acks_every_item_as_failed():
+    w, _ = _writer([_Resp(400)], batch=2)
+    acks = []
+    w.add({"id": "1"}, acks.append)
+    w.add({"id": "2"}, acks.append)
+    assert acks == [False, False]
+
+
+def test_only_retryable_items_are_resent(monkeypatch):
+    monkeypatch.setattr("utils.backfill.time.sleep", lambda _: None)
+    ok, busy, bad = {"index": {"status": 201}}, {"index": {"status": 429}}, {"index": {"status": 400}}
+    w, sent = _writer([_Resp(200, [ok, busy, bad]), _Resp(200, [ok])], batch=10)
+    acks = {}
+    for i in "abc":
+        w.add({"id": i}, lambda good, i=i: acks.__setitem__(i, good))
+    w.flush()
+    assert acks == {"a": True, "b": True, "c": False}
+    assert len(sent) == 2 and '"_id": "b"' in sent[1] and '"_id": "a"' not in sent[1]
+
+
+def test_throttling_halves_the_batch(monkeypatch):
+    monkeypatch.setattr("utils.backfill.time.sleep", lambda _: None)
+    w, _ = _writer([_Resp(429), _Resp(200, [{"index": {"status": 201}}])], batch=40, min_batch=10)
+    w.add({"id": "x"}, lambda _: None)
+    w.flush()
+    assert w.batch < 40
+
+
+def test_transport_errors_are_retried(monkeypatch):
+    monkeypatch.setattr("utils.backfill.time.sleep", lambda _: None)
+    calls = []
+
+    def post(path, body):
+        calls.append(body)
+        if len(calls) == 1:
+            raise ConnectionError("reset by peer")
+        return _Resp(200, [{"index": {"status": 201}}])
+
+    w = BulkWriter(post, "docs", batch=40, min_batch=10, retries=2)
+    acks = []
+    w.add({"id": "k0"}, acks.append)
+    w.flush()
+    assert acks == [True] and len(calls) == 2
+
+
+def test_items_fail_once_transport_retries_run_out(monkeypatch):
+    monkeypatch.setattr("utils.backfill.time.sleep", lambda _: None)
+
+    def post(path, body):
+        raise TimeoutError("read timed out")
+
+    w = BulkWriter(post, "docs", batch=2, retries=2)
+    acks = []
+    w.add({"id": "a"}, acks.append)
+    w.add({"id": "b"}, acks.append)
+    assert acks == [False, False] and w.requests == 3
+
+
+def test_too_large_request_is_split_before_resending():
+    sent = []
+
+    def post(path, body):
+        n = body.count('"_index"')
+        sent.append(n)
+        return _Resp(413) if n > 2 else _Resp(200, [{"index": {"status": 201}}] * n)
+
+    w = BulkWriter(post, "docs", batch=100)
+    acks = []
+    for i in range(5):
+        w.add({"id": str(i)}, acks.append)
+    w.flush()
+    assert acks == [True] * 5
+    assert sent == [5, 2, 3, 1, 2]
+
+
+def test_single_document_over_the_limit_fails():
+    w, sent = _writer([_Resp(413)], batch=1)
+    acks = []
+    w.add({"id": "huge"}, acks.append)
+    assert acks == [False] and len(sent) == 1
@@ -0,0 +1,73 @@
+import types
+
+import pytest
+
+pytest.importorskip("boto3")
+import dagctl  # noqa: E402
+from utils.state import load_state, node_digest  # noqa: E402
+
+
+class _Svc:
+    IN_PORTS = ["x"]
+    OUT_PORTS = ["x"]
+
+    def __init__(self, kind, log):
+        self.NODE_KIND = kind
+        self.log = log
+
+    def deploy(self, node, ctx):
+        self.log.append(node["id"])
+        return {"id": node["id"], "v": node["props"].get("v"), "up": sorted(ctx["refs"])}
+
+
+@pytest.fixture
+def deploy(monkeypatch, tmp_path):
+    log = []
+    monkeypatch.setattr(dagctl, "_init_session", lambda doc: types.SimpleNamespace(region_name="us-east-1"))
+    monkeypatch.setattr(dagctl, "REGISTRY", {"t.node": _Svc("t.node", log)})
+    monkeypatch.setattr(dagctl, "port_map", lambda: {"t.node": {"in": ["x"], "out": ["x"]}})
+    state = str(tmp_path / "g.state.json")
+
+    def run(v_a=1, v_c=1, force=False):
+        doc = {
+            "name": "g",
+            "nodes": [{"id": "a", "type": "t.node", "props": {"v": v_a}},
+                      {"id": "b", "type": "t.node", "props": {}},
+                      {"id": "c", "type": "t.node", "props": {"v": v_c}}],
+            "edges": [{"from": "a", "to": "b", "via": "x"}],
+        }
+        log.clear()
+        dagctl.cmd_deploy(doc, state_path=state, force=force)
+        return sorted(log)
+
+    return run, state
+
+
+def test_unchanged_nodes_reuse_their_saved_refs(deploy):
+    run, state = deploy
+    assert run() == ["a", "b", "c"]
+    saved = load_state(state)["nodes"]
+    assert run() == []
+    assert load_state(state)["nodes"] == saved
+
+
+def test_a_change_redeploys_the_node_and_its_dependents_only(deploy):
+    run, state = deploy
+    run()
+    assert run(v_a=2) == ["a", "b"]
+    assert load_state(state)["nodes"]["a"]["refs"]["v"] == 2
+    assert run(v_a=2, v_c=5) == ["c"]
+
+
+def test_force_ignores_the_state_file(deploy):
+    run, _ = deploy
+    run()
+    assert run(force=True) == ["a", "b", "c"]
+
+
+def test_lambda_digest_follows_the_document_artifact_bucket():
+    node = {"id": "fn", "type": "lambda.fn", "props": {"function_name": "fn"}}
+    one = node_digest(node, {}, {"doc": {"artifact_bucket": "one"}})
+    assert one != node_digest(node, {}, {"doc": {"artifact_bucket": "two"}})
+    pinned = {**node, "props": {"function_name": "fn", "artifact_bucket": "one"}}
+    assert node_digest(pinned, {}, {"doc": {"artifact_bucket": "two"}}) == node_digest(pinned, {}, {"doc": {}})
@@ -0,0 +1,79 @@
+import pytest
+
+from utils.graph import GraphError, GraphIndex, topo_sort, validate_graph
+
+PORTS = {
+    "lambda.fn": {"in": ["records", "invoke"], "out": ["invoke"]},
+    "kinesis.stream": {"in": [], "out": ["records"]},
+}
+
+
+def _doc(nodes, edges):
+    return {"nodes": [{"id": i, "type": t, "props": p} for i, t, p in nodes],
+            "edges": [{"from": f, "to": t, "via": v} for f, t, v in edges]}
+
+
+def test_index_builds_adjacency_and_ports():
+    doc = _doc([("s", "kinesis.stream", {}), ("f", "lambda.fn", {}), ("g", "lambda.fn", {})],
+               [("s", "f", "records"), ("f", "g", "invoke")])
+    g = GraphIndex(doc)
+    assert g.errors == []
+    assert g.succ == {"s": ["f"], "f": ["g"], "g": []}
+    assert g.pred == {"s": [], "f": ["s"], "g": ["f"]}
+    assert [e["to"] for e in g.port("s", "out", "records")] == ["f"]
+    assert g.port("g", "out", "invoke") == []
+    assert g.of_type == {"kinesis.stream": ["s"], "lambda.fn": ["f", "g"]}
+    assert g.topo_order() == ["s", "f", "g"]
+    assert g.levels() == {"s": 0, "f": 1, "g": 2}
+    assert g.is_upstream("s", "g") and not g.is_upstream("g", "s")
+
+
+def test_index_records_duplicate_ids_and_dangling_edges():
+    doc = _doc([("a", "lambda.fn", {}), ("a", "lambda.fn", {})], [("a", "ghost", "invoke")])
+    g = GraphIndex(doc)
+    assert "Duplicate node id: a" in g.errors
+    assert any("unknown node(s): ghost" in e for e in g.errors)
+    assert g.valid_edges == [] and g.succ == {"a": []}
+
+
+def test_cycle_raises_graph_error_naming_the_nodes():
+    doc = _doc([("a", "lambda.fn", {}), ("b", "lambda.fn", {}), ("c", "lambda.fn", {})],
+               [("a", "b", "invoke"), ("b", "a", "invoke")])
+    with pytest.raises(GraphError) as ex:
+        GraphIndex(doc).topo_order()
+    assert str(ex.value) == "Cycle detected among: a, b"
+
+
+def test_topo_sort_rejects_structural_errors():
+    with pytest.raises(GraphError):
+        topo_sort([{"id": "a", "type": "lambda.fn"}], [{"from": "a", "to": "b", "via": "invoke"}])
+
+
+def test_validate_reports_every_problem():
+    doc = _doc([("s", "kinesis.stream", {}), ("f", "lambda.fn", {"env": {"X": "ref:g"}}),
+                ("g", "lambda.fn", {}), ("x", "nope.kind", {})],
+               [("f", "s", "records"), ("f", "g", "invoke")])
+    with pytest.raises(GraphError) as ex:
+        validate_graph(doc, PORTS)
+    errors = ex.value.errors
+    assert "Unsupported node type: nope.kind (x)" in errors
+    assert "Edge f -> s: via 'records' not produced by lambda.fn" in errors
+    assert "Edge f -> s: via 'records' not accepted by kinesis.stream" in errors
+    assert any("f.props.env.X: 'g' is not upstream of f" in e for e in errors)
+
+
+def test_validate_returns_the_index_for_a_good_graph():
+    doc = _doc([("s", "kinesis.stream", {}), ("f", "lambda.fn", {"env": {"STREAM_ARN": "ref:s.stream_arn"}})],
+               [("s", "f", "records")])
+    g = validate_graph(doc, PORTS)
+    assert g.topo_order() == ["s", "f"]
+
+
+def test_streaming_url_cannot_be_an_api_gateway_target():
+    ports = {**PORTS, "apigw.http": {"in": [], "out": ["http"]},
+             "lambda.fn": {"in": ["http"], "out": []}}
+    doc = _doc([("api", "apigw.http", {}), ("f", "lambda.fn", {"function_url": {"invoke_mode": "RESPONSE_STREAM"}})],
+               [("api", "f", "http")])
+    with pytest.raises(GraphError) as ex:
+        validate_graph(doc, ports)
+    assert any("cannot also be an API Gateway" in e for e in ex.value.errors)
@@ -0,0 +1,106 @@
+import http.client
+import json
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+
+def _app(load_lambda, monkeypatch, calls, **env):
+    app = load_lambda("retriever", OPENSEARCH_ENDPOINT="https://aoss.example", **env)
+
+    def embed(text):
+        calls.append(text)
+        return [float(len(text))]
+
+    monkeypatch.setattr(app, "_embed", embed)
+    return app
+
+
+def test_query_embedding_keeps_case_and_caches_on_layout(load_lambda, monkeypatch):
+    calls = []
+    app = _app(load_lambda, monkeypatch, calls)
+    app._embed_query("What  does\tNASA do?")
+    app._embed_query(" What does NASA do? ")
+    app._embed_query("what does nasa do?")
+    assert calls == ["What does NASA do?", "what does nasa do?"]
+    assert app._embed_cache.hits == 1
+
+
+def test_truncated_tail_stays_within_the_budget(load_lambda):
+    app = load_lambda("retriever", CONTEXT_MIN_TOKENS=4)
+    words = " ".join(f"w{i:03d}" for i in range(400))
+    for budget in (5, 17, 40, 101):
+        docs = [{"id": "a", "text": "x" * 40, "score": 2.0}, {"id": "b", "text": words, "score": 1.0}]
+        packed = app.pack_context(docs, budget)
+        assert packed[-1].endswith(" …")
+        assert sum(app._tokens(t) for t in packed) <= budget
+
+
+def test_pack_context_drops_repeats_and_neighbour_overlap(load_lambda):
+    app = load_lambda("retriever")
+    shared = "the overlap between windows "
+    docs = [
+        {"id": "d#0", "doc_id": "d", "chunk": 0, "text": "first window, " + shared, "score": 3.0},
+        {"id": "d#0", "doc_id": "d", "chunk": 0, "text": "first window, " + shared, "score": 2.5},
+        {"id": "d#1", "doc_id": "d", "chunk": 1, "text": shared + "second window", "score": 2.0},
+    ]
+    assert app.pack_context(docs, 1000) == ["first window, " + shared, "second window"]
+
+
+def _stub_search(app, monkeypatch, docs):
+    monkeypatch.setattr(app, "_embed_query", lambda q: [1.0])
+    monkeypatch.setattr(app, "_topk_cached", lambda vec, k, ef: docs)
+
+
+def test_stream_answer_yields_docs_then_tokens_then_done(load_lambda, monkeypatch):
+    app = load_lambda("retriever", OPENSEARCH_ENDPOINT="https://aoss.example")
+    docs = [{"id": "d#0", "text": "context", "score": 1.0}]
+    _stub_search(app, monkeypatch, docs)
+    chunks = [{"outputText": "Hel"}, {"generation": ""}, {"delta": {"text": "lo"}}]
+    stream = [{"chunk": {"bytes": json.dumps(c).encode()}} for c in chunks] + [{"metadata": {}}]
+    monkeypatch.setattr(app.bedrock, "invoke_model_with_response_stream", lambda **kw: {"body": iter(stream)})
+    assert list(app.stream_answer("hi", 5, 0)) == [
+        {"type": "docs", "docs": docs},
+        {"type": "token", "text": "Hel"},
+        {"type": "token", "text": "lo"},
+        {"type": "done"},
+    ]
+
+
+@pytest.fixture
+def server(load_lambda, monkeypatch):
+    app = load_lambda("retriever", OPENSEARCH_ENDPOINT="https://aoss.example")
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), app.StreamingHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+    def post(path, body):
+        conn = http.client.HTTPConnection("127.0.0.1", httpd.server_port, timeout=5)
+        conn.request("POST", path, json.dumps(body), {"content-type": "application/json"})
+        r = conn.getresponse()
+        return r.status, r.read().decode()
+
+    yield app, post
+    httpd.shutdown()
+
+
+def test_stream_endpoint_sends_ndjson_events_in_order(server, monkeypatch):
+    app, post = server
+    events = [{"type": "docs", "docs": []}, {"type": "token", "text": "hey"}, {"type": "done"}]
+    monkeypatch.setattr(app, "stream_answer", lambda q, k, ef: iter(events))
+    status, body = post("/chat/stream", {"q": "hey"})
+    assert status == 200
+    assert [json.loads(line)["type"] for line in body.splitlines()] == ["docs", "token", "done"]
+
+
+def test_backend_failure_returns_json_500(server, monkeypatch):
+    app, post = server
+
+    def boom(*_):
+        raise RuntimeError("ThrottlingException")
+
+    monkeypatch.setattr(app, "answer", boom)
+    monkeypatch.setattr(app, "answer_batch", boom)
+    assert post("/chat", {"q": "x"}) == (500, '{"error": "ThrottlingException"}')
+    assert post("/chat/batch", {"questions": ["x"]}) == (500, '{"error": "ThrottlingException"}')
+    assert post("/chat", {"k": 0})[0] == 400
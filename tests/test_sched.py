@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pytest
+
+from utils.sched import run_dag
+
+
+def test_runs_every_node_after_its_predecessors():
+    order = ["a", "b", "c", "d"]
+    edges = [("a", "b"), ("a", "c"), ("b", "d"), ("c", "d")]
+    done = []
+    lock = threading.Lock()
+
+    def fn(nid):
+        with lock:
+            done.append(nid)
+        return nid.upper()
+
+    results, errors, skipped = run_dag(order, edges, fn, max_parallel=4)
+    assert results == {"a": "A", "b": "B", "c": "C", "d": "D"}
+    assert errors == {} and skipped == []
+    assert done[0] == "a" and done[-1] == "d"
+
+
+def test_failure_skips_descendants_but_finishes_independent_branches():
+    order = ["root", "bad", "child", "grandchild", "other", "other_child"]
+    edges = [("root", "bad"), ("bad", "child"), ("child", "grandchild"), ("root", "other"), ("other", "other_child")]
+    ran = []
+
+    def fn(nid):
+        ran.append(nid)
+        if nid == "bad":
+            raise RuntimeError("boom")
+
+    results, errors, skipped = run_dag(order, edges, fn, max_parallel=2)
+    assert set(errors) == {"bad"} and isinstance(errors["bad"], RuntimeError)
+    assert skipped == ["child", "grandchild"]
+    assert "child" not in ran and "grandchild" not in ran
+    assert set(results) == {"root", "other", "other_child"}
+
+
+def test_node_with_one_failed_parent_is_skipped():
+    order = ["ok", "bad", "join"]
+    edges = [("ok", "join"), ("bad", "join")]
+
+    def fn(nid):
+        if nid == "bad":
+            raise ValueError(nid)
+
+    _, errors, skipped = run_dag(order, edges, fn)
+    assert set(errors) == {"bad"} and skipped == ["join"]
+
+
+@pytest.mark.parametrize("limit", [1, 3])
+def test_never_exceeds_max_parallel(limit):
+    active = peak = 0
+    lock = threading.Lock()
+
+    def fn(_):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.01)
+        with lock:
+            active -= 1
+
+    run_dag([f"n{i}" for i in range(8)], [], fn, max_parallel=limit)
+    assert peak == limit
+
+
+def test_ready_nodes_start_in_order_priority():
+    started = []
+    run_dag(["c", "a", "b"], [], started.append, max_parallel=1)
+    assert started == ["c", "a", "b"]
@@ -0,0 +1,83 @@
+import base64
+import json
+
+
+def _record(rid, **payload):
+    return {"recordId": rid, "data": base64.b64encode(json.dumps(payload).encode()).decode()}
+
+
+def _decode(rec):
+    return json.loads(base64.b64decode(rec["data"]))
+
+
+def _app(load_lambda, monkeypatch, calls, **env):
+    app = load_lambda("transform_embed", **env)
+
+    def embed(text):
+        calls.append(text)
+        if text == "boom":
+            raise RuntimeError("bedrock said no")
+        return [float(len(text))]
+
+    monkeypatch.setattr(app, "_embed", embed)
+    return app
+
+
+def test_output_keeps_input_order_and_dedups_texts(load_lambda, monkeypatch):
+    calls = []
+    app = _app(load_lambda, monkeypatch, calls, EMBED_CONCURRENCY=4)
+    records = [_record(f"r{i}", id=f"d{i}", text=t, chunk=i) for i, t in enumerate(["a  b", "ccc", "a b", "dddd"])]
+    out = app.handler({"records": records}, None)["records"]
+    assert [r["recordId"] for r in out] == ["r0", "r1", "r2", "r3"]
+    assert all(r["result"] == "Ok" for r in out)
+    docs = [_decode(r) for r in out]
+    assert [d["id"] for d in docs] == ["d0", "d1", "d2", "d3"]
+    assert docs[0]["embedding"] == docs[2]["embedding"] == [3.0]
+    assert docs[1]["chunk"] == 1 and docs[1]["text"] == "ccc"
+    assert sorted(calls) == ["a b", "ccc", "dddd"]
+
+
+def test_bad_records_fail_alone(load_lambda, monkeypatch):
+    app = _app(load_lambda, monkeypatch, [])
+    records = [
+        _record("ok", id="d0", text="fine"),
+        _record("no-id", text="missing id"),
+        _record("no-text", id="d2"),
+        {"recordId": "garbage", "data": "bm90IGpzb24="},
+        _record("embed-error", id="d4", text="boom"),
+    ]
+    out = app.handler({"records": records}, None)["records"]
+    assert [(r["recordId"], r["result"]) for r in out] == [
+        ("ok", "Ok"), ("no-id", "ProcessingFailed"), ("no-text", "ProcessingFailed"),
+        ("garbage", "ProcessingFailed"), ("embed-error", "ProcessingFailed"),
+    ]
+    assert out[1]["data"] == records[1]["data"]
+
+
+def test_warm_invocations_hit_the_memory_cache(load_lambda, monkeypatch):
+    calls = []
+    app = _app(load_lambda, monkeypatch, calls)
+    app.handler({"records": [_record("r0", id="d0", text="same")]}, None)
+    app.handler({"records": [_record("r1", id="d1", text="same")]}, None)
+    assert calls == ["same"]
+    assert app._cache.stats["mem_hits"] == 1 and app._cache.stats["misses"] == 1
+
+
+def test_disk_tier_serves_a_cold_container(load_lambda, monkeypatch, tmp_path):
+    calls = []
+    app = _app(load_lambda, monkeypatch, calls, EMBED_CACHE_DIR=tmp_path)
+    app.handler({"records": [_record("r0", id="d0", text="persisted")]}, None)
+    cold = _app(load_lambda, monkeypatch, calls, EMBED_CACHE_DIR=tmp_path)
+    out = cold.handler({"records": [_record("r1", id="d1", text="persisted")]}, None)["records"]
+    assert calls == ["persisted"] and _decode(out[0])["embedding"] == [9.0]
+    assert cold._cache.stats["disk_hits"] == 1
+
+
+def test_lru_evicts_the_least_recently_used(load_lambda):
+    app = load_lambda("transform_embed")
+    cache = app.EmbeddingCache(2)
+    cache.put("a", [1])
+    cache.put("b", [2])
+    cache.get("a")
+    cache.put("c", [3])
+    assert cache.get("b") is None and cache.get("a") == [1] and cache.get("c") == [3]
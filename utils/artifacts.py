@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import base64
+import compileall
+import hashlib
+import os
+import py_compile
+import shutil
+import subprocess
+import sys
+import threading
+import zipfile
+from typing import Any, BinaryIO, Dict, Optional, Tuple, Union
+
+from utils.state import STATE_DIR, tree_digest
+
+CACHE_DIR = os.path.join(STATE_DIR, "artifacts")
+ZIP_FORMAT = "v2"  # bump when the archive layout changes to invalidate cached zips
+INLINE_MAX_BYTES = 50 * 1000 * 1000  # Lambda's direct-upload limit for zipped code
+_EPOCH = (1980, 1, 1, 0, 0, 0)  # earliest timestamp a zip can store
+_SKIP_DIRS = {"__pycache__", ".git", ".pytest_cache"}
+_PRUNE_DIRS = {"tests", "test", "__pycache__", ".pytest_cache"}
+_KEEP_DIST_INFO = {"METADATA", "entry_points.txt", "top_level.txt"}
+_PLATFORMS = {"x86_64": "manylinux2014_x86_64", "arm64": "manylinux2014_aarch64"}
+
+
+def write_zip(src_dir: str, target: Union[str, BinaryIO], bytecode: bool = False) -> None:
+    """Write a reproducible zip of src_dir: sorted entries, fixed timestamps and modes.
+
+    Files are streamed into the archive one block at a time, so memory stays flat
+    regardless of package size. Bytecode is skipped unless bytecode=True.
+    """
+    entries = []
+    for root, dirs, files in os.walk(src_dir):
+        dirs[:] = [d for d in dirs if d not in _SKIP_DIRS or (bytecode and d == "__pycache__")]
+        for f in files:
+            if f.endswith((".pyc", ".pyo")) and not bytecode:
+                continue
+            fp = os.path.join(root, f)
+            entries.append((os.path.relpath(fp, start=src_dir).replace(os.sep, "/"), fp))
+    with zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED) as zf:
+        for arc, fp in sorted(entries):
+            info = zipfile.ZipInfo(arc, date_time=_EPOCH)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            mode = 0o755 if os.access(fp, os.X_OK) else 0o644
+            info.external_attr = (0o100000 | mode) << 16
+            with open(fp, "rb") as src, zf.open(info, "w") as dst:
+                shutil.copyfileobj(src, dst, 1 << 20)
+
+
+def code_sha256(path: str) -> str:
+    """base64(sha256(file)), the format Lambda reports as CodeSha256."""
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            h.update(block)
+    return base64.b64encode(h.digest()).decode("ascii")
+
+
+def _runtime_version(runtime: Optional[str]) -> Optional[str]:
+    """'python3.12' -> '3.12'."""
+    if runtime and runtime.startswith("python"):
+        return runtime[len("python"):]
+    return None
+
+
+def _vendor(requirements: str, build_dir: str, runtime: Optional[str], arch: str) -> None:
+    """pip install requirements into build_dir as Lambda-compatible wheels."""
+    cmd = [sys.executable, "-m", "pip", "install", "-q", "--disable-pip-version-check",
+           "--no-compile", "-r", requirements, "-t", build_dir]
+    ver = _runtime_version(runtime)
+    if ver:
+        cmd += ["--platform", _PLATFORMS.get(arch, _PLATFORMS["x86_64"]), "--implementation", "cp",
+                "--python-version", ver, "--only-binary=:all:"]
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"Vendoring {requirements} failed:\n{proc.stderr.strip()}")
+
+
+def _prune(build_dir: str) -> None:
+    """Drop tests, caches, console scripts and .dist-info bloat from vendored packages."""
+    for root, dirs, files in os.walk(build_dir):
+        for d in list(dirs):
+            if d in _PRUNE_DIRS or (d == "bin" and root == build_dir):
+                shutil.rmtree(os.path.join(root, d), ignore_errors=True)
+                dirs.remove(d)
+        if root.endswith(".dist-info"):
+            for f in files:
+                if f not in _KEEP_DIST_INFO:
+                    os.remove(os.path.join(root, f))
+            for d in dirs:  # licenses/ and friends
+                shutil.rmtree(os.path.join(root, d), ignore_errors=True)
+            dirs[:] = []
+
+
+def _precompile(build_dir: str, runtime: Optional[str]) -> bool:
+    """Compile .py to hash-based .pyc so cold starts skip compilation and source stat calls.
+
+    Only possible when this interpreter matches the function's runtime; bytecode
+    for another Python version would just be ignored at import time.
+    """
+    if _runtime_version(runtime) != f"{sys.version_info[0]}.{sys.version_info[1]}":
+        return False
+    # a few vendored files may not compile (py2 leftovers); they just load from source
+    compileall.compile_dir(build_dir, quiet=2, invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+    return True
+
+
+def _zip_key(src_dir: str, runtime: Optional[str], arch: str) -> str:
+    return hashlib.sha256(f"{ZIP_FORMAT}|{runtime}|{arch}|{tree_digest(src_dir)}".encode()).hexdigest()
+
+
+def cached_lambda_zip(
+    src_dir: str,
+    runtime: Optional[str] = None,
+    arch: str = "x86_64",
+    cache_dir: str = CACHE_DIR,
+) -> Optional[Tuple[str, str]]:
+    """(zip path, CodeSha256) without running pip: the cached build, else a fresh zip
+    when src_dir has nothing to vendor; None when only a full build would tell."""
+    path = os.path.join(cache_dir, f"{_zip_key(src_dir, runtime, arch)}.zip")
+    if os.path.exists(path):
+        return path, code_sha256(path)
+    if not os.path.exists(os.path.join(src_dir, "requirements.txt")):
+        return build_lambda_zip(src_dir, runtime, arch, cache_dir)
+    return None
+
+
+def build_lambda_zip(
+    src_dir: str,
+    runtime: Optional[str] = None,
+    arch: str = "x86_64",
+    cache_dir: str = CACHE_DIR,
+) -> Tuple[str, str]:
+    """Return (zip path, CodeSha256) for src_dir, reusing a cached zip for identical inputs.
+
+    The sources are staged into a build dir, src_dir/requirements.txt (if any)
+    is vendored next to them and pruned, bytecode is precompiled when possible,
+    and the result is streamed to a zip on disk.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    key = _zip_key(src_dir, runtime, arch)
+    path = os.path.join(cache_dir, f"{key}.zip")
+    if not os.path.exists(path):
+        tag = f"{os.getpid()}-{threading.get_ident()}"
+        build_dir = os.path.join(cache_dir, f"build-{key[:16]}-{tag}")
+        try:
+            shutil.copytree(src_dir, build_dir, ignore=shutil.ignore_patterns(*_SKIP_DIRS, "*.pyc", "*.pyo"))
+            req = os.path.join(build_dir, "requirements.txt")
+            if os.path.exists(req):
+                _vendor(req, build_dir, runtime, arch)
+                _prune(build_dir)
+            compiled = _precompile(build_dir, runtime)
+            tmp = f"{path}.{tag}.tmp"
+            write_zip(build_dir, tmp, bytecode=compiled)
+            os.replace(tmp, path)
+        finally:
+            shutil.rmtree(build_dir, ignore_errors=True)
+    return path, code_sha256(path)
+
+
+def code_location(pool, fn_name: str, zip_path: str, code_sha: str, bucket: Optional[str]) -> Dict[str, Any]:
+    """Lambda Code arguments: S3Bucket/S3Key when an artifact bucket is set, else ZipFile.
+
+    S3 keys are content-addressed, so an artifact already uploaded is not sent again.
+    Uploads use parallel multipart transfers.
+    """
+    size = os.path.getsize(zip_path)
+    if not bucket:
+        if size > INLINE_MAX_BYTES:
+            raise ValueError(
+                f"{fn_name}: artifact is {size} bytes (> {INLINE_MAX_BYTES} inline limit); set artifact_bucket"
+            )
+        with open(zip_path, "rb") as fh:
+            return {"ZipFile": fh.read()}
+
+    from boto3.s3.transfer import TransferConfig
+    from botocore.exceptions import ClientError
+
+    s3 = pool.client("s3")
+    key = f"dagctl/artifacts/{fn_name}/{base64.b64decode(code_sha).hex()}.zip"
+    try:
+        s3.head_object(Bucket=bucket, Key=key)
+    except ClientError:
+        cfg = TransferConfig(multipart_threshold=8 * 1024 * 1024, multipart_chunksize=16 * 1024 * 1024, max_concurrency=8)
+        s3.upload_file(zip_path, bucket, key, Config=cfg)
+    return {"S3Bucket": bucket, "S3Key": key}
@@ -2,11 +2,11 @@ from __future__ import annotations
 
 import io
 import json
-import os
-import zipfile
-from typing import Any, Dict, List, Optional
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
 
 import boto3
+from botocore.config import Config
 from aws_requests_auth.aws_auth import AWSRequestsAuth
 
 
@@ -17,20 +17,92 @@ def build_session(region: Optional[str], profile: Optional[str]) -> boto3.sessio
     return boto3.session.Session(region_name=region)
 
 
+class ClientPool:
+    """Thread-safe boto3 client cache keyed by (service, region), plus memoized lookups.
+
+    boto3 sessions are not thread-safe but clients are, so clients are created
+    under a lock from one session and then shared by every worker.
+    """
+
+    def __init__(self, session: boto3.session.Session, max_pool_connections: int = 32):
+        self.session = session
+        self.region = session.region_name
+        self._config = Config(max_pool_connections=max_pool_connections)
+        self._clients: Dict[Tuple[str, Optional[str]], Any] = {}
+        self._lock = threading.Lock()
+        self._memo: Dict[Hashable, Any] = {}
+        self._memo_locks: Dict[Hashable, threading.Lock] = {}
+
+    def client(self, service: str, region: Optional[str] = None):
+        key = (service, region or self.region)
+        c = self._clients.get(key)
+        if c is None:
+            with self._lock:
+                c = self._clients.get(key)
+                if c is None:
+                    c = self.session.client(service, region_name=key[1], config=self._config)
+                    self._clients[key] = c
+        return c
+
+    def memo(self, key: Hashable, load: Callable[[], Any]) -> Any:
+        """Return load() once per key; concurrent callers for the same key wait for the first.
+
+        Exceptions are not cached, so a lookup of a not-yet-created resource is retried next time.
+        """
+        if key in self._memo:
+            return self._memo[key]
+        with self._lock:
+            lock = self._memo_locks.setdefault(key, threading.Lock())
+        with lock:
+            if key not in self._memo:
+                self._memo[key] = load()
+            return self._memo[key]
+
+    def forget(self, key: Hashable) -> None:
+        """Drop a memoized lookup after the resource behind it changed."""
+        self._memo.pop(key, None)
+
+
+def account_id(pool: ClientPool) -> str:
+    return pool.memo(("sts", "account"), lambda: pool.client("sts").get_caller_identity()["Account"])
+
+
+def function_config(pool: ClientPool, fn_name: str) -> Dict[str, Any]:
+    """Lambda Configuration (ARN, Role, ...) for fn_name, fetched once per run."""
+    return pool.memo(("lambda", fn_name), lambda: pool.client("lambda").get_function(FunctionName=fn_name)["Configuration"])
+
+
+def function_arn(pool: ClientPool, fn_name: str) -> str:
+    return function_config(pool, fn_name)["FunctionArn"]
+
+
+def stream_arn(pool: ClientPool, name: str) -> str:
+    return pool.memo(
+        ("kinesis", name),
+        lambda: pool.client("kinesis").describe_stream_summary(StreamName=name)["StreamDescriptionSummary"]["StreamARN"],
+    )
+
+
+_NOT_FOUND_CODES = {"ResourceNotFoundException", "NotFoundException", "NoSuchBucket", "NoSuchEntity", "404"}
+
+
+def is_not_found(exc: BaseException) -> bool:
+    """True for the service-specific flavours of 'no such resource'."""
+    code = getattr(exc, "response", {}).get("Error", {}).get("Code")
+    return code in _NOT_FOUND_CODES
+
+
 def tag_list(tags: Dict[str, str]) -> List[Dict[str, str]]:
     """Convert dict to AWS Tag list."""
     return [{"Key": k, "Value": v} for k, v in tags.items()]
 
 
 def make_inline_zip_from_dir(path: str) -> bytes:
-    """Zip a directory for inline Lambda upload."""
+    """Zip a directory for inline Lambda upload (reproducible: same sources, same bytes)."""
+    from utils.artifacts import write_zip
+
     buf = io.BytesIO()
-    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
-        for root, _, files in os.walk(path):
-            for f in files:
-                fp = os.path.join(root, f)
-                arc = os.path.relpath(fp, start=path)
-                zf.write(fp, arc)
+    write_zip(path, buf)
     return buf.getvalue()
 
 
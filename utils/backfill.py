@@ -0,0 +1,401 @@
+from __future__ import annotations
+
+import collections
+import importlib.util
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.graph import embedding_spec
+from utils.sched import say
+from utils.state import STATE_DIR
+
+CHECKPOINT_VERSION = 1
+_RETRYABLE = {429, 500, 502, 503, 504}
+
+
+def default_checkpoint_path(doc: Dict[str, Any]) -> str:
+    return os.path.join(STATE_DIR, f"{doc.get('name', 'graph')}.backfill.json")
+
+
+def resolve_targets(doc: Dict[str, Any], state: Dict[str, Any]) -> Dict[str, Any]:
+    """Find the source bucket, the ingester chunking settings, the embeddings model and
+    the vector store in the graph; deployed outputs come from the saved state."""
+    nodes = {n["id"]: n for n in doc["nodes"]}
+    refs = {nid: s.get("refs", {}) for nid, s in state.get("nodes", {}).items()}
+    feed = next((e for e in doc["edges"] if e["via"] == "s3_event" and nodes[e["from"]]["type"] == "s3.bucket"), None)
+    if not feed:
+        raise ValueError("backfill needs an s3.bucket with an s3_event edge to the ingester")
+    ingester = nodes[feed["to"]]
+    model = next((n for n in doc["nodes"] if n["type"] == "bedrock.model" and n.get("props", {}).get("mode") == "embeddings"), None)
+    store = next((n for n in doc["nodes"] if n["type"] == "opensearch.vector"), None)
+    if not model or not store:
+        raise ValueError("backfill needs an embeddings bedrock.model and an opensearch.vector node")
+    spec = embedding_spec(model["props"])
+    spec["model_id"] = refs.get(model["id"], {}).get("model_id") or spec["model_id"]
+    env = ingester.get("props", {}).get("env") or {}
+    return {
+        "bucket": nodes[feed["from"]]["props"]["bucket_name"],
+        "source_dir": ingester["props"].get("source_dir") or "lambda_src/ingester",
+        "chunking": {
+            "size": int(env.get("CHUNK_SIZE", 2000)),
+            "overlap": int(env.get("CHUNK_OVERLAP", 200)),
+            "unit": env.get("CHUNK_UNIT", "chars"),
+        },
+        "embed": spec,
+        "collection": store["props"]["collection_name"],
+        "index": store["props"]["index_name"],
+        "endpoint": refs.get(store["id"], {}).get("endpoint"),
+    }
+
+
+def load_chunker(source_dir: str):
+    """Import the ingester's app.py by path so backfill chunks exactly like the Lambda does."""
+    path = os.path.join(source_dir, "app.py")
+    spec = importlib.util.spec_from_file_location("dagctl_backfill_ingester", path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    for name in ("iter_object_text", "iter_windows"):
+        if not hasattr(mod, name):
+            raise ValueError(f"{path} has no {name}(); backfill reuses the ingester's chunker")
+    return mod
+
+
+def embed_fn(bedrock, spec: Dict[str, Any]) -> Callable[[str], List[float]]:
+    """Same request shape as transform_embed (Titan v2 takes dimensions/normalize)."""
+    def embed(text: str) -> List[float]:
+        body: Dict[str, Any] = {"inputText": text}
+        if spec["model_id"].startswith("amazon.titan-embed-text-v2"):
+            body["normalize"] = spec["normalize"]
+            body["dimensions"] = spec["dimensions"]
+        resp = bedrock.invoke_model(modelId=spec["model_id"], body=json.dumps(body))
+        vec = json.loads(resp["body"].read())["embedding"]
+        if spec["dimensions"] and len(vec) != spec["dimensions"]:
+            raise ValueError(f"{spec['model_id']} returned {len(vec)} dims, expected {spec['dimensions']}")
+        return vec
+    return embed
+
+
+class Checkpoint:
+    """Resumable progress over a lexicographic S3 listing.
+
+    Objects finish out of order, so the file stores a watermark (every key up to
+    and including `after` is settled) plus the few keys settled beyond it; a rerun
+    lists with StartAfter=after and skips those. Failed keys are kept separately
+    and retried first on the next run. Size stays O(in-flight + failed).
+    """
+
+    def __init__(self, path: str, bucket: str, prefix: str, index: str):
+        self.path = path
+        self.meta = {"bucket": bucket, "prefix": prefix, "index": index}
+        self.after = ""
+        self.done_ahead: set = set()
+        self.failed: Dict[str, str] = {}
+        self.retry: List[str] = []
+        self.totals = {"objects": 0, "chunks": 0, "bytes": 0}
+        self._inflight: "collections.deque[str]" = collections.deque()
+        self._lock = threading.Lock()
+
+    def load(self) -> "Checkpoint":
+        try:
+            with open(self.path, "r") as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            return self
+        if data.get("version") != CHECKPOINT_VERSION or {k: data.get(k) for k in self.meta} != self.meta:
+            return self  # different target: start over
+        self.after = data.get("after", "")
+        self.done_ahead = set(data.get("done", []))
+        self.failed = dict(data.get("failed", {}))  # kept until a retry succeeds
+        self.retry = sorted(self.failed)
+        self.totals.update(data.get("totals", {}))
+        return self
+
+    def skip(self, key: str) -> bool:
+        return key <= self.after or key in self.done_ahead
+
+    def started(self, key: str, listed: bool = True) -> None:
+        if listed:
+            with self._lock:
+                self._inflight.append(key)
+
+    def finished(self, key: str, chunks: int, size: int, error: Optional[str] = None) -> None:
+        with self._lock:
+            if error:
+                self.failed[key] = error
+            else:
+                self.failed.pop(key, None)
+                self.totals["objects"] += 1
+                self.totals["chunks"] += chunks
+                self.totals["bytes"] += size
+            if key > self.after:
+                self.done_ahead.add(key)
+            # advance the watermark over the settled prefix of the listing
+            while self._inflight and self._inflight[0] in self.done_ahead:
+                self.after = self._inflight.popleft()
+                self.done_ahead.discard(self.after)
+
+    def save(self) -> None:
+        with self._lock:
+            data = {"version": CHECKPOINT_VERSION, **self.meta, "after": self.after,
+                    "done": sorted(self.done_ahead), "totals": dict(self.totals), "failed": dict(self.failed)}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as fh:
+            json.dump(data, fh, indent=2)
+        os.replace(tmp, self.path)
+
+
+class BulkWriter:
+    """Thread-safe _bulk indexer with AIMD batch sizing.
+
+    Batches grow by half while requests finish under target_s and are halved on
+    throttling (429/5xx), transport errors or slow responses; only the failed
+    items are retried. A 413 splits the request in two before resending.
+    Each item's ack(ok) callback runs once it is indexed or has finally failed,
+    including when the whole request is rejected with a non-retryable status.
+    """
+
+    def __init__(self, post: Callable[[str, str], Any], index: str, batch: int = 200,
+                 min_batch: int = 10, max_batch: int = 2000, max_bytes: int = 8 * 1024 * 1024,
+                 target_s: float = 3.0, retries: int = 6):
+        self.post = post
+        self.index = index
+        self.batch = batch
+        self.min_batch = min_batch
+        self.max_batch = max_batch
+        self.max_bytes = max_bytes
+        self.target_s = target_s
+        self.retries = retries
+        self.requests = 0
+        self._buf: List[Tuple[str, Callable[[bool], None]]] = []
+        self._buf_bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, doc: Dict[str, Any], ack: Callable[[bool], None]) -> None:
+        lines = json.dumps({"index": {"_index": self.index, "_id": doc["id"]}}) + "\n" + json.dumps(doc) + "\n"
+        with self._lock:
+            self._buf.append((lines, ack))
+            self._buf_bytes += len(lines)
+            if len(self._buf) < self.batch and self._buf_bytes < self.max_bytes:
+                return
+            take, self._buf, self._buf_bytes = self._buf, [], 0
+        self._send(take)  # on the caller's thread: concurrency follows the worker pool
+
+    def flush(self) -> None:
+        with self._lock:
+            take, self._buf, self._buf_bytes = self._buf, [], 0
+        if take:
+            self._send(take)
+
+    def _resize(self, grow: bool) -> None:
+        with self._lock:
+            self.batch = min(self.max_batch, int(self.batch * 1.5) + 1) if grow else max(self.min_batch, self.batch // 2)
+
+    def _send(self, items: List[Tuple[str, Callable[[bool], None]]]) -> None:
+        pending = items
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(min(30.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.0))
+            t0 = time.monotonic()
+            self.requests += 1
+            try:
+                r = self.post("/_bulk", "".join(lines for lines, _ in pending))
+            except Exception:  # connection reset, timeout: retry like a 5xx (ids make it idempotent)
+                self._resize(grow=False)
+                continue
+            elapsed = time.monotonic() - t0
+            if r.status_code == 413:
+                self._resize(grow=False)
+                if len(pending) == 1:
+                    break  # a single document over the request limit never fits
+                half = len(pending) // 2
+                self._send(pending[:half])
+                self._send(pending[half:])
+                return
+            if r.status_code in _RETRYABLE:
+                self._resize(grow=False)
+                continue
+            if r.status_code >= 300:
+                # the request as a whole was rejected: settle every item as failed
+                for _, ack in pending:
+                    ack(False)
+                return
+            retry = []
+            for (lines, ack), res in zip(pending, r.json().get("items", [])):
+                status = next(iter(res.values())).get("status", 500)
+                if status < 300:
+                    ack(True)
+                elif status in _RETRYABLE:
+                    retry.append((lines, ack))
+                else:
+                    ack(False)
+            self._resize(grow=not retry and elapsed < self.target_s)
+            if not retry:
+                return
+            pending = retry
+        for _, ack in pending:
+            ack(False)
+
+
+class _ObjectProgress:
+    """Counts a single object's chunks until every one of them is acked."""
+
+    def __init__(self, key: str, on_done: Callable[[str, int, Optional[str]], None]):
+        self.key = key
+        self.on_done = on_done
+        self.added = 0
+        self.acked = 0
+        self.failed = 0
+        self.sealed = False
+        self._lock = threading.Lock()
+
+    def add(self) -> None:
+        with self._lock:
+            self.added += 1
+
+    def fail(self) -> None:
+        with self._lock:
+            self.failed += 1
+
+    def ack(self, ok: bool) -> None:
+        with self._lock:
+            self.acked += 1
+            self.failed += 0 if ok else 1
+            fire = self.sealed and self.acked == self.added
+        if fire:
+            self._fire()
+
+    def seal(self) -> None:
+        with self._lock:
+            self.sealed = True
+            fire = self.acked == self.added
+        if fire:
+            self._fire()
+
+    def _fire(self) -> None:
+        self.on_done(self.key, self.added, f"{self.failed} chunks not indexed" if self.failed else None)
+
+
+def run_backfill(
+    s3,
+    embed: Callable[[str], List[float]],
+    writer: BulkWriter,
+    chunker,
+    bucket: str,
+    prefix: str,
+    chunking: Dict[str, Any],
+    checkpoint: Checkpoint,
+    workers: int = 8,
+    report_every: float = 10.0,
+    range_bytes: int = 1024 * 1024,
+) -> Dict[str, Any]:
+    """List bucket/prefix (resuming from checkpoint), chunk, embed and bulk-index every object."""
+    sizes: Dict[str, Optional[int]] = {}
+    stop = threading.Event()
+    t0 = time.monotonic()
+    base = dict(checkpoint.totals)
+
+    def on_done(key: str, chunks: int, error: Optional[str]) -> None:
+        checkpoint.finished(key, chunks, sizes.pop(key, None) or 0, error)
+        if error:
+            say(f"  FAILED {key}: {error}")
+
+    def process(key: str) -> None:
+        prog = _ObjectProgress(key, on_done)
+        try:
+            if sizes.get(key) is None:  # retried key: not listed this run
+                sizes[key] = s3.head_object(Bucket=bucket, Key=key)["ContentLength"]
+            pieces = chunker.iter_object_text(s3, bucket, key, range_bytes)
+            for n, text in enumerate(chunker.iter_windows(pieces, chunking["size"], chunking["overlap"], chunking["unit"])):
+                doc = {"id": f"{key}#{n}", "doc_id": key, "chunk": n, "text": text, "embedding": embed(text)}
+                prog.add()
+                writer.add(doc, prog.ack)
+        except Exception as ex:
+            prog.fail()  # reported once the chunks already queued are acked
+            say(f"  error in {key}: {ex}")
+        prog.seal()
+
+    def report() -> None:
+        while not stop.wait(report_every):
+            tot, dt = checkpoint.totals, time.monotonic() - t0
+            objs, chunks = tot["objects"] - base["objects"], tot["chunks"] - base["chunks"]
+            mb = (tot["bytes"] - base["bytes"]) / 1e6
+            say(f"  {tot['objects']} objects, {tot['chunks']} chunks | {objs / dt:.1f} obj/s, "
+                f"{chunks / dt:.1f} chunks/s, {mb / dt:.2f} MB/s | bulk batch {writer.batch}")
+            checkpoint.save()
+
+    reporter = threading.Thread(target=report, name="dagctl-backfill-report", daemon=True)
+    reporter.start()
+    slots = threading.Semaphore(workers * 4)  # bound queued objects, not the whole listing
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            def submit(key: str, size: Optional[int], listed: bool) -> None:
+                slots.acquire()
+                sizes[key] = size
+                checkpoint.started(key, listed)
+                pool.submit(process, key).add_done_callback(lambda _: slots.release())
+
+            for key in checkpoint.retry:  # failures from the previous run (already behind the watermark)
+                submit(key, None, listed=False)
+            paginator = s3.get_paginator("list_objects_v2")
+            args = {"Bucket": bucket, "Prefix": prefix}
+            if checkpoint.after:
+                args["StartAfter"] = checkpoint.after
+            for page in paginator.paginate(**args):
+                for obj in page.get("Contents", []):
+                    key = obj["Key"]
+                    if key.endswith("/") or checkpoint.skip(key):
+                        continue
+                    submit(key, obj["Size"], listed=True)
+        writer.flush()
+    finally:
+        stop.set()
+        reporter.join()
+        checkpoint.save()
+
+    dt = time.monotonic() - t0
+    tot = checkpoint.totals
+    return {
+        "objects": tot["objects"] - base["objects"],
+        "chunks": tot["chunks"] - base["chunks"],
+        "bytes": tot["bytes"] - base["bytes"],
+        "failed": len(checkpoint.failed),
+        "seconds": round(dt, 1),
+        "bulk_requests": writer.requests,
+    }
+
+
+def aoss_poster(sess, endpoint: str, pool_size: int = 16) -> Callable[[str, str], Any]:
+    """post(path, ndjson) against an AOSS endpoint over a pooled session.
+
+    The signer is rebuilt per request from the session's current credentials,
+    so hours-long runs survive credential refresh.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from utils.aws import sigv4_auth
+
+    http = requests.Session()
+    http.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+    host = endpoint.replace("https://", "").rstrip("/")
+
+    def post(path: str, body: str):
+        return http.post(f"https://{host}{path}", data=body.encode("utf-8"), auth=sigv4_auth(sess, host, "aoss"),
+                         headers={"content-type": "application/x-ndjson"}, timeout=120)
+    return post
+
+
+def bump_generation(sess, endpoint: str, index: str) -> None:
+    """Set mappings._meta.generation so retrievers drop their cached hits."""
+    import requests
+    from utils.aws import sigv4_auth
+
+    host = endpoint.replace("https://", "").rstrip("/")
+    r = requests.put(f"https://{host}/{index}/_mapping", auth=sigv4_auth(sess, host, "aoss"),
+                     json={"_meta": {"generation": time.time_ns()}}, timeout=30)
+    r.raise_for_status()
@@ -1,72 +1,256 @@
 from __future__ import annotations
-from typing import Any, Dict, List, Set
+from collections import deque
+from typing import Any, Dict, List, Optional, Set, Tuple
 
+# opensearch.vector k-NN options: engine -> supported space types
+KNN_SPACES = {
+    "faiss": {"l2", "innerproduct"},
+    "nmslib": {"l2", "l1", "linf", "cosinesimil", "innerproduct"},
+    "lucene": {"l2", "cosinesimil", "innerproduct"},
+}
+KNN_QUANTIZATION = {"none": None, "fp16": "faiss", "byte": "lucene"}  # -> engine that implements it
 
-def port_map_from_plugins(registry) -> Dict[str, Dict[str, List[str]]]:
-    return {k: {"in": v.IN_PORTS, "out": v.OUT_PORTS} for k, v in registry.items()}
+# embedding models: id -> (default dims, allowed dims, request takes dimensions/normalize)
+EMBED_MODELS = {
+    "amazon.titan-embed-text-v2:0": (1024, (256, 512, 1024), True),
+    "amazon.titan-embed-text-v1": (1536, (1536,), False),
+    "cohere.embed-english-v3": (1024, (1024,), False),
+    "cohere.embed-multilingual-v3": (1024, (1024,), False),
+}
 
 
-def validate_graph(doc: Dict[str, Any], ports: Dict[str, Dict[str, List[str]]]) -> None:
-    nodes = doc.get("nodes", [])
-    edges = doc.get("edges", [])
-    types = {n["id"]: n["type"] for n in nodes}
-    id2node = {n["id"]: n for n in nodes}
+def embedding_spec(props: Dict[str, Any]) -> Dict[str, Any]:
+    """Effective {model_id, dimensions, normalize} of an embeddings bedrock.model node."""
+    mid = props.get("model_id")
+    default, _, configurable = EMBED_MODELS.get(mid, (None, (), False))
+    dims = props.get("dimensions", default)
+    return {"model_id": mid, "dimensions": dims, "normalize": bool(props.get("normalize", configurable))}
+
+
+class GraphError(ValueError):
+    """Every problem found in a graph document, one per line."""
+
+    def __init__(self, errors: List[str]):
+        super().__init__("\n".join(errors))
+        self.errors = errors
+
+
+class GraphIndex:
+    """Indexes over one graph document, built once in O(V+E).
+
+    by_id/types: id -> node / node type; succ/pred: adjacency lists;
+    ports[(id, "in"|"out", via)]: the edges on that typed port; of_type: ids by type.
+    Structural problems (duplicate ids, edges to unknown nodes) land in errors
+    and those edges are left out of the adjacency.
+    """
+
+    def __init__(self, doc: Dict[str, Any]):
+        self.nodes: List[Dict[str, Any]] = doc.get("nodes", []) or []
+        self.edges: List[Dict[str, str]] = doc.get("edges", []) or []
+        self.errors: List[str] = []
+        self.by_id: Dict[str, Dict[str, Any]] = {}
+        self.types: Dict[str, str] = {}
+        self.of_type: Dict[str, List[str]] = {}
+        for n in self.nodes:
+            nid = n.get("id")
+            if nid in self.by_id:
+                self.errors.append(f"Duplicate node id: {nid}")
+                continue
+            self.by_id[nid] = n
+            self.types[nid] = n.get("type")
+            self.of_type.setdefault(n.get("type"), []).append(nid)
+        self.succ: Dict[str, List[str]] = {nid: [] for nid in self.by_id}
+        self.pred: Dict[str, List[str]] = {nid: [] for nid in self.by_id}
+        self.ports: Dict[Tuple[str, str, str], List[Dict[str, str]]] = {}
+        self.valid_edges: List[Dict[str, str]] = []
+        for e in self.edges:
+            f, t = e.get("from"), e.get("to")
+            missing = [x for x in (f, t) if x not in self.by_id]
+            if missing:
+                self.errors.append(f"Edge {f} -> {t} references unknown node(s): {', '.join(map(str, missing))}")
+                continue
+            self.valid_edges.append(e)
+            self.succ[f].append(t)
+            self.pred[t].append(f)
+            self.ports.setdefault((f, "out", e.get("via")), []).append(e)
+            self.ports.setdefault((t, "in", e.get("via")), []).append(e)
+        self._order: Optional[List[str]] = None
+        self._levels: Optional[Dict[str, int]] = None
+
+    def props(self, nid: str) -> Dict[str, Any]:
+        return self.by_id[nid].get("props", {}) or {}
+
+    def port(self, nid: str, direction: str, via: str) -> List[Dict[str, str]]:
+        return self.ports.get((nid, direction, via), [])
+
+    def topo_order(self) -> List[str]:
+        """Kahn's algorithm (deque, document order among ready nodes); GraphError names the cycle's nodes."""
+        if self._order is None:
+            indeg = {nid: len(p) for nid, p in self.pred.items()}
+            q = deque(nid for nid in self.by_id if indeg[nid] == 0)
+            order = []
+            while q:
+                u = q.popleft()
+                order.append(u)
+                for v in self.succ[u]:
+                    indeg[v] -= 1
+                    if indeg[v] == 0:
+                        q.append(v)
+            if len(order) != len(self.by_id):
+                stuck = [nid for nid in self.by_id if indeg[nid] > 0]
+                raise GraphError([f"Cycle detected among: {', '.join(stuck[:20])}{' ...' if len(stuck) > 20 else ''}"])
+            self._order = order
+        return self._order
+
+    def levels(self) -> Dict[str, int]:
+        """Longest-path depth of each node (sources are 0); nodes on one level are independent."""
+        if self._levels is None:
+            lv: Dict[str, int] = {}
+            for u in self.topo_order():
+                lv[u] = max((lv[p] + 1 for p in self.pred[u]), default=0)
+            self._levels = lv
+        return self._levels
+
+    def is_upstream(self, target: str, nid: str) -> bool:
+        """True if target reaches nid. Only ancestors deeper than target's level can lie
+        on such a path, so the walk never leaves the band between the two nodes."""
+        lv = self.levels()
+        floor = lv[target]
+        seen: Set[str] = set()
+        stack = [nid]
+        while stack:
+            for p in self.pred[stack.pop()]:
+                if p == target:
+                    return True
+                if lv[p] > floor and p not in seen:
+                    seen.add(p)
+                    stack.append(p)
+        return False
+
+
+def validate_graph(doc: Dict[str, Any], ports: Dict[str, Dict[str, List[str]]]) -> GraphIndex:
+    """Check the document and return its GraphIndex; raises GraphError listing every problem."""
+    g = GraphIndex(doc)
+    errors = g.errors
 
     # Node types known
-    for n in nodes:
-        if n["type"] not in ports:
-            raise ValueError(f"Unsupported node type: {n['type']}")
+    for nid, t in g.types.items():
+        if t not in ports:
+            errors.append(f"Unsupported node type: {t} ({nid})")
 
     # Port checks
-    for e in edges:
-        f, t, via = e["from"], e["to"], e["via"]
-        if types[f] not in ports or types[t] not in ports:
-            raise ValueError(f"Unknown types on edge: {e}")
-        if via not in ports[types[f]]["out"]:
-            raise ValueError(f"Edge via '{via}' not produced by {types[f]}")
-        if via not in ports[types[t]]["in"]:
-            raise ValueError(f"Edge via '{via}' not accepted by {types[t]}")
+    for e in g.valid_edges:
+        f, t, via = e["from"], e["to"], e.get("via")
+        tf, tt = g.types[f], g.types[t]
+        if tf not in ports or tt not in ports:
+            continue  # already reported
+        if via not in ports[tf]["out"]:
+            errors.append(f"Edge {f} -> {t}: via '{via}' not produced by {tf}")
+        if via not in ports[tt]["in"]:
+            errors.append(f"Edge {f} -> {t}: via '{via}' not accepted by {tt}")
 
     # Minimal consistency checks (PoC)
     # 1) producer STREAM set and references an existing kinesis.stream
-    prod = next((n for n in nodes if n["type"] == "lambda.fn" and n["id"] == "s3_producer"), None)
-    if prod:
-        stream = (prod.get("props", {}).get("env") or {}).get("STREAM")
+    if g.types.get("s3_producer") == "lambda.fn":
+        stream = (g.props("s3_producer").get("env") or {}).get("STREAM")
+        streams = {g.props(k).get("name", k) for k in g.of_type.get("kinesis.stream", [])}
         if not stream:
-            raise ValueError("s3_producer.props.env.STREAM must be set (e.g., rag-ingest)")
-        kds = next((n for n in nodes if n["type"] == "kinesis.stream" and (n.get("props", {}).get("name", n["id"]) == stream)), None)
-        if not kds:
-            raise ValueError(f"s3_producer STREAM='{stream}' does not match any kinesis.stream name/id")
+            errors.append("s3_producer.props.env.STREAM must be set (e.g., rag-ingest)")
+        elif stream not in streams:
+            errors.append(f"s3_producer STREAM='{stream}' does not match any kinesis.stream name/id")
+
+    # 2) embedding dims: the embeddings bedrock.model is the source of truth for its
+    #    index ('vectors' edge) and for every Lambda it shares an 'invoke' edge with
+    for nid in g.of_type.get("bedrock.model", []):
+        p = g.props(nid)
+        if p.get("mode") != "embeddings":
+            continue
+        spec = embedding_spec(p)
+        known = EMBED_MODELS.get(spec["model_id"])
+        if spec["dimensions"] is None:
+            errors.append(f"{nid}.props.dimensions must be set for model {spec['model_id'] or p.get('model_name')!r}")
+            continue
+        if known and spec["dimensions"] not in known[1]:
+            errors.append(f"{nid}.props.dimensions={spec['dimensions']} not supported by {spec['model_id']} {known[1]}")
+        if "normalize" in p and known and not known[2]:
+            errors.append(f"{nid}.props.normalize is not supported by {spec['model_id']}")
+        for e in g.port(nid, "out", "vectors"):
+            op = g.props(e["to"])
+            if g.types[e["to"]] == "opensearch.vector" and "dims" in op and int(op["dims"]) != spec["dimensions"]:
+                errors.append(f"Dims mismatch: {e['to']}.props.dims={op['dims']} vs {nid}.props.dimensions={spec['dimensions']}")
+        invokers = [e["from"] for e in g.port(nid, "in", "invoke")] + [e["to"] for e in g.port(nid, "out", "invoke")]
+        for other in invokers:
+            if g.types[other] != "lambda.fn":
+                continue
+            env = g.props(other).get("env") or {}
+            for k in ("EMBED_DIMS", "DIMS"):
+                if k in env and int(env[k]) != spec["dimensions"]:
+                    errors.append(f"Dims mismatch: {other}.props.env.{k}={env[k]} vs {nid}.props.dimensions={spec['dimensions']}")
+            if spec["model_id"] and env.get("EMBED_MODEL_ID", spec["model_id"]) != spec["model_id"]:
+                errors.append(f"{other}.props.env.EMBED_MODEL_ID={env['EMBED_MODEL_ID']} but invokes {nid} ({spec['model_id']})")
+    for nid in g.of_type.get("opensearch.vector", []):
+        if "dims" not in g.props(nid) and not any(g.types[e["from"]] == "bedrock.model" for e in g.port(nid, "in", "vectors")):
+            errors.append(f"{nid} needs props.dims or a 'vectors' edge from an embeddings bedrock.model")
+
+    # 3) function URLs (RESPONSE_STREAM streams through the Lambda Web Adapter)
+    for nid in g.of_type.get("lambda.fn", []):
+        url = g.props(nid).get("function_url")
+        if url is None:
+            continue
+        if url.get("invoke_mode", "BUFFERED") not in ("BUFFERED", "RESPONSE_STREAM"):
+            errors.append(f"{nid}.props.function_url.invoke_mode must be BUFFERED or RESPONSE_STREAM")
+        if url.get("auth_type", "AWS_IAM") not in ("AWS_IAM", "NONE"):
+            errors.append(f"{nid}.props.function_url.auth_type must be AWS_IAM or NONE")
+        if url.get("invoke_mode") == "RESPONSE_STREAM" and g.port(nid, "in", "http"):
+            # the adapter's streamed replies are not a buffered proxy response
+            errors.append(f"{nid}: a RESPONSE_STREAM function URL cannot also be an API Gateway ('http') target; "
+                          "put the streaming URL on a separate lambda.fn")
+
+    # 4) k-NN index options on opensearch.vector
+    for nid in g.of_type.get("opensearch.vector", []):
+        p = g.props(nid)
+        engine = p.get("engine", "faiss")
+        if engine not in KNN_SPACES:
+            errors.append(f"{nid}.props.engine must be one of {sorted(KNN_SPACES)}, got {engine!r}")
+        else:
+            space = p.get("space_type", "l2")
+            if space not in KNN_SPACES[engine]:
+                errors.append(f"{nid}.props.space_type {space!r} not supported by {engine} ({sorted(KNN_SPACES[engine])})")
+        for key, lo, hi in (("m", 2, 100), ("ef_construction", 2, 4096), ("ef_search", 1, 4096)):
+            v = p.get(key)
+            if v is not None and not (isinstance(v, int) and lo <= v <= hi):
+                errors.append(f"{nid}.props.{key} must be an integer in [{lo}, {hi}], got {v!r}")
+        quant = p.get("quantization", "none")
+        if quant not in KNN_QUANTIZATION:
+            errors.append(f"{nid}.props.quantization must be one of {sorted(KNN_QUANTIZATION)}, got {quant!r}")
+        elif KNN_QUANTIZATION[quant] not in (None, engine):
+            errors.append(f"{nid}.props.quantization={quant} requires engine {KNN_QUANTIZATION[quant]}")
+
+    # ordering (needed by the upstream check below)
+    try:
+        g.topo_order()
+    except GraphError as ex:
+        raise GraphError(errors + ex.errors)
 
-    # 2) vector dims sanity (retriever env vs vector_store props)
-    vec = next((n for n in nodes if n["type"] == "opensearch.vector"), None)
-    ret = next((n for n in nodes if n["id"] == "retriever" and n["type"] == "lambda.fn"), None)
-    if vec and ret:
-        vd = int(vec.get("props", {}).get("dims", 0))
-        rd = int((ret.get("props", {}).get("env") or {}).get("DIMS", "0"))
-        if vd and rd and vd != rd:
-            raise ValueError(f"Dims mismatch: opensearch.vector={vd} vs retriever.env.DIMS={rd}")
+    # 5) env "ref:<node>[.<key>]" must point at an upstream node (deployed first)
+    for nid, n in g.by_id.items():
+        for k, v in ((n.get("props", {}) or {}).get("env") or {}).items():
+            if not (isinstance(v, str) and v.startswith("ref:")):
+                continue
+            target = v[len("ref:"):].split(".", 1)[0]
+            if target not in g.by_id:
+                errors.append(f"{nid}.props.env.{k}: unknown node '{target}'")
+            elif not g.is_upstream(target, nid):
+                errors.append(f"{nid}.props.env.{k}: '{target}' is not upstream of {nid} (add an edge)")
 
-    topo_sort(nodes, edges)
+    if errors:
+        raise GraphError(errors)
+    return g
 
 
 def topo_sort(nodes: List[Dict[str, Any]], edges: List[Dict[str, str]]) -> List[str]:
-    '''kahns algo'''
-    ids = [n["id"] for n in nodes]
-    indeg = {i: 0 for i in ids}
-    adj = {i: [] for i in ids}
-    for e in edges:
-        adj[e["from"]].append(e["to"])
-        indeg[e["to"]] += 1
-    q = [i for i in ids if indeg[i] == 0]
-    order = []
-    while q:
-        u = q.pop(0)
-        order.append(u)
-        for v in adj[u]:
-            indeg[v] -= 1
-            if indeg[v] == 0:
-                q.append(v)
-    if len(order) != len(ids):
-        raise ValueError("Cycle detected")
-    return order
+    """Deployment order for nodes/edges (see GraphIndex.topo_order)."""
+    g = GraphIndex({"nodes": nodes, "edges": edges})
+    if g.errors:
+        raise GraphError(g.errors)
+    return g.topo_order()
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from utils.aws import ClientPool
+
+
+def _pages(call: Callable[..., Dict[str, Any]], token_in: str, token_out: str, **kwargs) -> Iterator[Dict[str, Any]]:
+    """Every page of a token-paginated list call."""
+    token = None
+    while True:
+        page = call(**kwargs, **({token_in: token} if token else {}))
+        yield page
+        token = page.get(token_out)
+        if not token:
+            return
+
+
+def _apis(pool: ClientPool) -> Dict[str, Dict[str, Any]]:
+    api = pool.client("apigatewayv2")
+    out: Dict[str, Dict[str, Any]] = {}
+    for page in _pages(api.get_apis, "NextToken", "NextToken"):
+        for a in page.get("Items", []):
+            if a["ProtocolType"] == "HTTP":
+                arn = f"arn:aws:apigateway:{pool.region}::/apis/{a['ApiId']}"
+                out.setdefault(a["Name"], {"id": a["ApiId"], "arn": arn, "raw": a})
+    return out
+
+
+def _collections(pool: ClientPool) -> Dict[str, Dict[str, Any]]:
+    oss = pool.client("opensearchserverless")
+    out: Dict[str, Dict[str, Any]] = {}
+    for page in _pages(oss.list_collections, "nextToken", "nextToken"):
+        for c in page.get("collectionSummaries", []):
+            out[c["name"]] = {"id": c["id"], "arn": c.get("arn"), "status": c.get("status"), "raw": c}
+    return out
+
+
+def _buckets(pool: ClientPool) -> Dict[str, Dict[str, Any]]:
+    s3 = pool.client("s3")
+    out: Dict[str, Dict[str, Any]] = {}
+    for page in _pages(s3.list_buckets, "ContinuationToken", "ContinuationToken"):
+        for b in page.get("Buckets", []):
+            out[b["Name"]] = {"id": b["Name"], "arn": f"arn:aws:s3:::{b['Name']}", "raw": b}
+    return out
+
+
+def _streams(pool: ClientPool) -> Dict[str, Dict[str, Any]]:
+    kinesis = pool.client("kinesis")
+    out: Dict[str, Dict[str, Any]] = {}
+    for page in _pages(kinesis.list_streams, "NextToken", "NextToken"):
+        for s in page.get("StreamSummaries", []):
+            out[s["StreamName"]] = {"id": s["StreamName"], "arn": s["StreamARN"], "status": s.get("StreamStatus"), "raw": s}
+    return out
+
+
+# resource type -> full listing, {name: {"id", "arn", ...}}
+LISTERS: Dict[str, Callable[[ClientPool], Dict[str, Dict[str, Any]]]] = {
+    "apigw": _apis,
+    "aoss": _collections,
+    "s3": _buckets,
+    "kinesis": _streams,
+}
+
+
+class Inventory:
+    """Existing resources of the account, listed once per type per run and indexed by name.
+
+    Each type is listed lazily with full pagination the first time a plugin asks
+    about it; every later existence check is a dict lookup. Plugins keep the
+    index honest with put()/discard() after creating or deleting a resource,
+    or invalidate() when they cannot tell what changed.
+    """
+
+    def __init__(self, pool: ClientPool):
+        self.pool = pool
+        self._lock = threading.Lock()
+
+    def _index(self, rtype: str) -> Dict[str, Dict[str, Any]]:
+        return self.pool.memo(("inventory", rtype), lambda: LISTERS[rtype](self.pool))
+
+    def get(self, rtype: str, name: str) -> Optional[Dict[str, Any]]:
+        """The listed resource called name, or None if it does not exist."""
+        return self._index(rtype).get(name)
+
+    def names(self, rtype: str) -> List[str]:
+        return sorted(self._index(rtype))
+
+    def put(self, rtype: str, name: str, item: Dict[str, Any]) -> None:
+        """Record a resource this run just created."""
+        with self._lock:
+            self._index(rtype)[name] = item
+
+    def discard(self, rtype: str, name: str) -> None:
+        """Record that a resource is gone."""
+        with self._lock:
+            self._index(rtype).pop(name, None)
+
+    def invalidate(self, rtype: Optional[str] = None) -> None:
+        """Drop a listing (default: all) so the next lookup lists again."""
+        for t in ([rtype] if rtype else list(LISTERS)):
+            self.pool.forget(("inventory", t))
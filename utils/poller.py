@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import random
+import threading
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+from utils.aws import is_not_found
+
+# check() returns a truthy value once the resource is ready (that value is the result),
+# a falsy value while still pending, and raises if the resource ended up failed.
+Check = Callable[[], Any]
+
+
+class Pending:
+    """Handle for one resource tracked by a Poller."""
+
+    def __init__(self, name: str, check: Check, deadline: float):
+        self.name = name
+        self.check = check
+        self.deadline = deadline
+        self.attempt = 0
+        self._done = threading.Event()
+        self._result: Any = None
+        self._error: Optional[BaseException] = None
+
+    def _finish(self, result: Any = None, error: Optional[BaseException] = None) -> None:
+        self._result, self._error = result, error
+        self._done.set()
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def result(self) -> Any:
+        """Block until the resource is ready; re-raise its failure or timeout."""
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class Poller:
+    """One background thread polling many slow resources with jittered exponential backoff.
+
+    Callers register a readiness check and get a Pending back, so several
+    deploys waiting on different resources (AOSS collection, Bedrock import,
+    Kinesis stream, Lambda update) wait concurrently instead of back to back,
+    and no thread sits in time.sleep() per resource.
+    """
+
+    def __init__(self, base_delay: float = 2.0, max_delay: float = 30.0, jitter: float = 0.5):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self._heap: List[Tuple[float, int, Pending]] = []
+        self._seq = itertools.count()
+        self._cv = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def _delay(self, attempt: int) -> float:
+        d = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return d * (1 - self.jitter * random.random())  # "equal-ish" jitter; never above the cap
+
+    def submit(self, name: str, check: Check, timeout: float = 600.0, first_delay: Optional[float] = None) -> Pending:
+        """Start tracking a resource; the first check runs after first_delay (default: immediately)."""
+        p = Pending(name, check, time.monotonic() + timeout)
+        with self._cv:
+            heapq.heappush(self._heap, (time.monotonic() + (first_delay or 0.0), next(self._seq), p))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="dagctl-poller", daemon=True)
+                self._thread.start()
+            self._cv.notify()
+        return p
+
+    def wait(self, name: str, check: Check, timeout: float = 600.0, first_delay: Optional[float] = None) -> Any:
+        """submit() and block until ready."""
+        return self.submit(name, check, timeout, first_delay).result()
+
+    def _run(self) -> None:
+        while True:
+            with self._cv:
+                while not self._heap:
+                    if not self._cv.wait(timeout=30.0):
+                        if not self._heap:
+                            self._thread = None
+                            return
+                due, _, p = self._heap[0]
+                now = time.monotonic()
+                if due > now:
+                    self._cv.wait(timeout=due - now)
+                    continue
+                heapq.heappop(self._heap)
+            self._poll(p)
+
+    def _poll(self, p: Pending) -> None:
+        try:
+            ready = p.check()
+        except Exception as ex:
+            p._finish(error=ex)
+            return
+        if ready:
+            p._finish(result=ready)
+            return
+        now = time.monotonic()
+        if now >= p.deadline:
+            p._finish(error=TimeoutError(f"Timed out waiting for {p.name}"))
+            return
+        p.attempt += 1
+        due = min(now + self._delay(p.attempt), p.deadline)
+        with self._cv:
+            heapq.heappush(self._heap, (due, next(self._seq), p))
+            self._cv.notify()
+
+
+# Readiness predicates shared by plugins (each returns a Check)
+
+def collection_active(oss, collection_id: str) -> Check:
+    def check():
+        d = oss.batch_get_collection(ids=[collection_id])["collectionDetails"]
+        st = d[0]["status"] if d else "CREATING"
+        if st == "FAILED":
+            raise RuntimeError(f"AOSS collection {collection_id} failed")
+        return d[0] if st == "ACTIVE" else None
+    return check
+
+
+def import_completed(bedrock, job_arn: str) -> Check:
+    def check():
+        d = bedrock.get_model_import_job(jobIdentifier=job_arn)
+        if d["status"] == "Failed":
+            raise RuntimeError(f"Bedrock import failed: {d.get('failureMessage', d)}")
+        return d if d["status"] == "Completed" else None
+    return check
+
+
+def stream_active(kinesis, name: str) -> Check:
+    def check():
+        s = kinesis.describe_stream_summary(StreamName=name)["StreamDescriptionSummary"]
+        return s if s["StreamStatus"] == "ACTIVE" else None
+    return check
+
+
+def lambda_updated(lam, fn_name: str) -> Check:
+    """Function is Active and its last code/config update finished."""
+    def check():
+        c = lam.get_function_configuration(FunctionName=fn_name)
+        if c.get("State") == "Failed" or c.get("LastUpdateStatus") == "Failed":
+            raise RuntimeError(f"Lambda {fn_name} update failed: {c.get('LastUpdateStatusReason') or c.get('StateReason')}")
+        ready = c.get("State", "Active") == "Active" and c.get("LastUpdateStatus", "Successful") == "Successful"
+        return c if ready else None
+    return check
+
+
+# Deletion predicates (used by destroy): ready once the resource is gone
+
+def _gone(describe: Callable[[], Any]) -> Any:
+    try:
+        describe()
+    except Exception as ex:
+        if is_not_found(ex):
+            return True
+        raise
+    return None
+
+
+def stream_deleted(kinesis, name: str) -> Check:
+    return lambda: _gone(lambda: kinesis.describe_stream_summary(StreamName=name))
+
+
+def delivery_deleted(fh, name: str) -> Check:
+    return lambda: _gone(lambda: fh.describe_delivery_stream(DeliveryStreamName=name))
+
+
+def collection_deleted(oss, collection_id: str) -> Check:
+    def check():
+        d = oss.batch_get_collection(ids=[collection_id])["collectionDetails"]
+        if d and d[0]["status"] == "FAILED":
+            raise RuntimeError(f"AOSS collection {collection_id} failed to delete")
+        return None if d else True
+    return check
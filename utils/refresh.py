@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+
+from utils.graph import GraphIndex
+
+ACTIONS = ("create", "update", "no-op", "unknown")
+_MARKS = {"create": "+", "update": "~", "no-op": "=", "unknown": "?"}
+
+
+def fan_out(fn: Callable[[Hashable], Any], keys: Iterable[Hashable], max_workers: int = 16) -> Dict[Hashable, Any]:
+    """{key: fn(key)} with the calls run concurrently; exceptions propagate."""
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(keys))) as pool:
+        return dict(zip(keys, pool.map(fn, keys)))
+
+
+def diff_node(desired: Dict[str, Any], live: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """create when nothing is live, update when a desired field differs, else no-op.
+
+    Only fields the plugin puts in `desired` are compared, so live-only details never show as drift.
+    """
+    if live is None:
+        return {"action": "create", "changes": []}
+    changes = [{"field": k, "live": live.get(k), "desired": v} for k, v in desired.items() if live.get(k) != v]
+    return {"action": "update" if changes else "no-op", "changes": changes}
+
+
+def refresh_graph(g: GraphIndex, registry: Dict[str, Any], ctx: Dict[str, Any], max_parallel: int = 8) -> Dict[str, Any]:
+    """Fetch the live state of every node and diff it against the graph.
+
+    Each plugin's refresh() gets all nodes of its kind at once (so it can batch
+    reads) and the kinds are refreshed concurrently. A kind that fails to refresh
+    marks its nodes 'unknown' instead of aborting the whole plan.
+    """
+    t0 = time.perf_counter()
+    by_kind: Dict[str, List[Dict[str, Any]]] = {}
+    for nid in g.topo_order():
+        by_kind.setdefault(g.types[nid], []).append(g.by_id[nid])
+
+    def _kind(kind: str) -> Dict[str, Dict[str, Any]]:
+        svc = registry[kind]
+        nodes = by_kind[kind]
+        if not hasattr(svc, "refresh"):
+            return {n["id"]: {"action": "unknown", "changes": [], "error": f"{kind} has no refresh"} for n in nodes}
+        started = time.perf_counter()
+        try:
+            live = svc.refresh(nodes, ctx)
+            out = {n["id"]: diff_node(svc.desired(n, ctx), live.get(n["id"])) for n in nodes}
+        except Exception as ex:
+            out = {n["id"]: {"action": "unknown", "changes": [], "error": f"{type(ex).__name__}: {ex}"} for n in nodes}
+        ms = round((time.perf_counter() - started) * 1000.0, 1)
+        for d in out.values():
+            d["refresh_ms"] = ms
+        return out
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for part in fan_out(_kind, by_kind, max_workers=max_parallel).values():
+        results.update(part)
+
+    nodes = [{"id": nid, "type": g.types[nid], **results[nid]} for nid in g.topo_order()]
+    summary = {a: sum(1 for n in nodes if n["action"] == a) for a in ACTIONS}
+    return {
+        "graph": ctx["doc"].get("name", "graph"),
+        "seconds": round(time.perf_counter() - t0, 3),
+        "summary": summary,
+        "nodes": nodes,
+    }
+
+
+def format_diff(report: Dict[str, Any]) -> str:
+    """Human-readable per-node diff, one line per node plus one per changed field."""
+    width = max((len(n["id"]) + len(n["type"]) + 3 for n in report["nodes"]), default=0)
+    lines = [f"Refreshed {len(report['nodes'])} nodes of '{report['graph']}' in {report['seconds']:.2f}s:"]
+    for n in report["nodes"]:
+        label = f"{n['id']} ({n['type']})"
+        lines.append(f"  {_MARKS[n['action']]} {label:<{width}}  {n['action']}")
+        for c in n["changes"]:
+            lines.append(f"      {c['field']}: {c['live']!r} -> {c['desired']!r}")
+        if n.get("error"):
+            lines.append(f"      {n['error']}")
+    s = report["summary"]
+    lines.append(f"{s['create']} to create, {s['update']} to update, {s['no-op']} unchanged, {s['unknown']} unknown.")
+    return "\n".join(lines)
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import heapq
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Set, Tuple
+
+_PRINT_LOCK = threading.Lock()
+
+
+def say(msg: str) -> None:
+    """Print one line atomically (safe to call from worker threads)."""
+    with _PRINT_LOCK:
+        sys.stdout.write(msg + "\n")
+        sys.stdout.flush()
+
+
+def run_dag(
+    order: List[str],
+    edges: Iterable[Tuple[str, str]],
+    fn: Callable[[str], Any],
+    max_parallel: int = 4,
+) -> Tuple[Dict[str, Any], Dict[str, Exception], List[str]]:
+    """Run fn(node_id) for each node once all of its predecessors succeeded.
+
+    Ready nodes are released as soon as their inputs finish and started in
+    `order` priority on a bounded pool, so wall time follows the critical path
+    rather than the sum of all nodes. A failure cancels every downstream node;
+    independent branches still run to completion.
+
+    Returns (results, errors, skipped); skipped lists cancelled nodes in `order`.
+    """
+    max_parallel = max(1, int(max_parallel))
+    rank = {nid: i for i, nid in enumerate(order)}
+    succ: Dict[str, List[str]] = {nid: [] for nid in order}
+    indeg = {nid: 0 for nid in order}
+    for f, t in edges:
+        succ[f].append(t)
+        indeg[t] += 1
+
+    ready = [(rank[n], n) for n in order if indeg[n] == 0]
+    heapq.heapify(ready)
+    results: Dict[str, Any] = {}
+    errors: Dict[str, Exception] = {}
+    blocked: Set[str] = set()
+    running: Dict[Future, str] = {}
+
+    def _block_downstream(nid: str) -> None:
+        stack = list(succ[nid])
+        while stack:
+            v = stack.pop()
+            if v not in blocked:
+                blocked.add(v)
+                stack.extend(succ[v])
+
+    with ThreadPoolExecutor(max_workers=max_parallel) as pool:
+        while ready or running:
+            while ready and len(running) < max_parallel:
+                _, nid = heapq.heappop(ready)
+                running[pool.submit(fn, nid)] = nid
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for fut in sorted(done, key=lambda f: rank[running[f]]):
+                nid = running.pop(fut)
+                try:
+                    results[nid] = fut.result()
+                except Exception as ex:
+                    errors[nid] = ex
+                    _block_downstream(nid)
+                    continue
+                for v in succ[nid]:
+                    indeg[v] -= 1
+                    if indeg[v] == 0 and v not in blocked:
+                        heapq.heappush(ready, (rank[v], v))
+
+    skipped = [n for n in order if n in blocked]
+    return results, errors, skipped
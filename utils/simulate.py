@@ -0,0 +1,439 @@
+from __future__ import annotations
+
+import base64
+import contextlib
+import hashlib
+import importlib.util
+import io
+import json
+import math
+import os
+import random
+import re
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+try:  # brute-force kNN is much faster vectorized; the fallback keeps simulate dependency-free
+    import numpy as np
+except ImportError:
+    np = None
+
+from utils.graph import embedding_spec
+
+FIREHOSE_BUFFER_BYTES = 1024 * 1024  # Firehose's default Lambda-processor buffer
+_KPL_MAGIC = b"\xf3\x89\x9a\xc2"
+_WORDS = ("vector index shard embedding stream record lambda bucket query answer latency throughput model "
+          "token chunk window overlap batch cache graph node edge deploy region policy role search score").split()
+
+
+# --- local stand-ins for the AWS data plane ---------------------------------------------------
+
+class _Exceptions:
+    class ProvisionedThroughputExceededException(Exception):
+        pass
+
+
+class FakeS3:
+    """Objects in a dict; enough of head/get (with Range) for the ingester."""
+
+    def __init__(self):
+        self.objects: Dict[tuple, bytes] = {}
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes) -> None:
+        self.objects[(Bucket, Key)] = Body
+
+    def head_object(self, Bucket: str, Key: str) -> Dict[str, Any]:
+        return {"ContentLength": len(self.objects[(Bucket, Key)])}
+
+    def get_object(self, Bucket: str, Key: str, Range: Optional[str] = None) -> Dict[str, Any]:
+        data = self.objects[(Bucket, Key)]
+        if Range:
+            start, end = (int(x) for x in Range[len("bytes="):].split("-"))
+            data = data[start:end + 1]
+        return {"Body": io.BytesIO(data)}
+
+
+class FakeKinesis:
+    """PutRecords into an in-memory shard; the firehose buffer drains it."""
+
+    exceptions = _Exceptions
+
+    def __init__(self):
+        self.records: List[bytes] = []
+        self.calls = 0
+
+    def put_records(self, StreamName: str, Records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        self.calls += 1
+        self.records.extend(r["Data"] for r in Records)
+        return {"FailedRecordCount": 0, "Records": [{"SequenceNumber": str(len(self.records))} for _ in Records]}
+
+    def drain(self) -> List[bytes]:
+        out, self.records = self.records, []
+        return out
+
+
+def _read_varint(buf: bytes, i: int):
+    shift = n = 0
+    while True:
+        b = buf[i]
+        i += 1
+        n |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return n, i
+        shift += 7
+
+
+def _pb_fields(buf: bytes) -> Iterator[tuple]:
+    i = 0
+    while i < len(buf):
+        tag, i = _read_varint(buf, i)
+        if tag & 7 == 0:
+            val, i = _read_varint(buf, i)
+        else:  # length-delimited (the only other wire type the KPL format uses)
+            ln, i = _read_varint(buf, i)
+            val, i = buf[i:i + ln], i + ln
+        yield tag >> 3, val
+
+
+def deaggregate(data: bytes) -> List[bytes]:
+    """User records inside a KPL aggregate (what Firehose does transparently); plain records pass through."""
+    if not data.startswith(_KPL_MAGIC):
+        return [data]
+    body = data[len(_KPL_MAGIC):-16]
+    if hashlib.md5(body).digest() != data[-16:]:
+        return [data]
+    return [dict(_pb_fields(rec)).get(3, b"") for field, rec in _pb_fields(body) if field == 3]
+
+
+class FakeBedrock:
+    """Deterministic embedder (feature-hashed bag of words, so similar texts land close)
+    and an echoing chat model. latency_ms adds a per-call sleep to mimic the network."""
+
+    def __init__(self, default_dims: int = 1024, latency_ms: float = 0.0):
+        self.default_dims = default_dims
+        self.latency = latency_ms / 1000.0
+        self.calls = {"embed": 0, "chat": 0}
+
+    def _vector(self, text: str, dims: int, normalize: bool) -> List[float]:
+        vec = [0.0] * dims
+        for tok in re.findall(r"\w+", text.lower()):
+            h = int.from_bytes(hashlib.blake2b(tok.encode("utf-8"), digest_size=8).digest(), "big")
+            vec[h % dims] += 1.0 if (h >> 32) & 1 else -1.0
+        if normalize:
+            norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+            vec = [v / norm for v in vec]
+        return vec
+
+    def invoke_model(self, modelId: str, body: str, **_) -> Dict[str, Any]:
+        if self.latency:
+            time.sleep(self.latency)
+        req = json.loads(body)
+        if "inputText" in req and "inferenceConfig" not in req:
+            self.calls["embed"] += 1
+            vec = self._vector(req["inputText"], int(req.get("dimensions") or self.default_dims), req.get("normalize", True))
+            return {"body": io.BytesIO(json.dumps({"embedding": vec}).encode("utf-8"))}
+        self.calls["chat"] += 1
+        return {"body": io.BytesIO(json.dumps({"outputText": self._answer(req)}).encode("utf-8"))}
+
+    def invoke_model_with_response_stream(self, modelId: str, body: str, **_) -> Dict[str, Any]:
+        self.calls["chat"] += 1
+        words = self._answer(json.loads(body)).split(" ")
+
+        def events():
+            for w in words:
+                if self.latency:
+                    time.sleep(self.latency / len(words))
+                yield {"chunk": {"bytes": json.dumps({"outputText": w + " "}).encode("utf-8")}}
+        return {"body": events()}
+
+    @staticmethod
+    def _answer(req: Dict[str, Any]) -> str:
+        prompt = req.get("inputText", "")
+        question = prompt.rsplit("Question:", 1)[-1].strip()
+        return f"(simulated) {len(prompt)} prompt chars; question: {question[:80]}"
+
+
+class VectorIndex:
+    """Brute-force kNN over all indexed vectors (NumPy when available)."""
+
+    def __init__(self, space_type: str = "l2"):
+        self.space_type = space_type
+        self.docs: List[Dict[str, Any]] = []
+        self.ids: Dict[str, int] = {}
+        self._rows: List[List[float]] = []
+        self._matrix = None
+
+    def add(self, doc: Dict[str, Any]) -> None:
+        vec = doc["embedding"]
+        if doc["id"] in self.ids:
+            i = self.ids[doc["id"]]
+            self.docs[i], self._rows[i] = doc, vec
+        else:
+            self.ids[doc["id"]] = len(self.docs)
+            self.docs.append(doc)
+            self._rows.append(vec)
+        self._matrix = None
+
+    def search(self, vec: List[float], k: int) -> List[tuple]:
+        """[(score, doc)] best first; higher score is better for every space type."""
+        if not self.docs:
+            return []
+        if np is not None:
+            if self._matrix is None:
+                self._matrix = np.asarray(self._rows, dtype=np.float32)
+            q = np.asarray(vec, dtype=np.float32)
+            if self.space_type == "l2":
+                scores = 1.0 / (1.0 + ((self._matrix - q) ** 2).sum(axis=1))
+            else:
+                scores = self._matrix @ q
+            top = np.argsort(-scores)[:k]
+            return [(float(scores[i]), self.docs[i]) for i in top]
+        if self.space_type == "l2":
+            scored = [(1.0 / (1.0 + sum((a - b) ** 2 for a, b in zip(row, vec))), i) for i, row in enumerate(self._rows)]
+        else:
+            scored = [(sum(a * b for a, b in zip(row, vec)), i) for i, row in enumerate(self._rows)]
+        scored.sort(key=lambda s: -s[0])
+        return [(s, self.docs[i]) for s, i in scored[:k]]
+
+
+class _Response:
+    def __init__(self, payload: Dict[str, Any], status: int = 200):
+        self.status_code = status
+        self._payload = payload
+
+    def json(self) -> Dict[str, Any]:
+        return self._payload
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}: {self._payload}")
+
+
+class FakeAoss:
+    """Stands in for the retriever's AossConnection: _search, _msearch and _mapping."""
+
+    def __init__(self, index: VectorIndex, name: str):
+        self.index = index
+        self.name = name
+        self.generation = time.time_ns()
+
+    def _hits(self, query: Dict[str, Any]) -> Dict[str, Any]:
+        knn = query["query"]["knn"]["embedding"]
+        excludes = set((query.get("_source") or {}).get("excludes", []))
+        hits = [{"_id": d["id"], "_score": s, "_source": {k: v for k, v in d.items() if k not in excludes}}
+                for s, d in self.index.search(knn["vector"], min(query.get("size", knn["k"]), knn["k"]))]
+        return {"hits": {"hits": hits}}
+
+    def request(self, method: str, path: str, json: Any = None, data: Any = None, **_) -> _Response:
+        if path.endswith("/_mapping"):
+            return _Response({self.name: {"mappings": {"_meta": {"generation": self.generation}}}})
+        if path.endswith("/_msearch"):
+            import json as _json
+            lines = [ln for ln in data.split("\n") if ln]
+            return _Response({"responses": [self._hits(_json.loads(q)) for q in lines[1::2]]})
+        if path.endswith("/_search"):
+            return _Response(self._hits(json))
+        return _Response({"error": f"unsupported {method} {path}"}, 404)
+
+
+# --- wiring the real handlers to the stand-ins ------------------------------------------------
+
+@contextlib.contextmanager
+def _env(values: Dict[str, str]):
+    saved = {k: os.environ.get(k) for k in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+
+def load_handler(node: Dict[str, Any], env: Dict[str, str]):
+    """Import <source_dir>/app.py under a module name unique to the node, with its env applied
+    (handlers read their settings at import time)."""
+    path = os.path.join(node["props"].get("source_dir") or "lambda_src/ingester", "app.py")
+    spec = importlib.util.spec_from_file_location(f"dagctl_sim_{node['id']}", path)
+    mod = importlib.util.module_from_spec(spec)
+    with _env(env):
+        spec.loader.exec_module(mod)
+    return mod
+
+
+def _sim_env(node: Dict[str, Any], embed: Dict[str, Any], fake_refs: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+    """The env the deployer would give this Lambda: props.env with refs resolved, plus wired EMBED_*."""
+    out = {"EMBED_MODEL_ID": embed["model_id"] or "amazon.titan-embed-text-v2:0", "EMBED_DIMS": str(embed["dimensions"]),
+           "EMBED_NORMALIZE": "true" if embed["normalize"] else "false", "INDEX_GEN_CHECK_S": "0"}
+    for k, v in (node.get("props", {}).get("env") or {}).items():
+        if isinstance(v, str) and v.startswith("ref:"):
+            nid, _, key = v[len("ref:"):].partition(".")
+            ref = fake_refs.get(nid, {})
+            v = ref.get(key) if key else next(iter(ref.values()), "")
+        out[k] = str(v)
+    return out
+
+
+def synthetic_docs(n: int, chars: int, seed: int = 0) -> List[str]:
+    rnd = random.Random(seed)
+    docs = []
+    for _ in range(n):
+        words: List[str] = []
+        size = 0
+        target = int(chars * rnd.uniform(0.5, 1.5))
+        while size < target:
+            w = rnd.choice(_WORDS) if rnd.random() < 0.7 else f"{rnd.choice(_WORDS)}{rnd.randint(0, 999)}"
+            words.append(w)
+            size += len(w) + 1
+        docs.append(" ".join(words))
+    return docs
+
+
+class StageTimer:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+
+    @contextlib.contextmanager
+    def time(self, stage: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.setdefault(stage, []).append((time.perf_counter() - t0) * 1000.0)
+
+    @staticmethod
+    def _pct(sorted_ms: List[float], p: float) -> float:
+        i = min(len(sorted_ms) - 1, max(0, int(math.ceil(p / 100.0 * len(sorted_ms))) - 1))
+        return sorted_ms[i]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        out = {}
+        for stage, ms in self.samples.items():
+            s = sorted(ms)
+            out[stage] = {"n": len(s), "p50_ms": round(self._pct(s, 50), 2), "p95_ms": round(self._pct(s, 95), 2),
+                          "max_ms": round(s[-1], 2), "total_ms": round(sum(s), 1)}
+        return out
+
+
+def simulate(doc: Dict[str, Any], n_docs: int = 200, doc_chars: int = 8000, n_queries: int = 50,
+             seed: int = 0, model_latency_ms: float = 0.0) -> Dict[str, Any]:
+    """Push synthetic documents through the graph's real lambda_src handlers against local
+    stand-ins (S3, Kinesis, Firehose buffer, Bedrock, vector index), then run queries."""
+    nodes = {n["id"]: n for n in doc["nodes"]}
+    by_fn = {n["props"].get("function_name"): n for n in doc["nodes"] if n["type"] == "lambda.fn"}
+    feed = next((e for e in doc["edges"] if e["via"] == "s3_event"), None)
+    fire = next((n for n in doc["nodes"] if n["type"] == "firehose.delivery"), None)
+    api = next((e for e in doc["edges"] if e["via"] == "http"), None)
+    store = next((n for n in doc["nodes"] if n["type"] == "opensearch.vector"), None)
+    model = next((n for n in doc["nodes"] if n["type"] == "bedrock.model" and n.get("props", {}).get("mode") == "embeddings"), None)
+    if not (feed and fire and store and model):
+        raise ValueError("simulate needs s3 -> ingester, a firehose.delivery, an opensearch.vector and an embeddings model")
+    transform_node = by_fn.get(fire["props"].get("transform_lambda"))
+    if transform_node is None:
+        raise ValueError(f"firehose transform_lambda {fire['props'].get('transform_lambda')!r} is not a lambda.fn in the graph")
+
+    embed = embedding_spec(model["props"])
+    bucket = nodes[feed["from"]]["props"]["bucket_name"]
+    index_name = store["props"]["index_name"]
+    fake_refs = {n["id"]: {"model_id": n["props"].get("model_id") or f"sim-{n['id']}"} for n in doc["nodes"] if n["type"] == "bedrock.model"}
+    fake_refs[store["id"]] = {"endpoint": "https://simulated.aoss.local", "index": index_name}
+
+    s3, kinesis, bedrock = FakeS3(), FakeKinesis(), FakeBedrock(embed["dimensions"], model_latency_ms)
+    index = VectorIndex(store["props"].get("space_type", "l2"))
+    os.environ.setdefault("AWS_DEFAULT_REGION", doc.get("region") or "us-east-1")  # modules build clients on import
+
+    ingester = load_handler(nodes[feed["to"]], _sim_env(nodes[feed["to"]], embed, fake_refs))
+    ingester.s3, ingester.kinesis = s3, kinesis
+    transform = load_handler(transform_node, _sim_env(transform_node, embed, fake_refs))
+    transform.bedrock = bedrock
+    retriever = None
+    if api:
+        rnode = nodes[api["to"]]
+        retriever = load_handler(rnode, _sim_env(rnode, embed, fake_refs))
+        retriever.bedrock = bedrock
+        retriever.aoss = FakeAoss(index, index_name)
+        retriever.CHAT_ID = retriever.CHAT_ID or "sim-chat"
+
+    timer = StageTimer()
+    texts = synthetic_docs(n_docs, doc_chars, seed)
+    t0 = time.perf_counter()
+    seq = 0
+
+    def firehose_flush(batch: List[bytes]) -> None:
+        nonlocal seq
+        records = []
+        for data in batch:
+            seq += 1
+            records.append({"recordId": str(seq), "data": base64.b64encode(data).decode("ascii")})
+        with timer.time("transform"), contextlib.redirect_stdout(io.StringIO()):  # drop per-batch stats lines
+            out = transform.handler({"records": records}, None)
+        with timer.time("index"):
+            for r in out["records"]:
+                if r["result"] == "Ok":
+                    index.add(json.loads(base64.b64decode(r["data"])))
+
+    buf: List[bytes] = []
+    buf_bytes = 0
+    for i, text in enumerate(texts):
+        key = f"sim/doc-{i:06d}.txt"
+        s3.put_object(Bucket=bucket, Key=key, Body=text.encode("utf-8"))
+        event = {"Records": [{"s3": {"bucket": {"name": bucket}, "object": {"key": key}}}]}
+        with timer.time("ingester"):
+            ingester.handler(event, None)
+        for data in (d for rec in kinesis.drain() for d in deaggregate(rec)):
+            if buf and buf_bytes + len(data) > FIREHOSE_BUFFER_BYTES:
+                firehose_flush(buf)
+                buf, buf_bytes = [], 0
+            buf.append(data)
+            buf_bytes += len(data)
+    if buf:
+        firehose_flush(buf)
+    ingest_s = time.perf_counter() - t0
+
+    query_s = 0.0
+    if retriever is not None and n_queries:
+        rnd = random.Random(seed + 1)
+        t1 = time.perf_counter()
+        for _ in range(n_queries):
+            words = rnd.choice(texts).split()
+            start = rnd.randrange(max(1, len(words) - 12))
+            body = json.dumps({"q": " ".join(words[start:start + 12])})
+            with timer.time("retriever"):
+                resp = retriever.handler({"rawPath": "/chat", "body": body}, None)
+            if resp.get("statusCode") != 200:
+                raise RuntimeError(f"retriever returned {resp}")
+        query_s = time.perf_counter() - t1
+
+    total_bytes = sum(len(t.encode("utf-8")) for t in texts)
+    return {
+        "docs": n_docs,
+        "chunks": len(index.docs),
+        "bytes": total_bytes,
+        "ingest_s": round(ingest_s, 3),
+        "docs_per_s": round(n_docs / ingest_s, 1) if ingest_s else None,
+        "chunks_per_s": round(len(index.docs) / ingest_s, 1) if ingest_s else None,
+        "queries": n_queries if retriever is not None else 0,
+        "queries_per_s": round(n_queries / query_s, 1) if query_s else None,
+        "kinesis_put_calls": kinesis.calls,
+        "bedrock_calls": dict(bedrock.calls),
+        "index_backend": "numpy" if np is not None else "python",
+        "stages": timer.summary(),
+    }
+
+
+def format_report(r: Dict[str, Any]) -> str:
+    lines = [
+        f"Simulated {r['docs']} docs ({r['bytes'] / 1e6:.2f} MB) -> {r['chunks']} chunks in {r['ingest_s']}s: "
+        f"{r['docs_per_s']} docs/s, {r['chunks_per_s']} chunks/s",
+        f"Kinesis PutRecords calls: {r['kinesis_put_calls']}; Bedrock calls: {r['bedrock_calls']}; index: {r['index_backend']}",
+    ]
+    if r["queries"]:
+        lines.append(f"Queries: {r['queries']} at {r['queries_per_s']} q/s")
+    lines.append(f"  {'stage':<10} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for stage in ("ingester", "transform", "index", "retriever"):
+        s = r["stages"].get(stage)
+        if s:
+            lines.append(f"  {stage:<10} {s['n']:>6} {s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} {s['max_ms']:>9.2f}")
+    return "\n".join(lines)
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from typing import Any, Dict, Iterable, Optional
+
+STATE_VERSION = 1
+STATE_DIR = ".dagctl"
+_SKIP_DIRS = {"__pycache__", ".git", ".pytest_cache"}
+
+
+def default_state_path(doc: Dict[str, Any]) -> str:
+    return os.path.join(STATE_DIR, f"{doc.get('name', 'graph')}.state.json")
+
+
+def empty_state() -> Dict[str, Any]:
+    return {"version": STATE_VERSION, "nodes": {}, "wires": {}}
+
+
+def load_state(path: str) -> Dict[str, Any]:
+    """Read the state file; a missing or outdated file means 'deploy everything'."""
+    try:
+        with open(path, "r") as fh:
+            state = json.load(fh)
+    except (OSError, ValueError):
+        return empty_state()
+    if state.get("version") != STATE_VERSION:
+        return empty_state()
+    state.setdefault("nodes", {})
+    state.setdefault("wires", {})
+    return state
+
+
+def save_state(path: str, state: Dict[str, Any]) -> None:
+    """Write atomically so an interrupted deploy never leaves a torn file."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as fh:
+        json.dump(state, fh, indent=2, sort_keys=True, default=str)
+    os.replace(tmp, path)
+
+
+def tree_digest(path: str) -> str:
+    """sha256 over relative paths and contents of every file under path (walk order independent)."""
+    h = hashlib.sha256()
+    files = []
+    for root, dirs, names in os.walk(path):
+        dirs[:] = [d for d in dirs if d not in _SKIP_DIRS]
+        for f in names:
+            if not f.endswith((".pyc", ".pyo")):
+                fp = os.path.join(root, f)
+                files.append((os.path.relpath(fp, start=path).replace(os.sep, "/"), fp))
+    for arc, fp in sorted(files):
+        h.update(arc.encode("utf-8") + b"\0")
+        with open(fp, "rb") as fh:
+            for block in iter(lambda: fh.read(1 << 16), b""):
+                h.update(block)
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _digest(obj: Any) -> str:
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def node_digest(node: Dict[str, Any], upstream: Dict[str, Dict[str, Any]], ctx: Dict[str, Any]) -> str:
+    """Hash of everything a node's deploy depends on.
+
+    upstream maps each predecessor id to {"hash": ..., "refs": ...}, so a change
+    anywhere upstream also changes the digest of every dependent.
+    """
+    props = node.get("props", {}) or {}
+    src = props.get("source_dir")
+    bucket = None
+    if node["type"] == "lambda.fn":  # falls back to the document-level bucket, like LambdaFn.deploy
+        bucket = props.get("artifact_bucket") or (ctx.get("doc") or {}).get("artifact_bucket")
+    return _digest({
+        "type": node["type"],
+        "props": props,
+        "src": tree_digest(src) if src and os.path.isdir(src) else None,
+        "artifact_bucket": bucket,
+        "region": ctx.get("region"),
+        "tags": ctx.get("tags", {}),
+        "upstream": upstream,
+    })
+
+
+def wire_digest(action_id: str, edge: Dict[str, str], node_hashes: Dict[str, str], nodes: Iterable[str]) -> Optional[str]:
+    """Hash of a wiring action's inputs; None if any touched node has no hash yet."""
+    hashes = {n: node_hashes.get(n) for n in sorted(nodes)}
+    if not all(hashes.values()):
+        return None
+    return _digest({"id": action_id, "edge": edge, "nodes": hashes})
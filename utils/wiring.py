@@ -0,0 +1,49 @@
+from __future__ import annotations
+from typing import Any, Dict, Hashable, List, Tuple
+
+
+def _action_key(svc, edge: Dict[str, str], types: Dict[str, str]) -> Hashable | None:
+    """Ask the service which wiring action an edge maps to (None = not its concern)."""
+    if not hasattr(svc, "wire"):
+        return None
+    if hasattr(svc, "wire_key"):
+        return svc.wire_key(edge, types)
+    return (edge["from"], edge["to"], edge["via"])
+
+
+def plan_wiring(doc: Dict[str, Any], registry) -> List[Dict[str, Any]]:
+    """Turn graph edges into distinct wiring actions, in first-seen edge order.
+
+    Each action is {"id", "svc", "edge", "nodes"}: the service whose wire()
+    runs, the first edge that produced it and every node touched by the edges
+    that collapsed into it. Several edges mapping to the same (kind, key) run
+    wire() exactly once.
+    """
+    types = {n["id"]: n["type"] for n in doc.get("nodes", [])}
+    actions: Dict[str, Dict[str, Any]] = {}
+    for e in doc.get("edges", []):
+        for kind in dict.fromkeys((types[e["from"]], types[e["to"]])):
+            svc = registry[kind]
+            key = _action_key(svc, e, types)
+            if key is None:
+                continue
+            aid = f"{kind}:{key if isinstance(key, str) else '/'.join(map(str, key))}"
+            act = actions.setdefault(aid, {"id": aid, "svc": svc, "edge": e, "nodes": set()})
+            act["nodes"].update((e["from"], e["to"]))
+    return list(actions.values())
+
+
+def wiring_deps(actions: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
+    """Order actions that touch a common node; everything else may run concurrently.
+
+    Chains actions per node in plan order, so read-modify-write calls on one
+    resource (bucket notifications, Lambda permissions, role policies) never race.
+    """
+    last: Dict[str, str] = {}
+    deps = set()
+    for act in actions:
+        for nid in sorted(act["nodes"]):
+            if nid in last:
+                deps.add((last[nid], act["id"]))
+            last[nid] = act["id"]
+    return sorted(deps)